@@ -0,0 +1,251 @@
+"""오디오 컨테이너 헤더만 읽어 길이(초)를 구하는 모듈
+
+WAV(RIFF/RF64), MP3(Xing/Info, VBRI, 프레임 스캔), FLAC, OGG(Vorbis/Opus/FLAC)는
+헤더에서 바로 계산하고, 그 밖의 형식에서만 librosa를 지연 import해 디코딩합니다.
+librosa(및 numba/scipy)를 모듈 로드 시점에 가져오지 않으므로 워커 콜드 스타트가 짧아집니다.
+"""
+import logging
+import mmap
+import os
+import struct
+
+logger = logging.getLogger(__name__)
+
+_MP3_BITRATES = {
+    # (MPEG-1 여부, layer) -> kbps 테이블
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+class UnsupportedFormat(Exception):
+    """헤더만으로 길이를 구할 수 없는 형식"""
+
+
+# ---------------------------------------------------------------------- #
+# WAV / RF64
+# ---------------------------------------------------------------------- #
+def _wav_duration(data):
+    riff_id = data[:4]
+    if riff_id not in (b"RIFF", b"RF64") or data[8:12] != b"WAVE":
+        raise UnsupportedFormat("RIFF/WAVE 헤더가 아닙니다")
+    offset = 12
+    byte_rate = None
+    data_size = None
+    data_offset = None
+    ds64_data_size = None
+    fact_samples = None
+    sample_rate = None
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack_from("<I", data, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            sample_rate, byte_rate = struct.unpack_from("<II", data, body + 4)
+        elif chunk_id == b"ds64":
+            ds64_data_size = struct.unpack_from("<Q", data, body + 8)[0]
+        elif chunk_id == b"fact":
+            fact_samples = struct.unpack_from("<I", data, body)[0]
+        elif chunk_id == b"data":
+            data_size = chunk_size
+            data_offset = body
+            break
+        offset = body + chunk_size + (chunk_size & 1)
+    if byte_rate is None or data_offset is None:
+        raise UnsupportedFormat("fmt/data 청크를 찾을 수 없습니다")
+    if data_size == 0xFFFFFFFF and ds64_data_size is not None:
+        data_size = ds64_data_size
+    # 스트리밍으로 기록된 파일은 data 크기가 비어 있거나 실제보다 큼
+    if data_size in (0, 0xFFFFFFFF) or data_offset + data_size > len(data):
+        data_size = len(data) - data_offset
+    if fact_samples and sample_rate:
+        # 압축 WAV(ADPCM 등)는 fact 청크의 샘플 수가 정확함
+        return fact_samples / sample_rate
+    if not byte_rate:
+        raise UnsupportedFormat("byte rate가 0입니다")
+    return data_size / byte_rate
+
+
+# ---------------------------------------------------------------------- #
+# MP3
+# ---------------------------------------------------------------------- #
+def _parse_mp3_header(data, offset):
+    """프레임 헤더를 해석해 (프레임 길이, 샘플 수, 샘플레이트, MPEG-1 여부, 모노 여부) 반환"""
+    if offset + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[offset], data[offset + 1], data[offset + 2], data[offset + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 3
+    layer = 4 - ((b1 >> 1) & 3)
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        samples = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or mpeg1) else 576
+        frame_length = samples // 8 * bitrate // sample_rate + padding
+    return frame_length, samples, sample_rate, mpeg1, (b3 >> 6) == 3
+
+
+def _skip_id3v2(data):
+    offset = 0
+    while data[offset:offset + 3] == b"ID3" and offset + 10 <= len(data):
+        size = 0
+        for b in data[offset + 6:offset + 10]:
+            size = (size << 7) | (b & 0x7F)
+        footer = 10 if data[offset + 5] & 0x10 else 0
+        offset += 10 + size + footer
+    return offset
+
+
+def _mp3_duration(data):
+    start = _skip_id3v2(data)
+    end = len(data)
+    if end >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+
+    # 첫 프레임 찾기 (다음 프레임 헤더까지 유효해야 진짜 동기 신호로 인정)
+    offset = data.find(b"\xff", start)
+    header = None
+    while 0 <= offset < end:
+        header = _parse_mp3_header(data, offset)
+        if header and (offset + header[0] >= end or _parse_mp3_header(data, offset + header[0])):
+            break
+        header = None
+        offset = data.find(b"\xff", offset + 1)
+    if header is None:
+        raise UnsupportedFormat("MP3 프레임을 찾을 수 없습니다")
+
+    frame_length, samples, sample_rate, mpeg1, mono = header
+    # Xing/Info (LAME) 태그
+    xing = offset + 4 + ((17 if mono else 32) if mpeg1 else (9 if mono else 17))
+    if data[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack_from(">I", data, xing + 4)[0]
+        if flags & 1:
+            frames = struct.unpack_from(">I", data, xing + 8)[0]
+            return frames * samples / sample_rate
+    # VBRI (Fraunhofer) 태그
+    vbri = offset + 36
+    if data[vbri:vbri + 4] == b"VBRI":
+        frames = struct.unpack_from(">I", data, vbri + 14)[0]
+        return frames * samples / sample_rate
+
+    # 태그가 없으면 프레임을 끝까지 훑어 샘플 수를 합산
+    total_samples = 0
+    while offset < end:
+        header = _parse_mp3_header(data, offset)
+        if header is None or header[0] <= 0:
+            next_sync = data.find(b"\xff", offset + 1, end)
+            if next_sync < 0:
+                break
+            offset = next_sync
+            continue
+        total_samples += header[1]
+        offset += header[0]
+    return total_samples / sample_rate
+
+
+# ---------------------------------------------------------------------- #
+# FLAC / OGG
+# ---------------------------------------------------------------------- #
+def _flac_streaminfo(block):
+    """STREAMINFO 블록 본문에서 (샘플레이트, 총 샘플 수) 반환"""
+    packed = int.from_bytes(block[10:18], "big")
+    sample_rate = packed >> 44
+    total_samples = packed & ((1 << 36) - 1)
+    return sample_rate, total_samples
+
+
+def _flac_duration(data):
+    offset = _skip_id3v2(data)
+    if data[offset:offset + 4] != b"fLaC":
+        raise UnsupportedFormat("FLAC 헤더가 아닙니다")
+    block_header = offset + 4
+    if data[block_header] & 0x7F != 0:
+        raise UnsupportedFormat("STREAMINFO 블록이 없습니다")
+    sample_rate, total_samples = _flac_streaminfo(data[block_header + 4:block_header + 38])
+    if not sample_rate or not total_samples:
+        raise UnsupportedFormat("FLAC 총 샘플 수가 기록되어 있지 않습니다")
+    return total_samples / sample_rate
+
+
+def _ogg_duration(data):
+    if data[:4] != b"OggS":
+        raise UnsupportedFormat("OGG 헤더가 아닙니다")
+    segments = data[26]
+    packet = data[27 + segments:27 + segments + 64]
+    pre_skip = 0
+    if packet.startswith(b"\x01vorbis"):
+        sample_rate = struct.unpack_from("<I", packet, 12)[0]
+    elif packet.startswith(b"OpusHead"):
+        # Opus granule position은 항상 48kHz 기준
+        sample_rate = 48000
+        pre_skip = struct.unpack_from("<H", packet, 10)[0]
+    elif packet.startswith(b"\x7fFLAC"):
+        sample_rate, _ = _flac_streaminfo(packet[17:51])
+    else:
+        raise UnsupportedFormat("지원하지 않는 OGG 코덱입니다")
+
+    # 마지막 페이지의 granule position = 총 샘플 수
+    last_page = data.rfind(b"OggS", max(0, len(data) - 65536 * 2))
+    while last_page >= 0:
+        granule = struct.unpack_from("<q", data, last_page + 6)[0]
+        if granule >= 0:
+            return max(granule - pre_skip, 0) / sample_rate
+        last_page = data.rfind(b"OggS", 0, last_page)
+    raise UnsupportedFormat("OGG granule position을 찾을 수 없습니다")
+
+
+_PROBES = (
+    (lambda head: head[:4] in (b"RIFF", b"RF64"), _wav_duration),
+    (lambda head: head[:4] == b"fLaC", _flac_duration),
+    (lambda head: head[:4] == b"OggS", _ogg_duration),
+    (lambda head: head[:3] == b"ID3" or (head[0] == 0xFF and head[1] & 0xE0 == 0xE0), None),
+)
+
+
+def probe_duration(audio_path):
+    """헤더만 읽어 오디오 길이(초)를 반환. 판단할 수 없으면 UnsupportedFormat"""
+    with open(audio_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < 12:
+            raise UnsupportedFormat("파일이 너무 작습니다")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            head = data[:12]
+            for matches, probe in _PROBES:
+                if matches(head):
+                    break
+            else:
+                raise UnsupportedFormat("알 수 없는 오디오 형식입니다")
+            if probe is None:
+                # ID3 태그 뒤에는 MP3 외에 FLAC이 올 수도 있음
+                offset = _skip_id3v2(data)
+                probe = _flac_duration if data[offset:offset + 4] == b"fLaC" else _mp3_duration
+            return probe(data)
+
+
+def decode_duration(audio_path):
+    """디코더(librosa)로 길이를 계산 (필요할 때만 import)"""
+    import librosa
+    return librosa.get_duration(path=audio_path)
+
+
+def get_duration(audio_path):
+    """헤더로 길이를 구하고, 실패하면 디코더로 대체"""
+    try:
+        return probe_duration(audio_path)
+    except (UnsupportedFormat, struct.error, IndexError, ValueError) as e:
+        logger.info(f"헤더로 길이를 알 수 없어 디코더를 사용합니다 ({audio_path}): {e}")
+        return decode_duration(audio_path)
@@ -0,0 +1,92 @@
+"""audio_probe(헤더 파싱)와 기존 librosa.get_duration 경로 비교 벤치마크
+
+콜드 스타트(새 인터프리터에서 import + 첫 호출)와 호출당 지연을 측정합니다.
+
+    python benchmarks/bench_audio_probe.py examples/audio.mp3 some.wav --repeat 200
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import audio_probe  # noqa: E402
+
+COLD_START_SNIPPETS = {
+    "librosa": "import time; t=time.perf_counter(); import librosa; librosa.get_duration(path={path!r}); print(time.perf_counter()-t)",
+    "audio_probe": "import time; t=time.perf_counter(); import audio_probe; audio_probe.get_duration({path!r}); print(time.perf_counter()-t)",
+}
+
+
+def cold_start(path, runs):
+    """새 프로세스에서 import와 첫 호출까지 걸린 시간(초) 목록"""
+    results = {}
+    for name, snippet in COLD_START_SNIPPETS.items():
+        samples = []
+        for _ in range(runs):
+            out = subprocess.run(
+                [sys.executable, "-c", snippet.format(path=path)],
+                cwd=ROOT, capture_output=True, text=True,
+            )
+            if out.returncode != 0:
+                samples = None
+                print(f"  {name}: 실행 실패 - {out.stderr.strip().splitlines()[-1]}")
+                break
+            samples.append(float(out.stdout.strip()))
+        results[name] = samples
+    return results
+
+
+def per_call(path, repeat):
+    """호출당 지연(초) 목록. librosa가 없으면 해당 항목은 None"""
+    results = {}
+    probes = {"audio_probe": audio_probe.get_duration}
+    try:
+        import librosa
+        probes["librosa"] = lambda p: librosa.get_duration(path=p)
+    except ImportError:
+        results["librosa"] = None
+
+    durations = {}
+    for name, probe in probes.items():
+        durations[name] = probe(path)  # 워밍업 (librosa 내부 지연 import 포함)
+        samples = []
+        for _ in range(repeat):
+            t = time.perf_counter()
+            probe(path)
+            samples.append(time.perf_counter() - t)
+        results[name] = samples
+    return results, durations
+
+
+def _fmt(samples):
+    if not samples:
+        return "n/a"
+    return f"median {statistics.median(samples) * 1000:.3f} ms, min {min(samples) * 1000:.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", default=[os.path.join(ROOT, "examples", "audio.mp3")])
+    parser.add_argument("--repeat", type=int, default=100, help="호출당 지연 측정 반복 횟수")
+    parser.add_argument("--cold-runs", type=int, default=3, help="콜드 스타트 측정 프로세스 수")
+    args = parser.parse_args()
+
+    for path in args.files:
+        path = os.path.abspath(path)
+        print(f"== {path} ({os.path.getsize(path)} bytes)")
+        calls, durations = per_call(path, args.repeat)
+        for name, seconds in durations.items():
+            print(f"  duration[{name}] = {seconds:.4f}s")
+        for name, samples in calls.items():
+            print(f"  per-call {name:12s} {_fmt(samples)}")
+        for name, samples in cold_start(path, args.cold_runs).items():
+            print(f"  cold-start {name:10s} {_fmt(samples)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""배치 모드와 순차 호출의 처리량 비교 벤치마크 (GPU 없이 ComfyUI 대역 서버 사용)
+
+같은 작업 N개를 handler.handler로 하나씩 처리할 때와 배치 입력 하나로 처리할 때의
+전체 시간과 초당 작업 수를 비교합니다. 입력은 base64로 넣어 작업마다 준비 비용이 들게 합니다.
+--mixed는 single/multi 작업을 번갈아 넣어 모델 전환 횟수(대역 서버의 --load-delay만큼 걸림)도 비교합니다.
+
+    python benchmarks/bench_batch.py --jobs 16 --node-delay 0.02
+    python benchmarks/bench_batch.py --jobs 16 --node-delay 0.02 --mixed --load-delay 0.5
+"""
+import argparse
+import base64
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_comfyui import FakeComfyUI  # noqa: E402
+
+
+def make_inputs(count, mixed=False):
+    with open(os.path.join(ROOT, "examples", "image.jpg"), 'rb') as f:
+        image_b64 = base64.b64encode(f.read()).decode('utf-8')
+    with open(os.path.join(ROOT, "examples", "audio.mp3"), 'rb') as f:
+        audio_b64 = base64.b64encode(f.read()).decode('utf-8')
+    inputs = []
+    for index in range(count):
+        job_input = {"image_base64": image_b64, "wav_base64": audio_b64, "width": 256, "height": 256, "max_frame": 81}
+        if mixed and index % 2:
+            job_input.update({"person_count": "multi", "wav_base64_2": audio_b64})
+        inputs.append(job_input)
+    return inputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=16)
+    parser.add_argument("--node-delay", type=float, default=0.02, help="대역 서버의 노드당 실행 지연(초)")
+    parser.add_argument("--output-size", type=int, default=1024 * 1024)
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument("--mixed", action="store_true", help="single/multi 작업을 번갈아 넣음")
+    parser.add_argument("--load-delay", type=float, default=0.0, help="대역 서버의 모델 전환 지연(초)")
+    args = parser.parse_args()
+
+    # handler는 import 시점에 설정을 읽으므로 환경 변수를 먼저 지정
+    os.environ.setdefault("WORKFLOW_DIR", ROOT)
+    os.environ["INPUT_CACHE_MAX_GB"] = "0"
+    os.environ["RESULT_CACHE_MAX_GB"] = "0"
+    os.environ["SERVER_ADDRESS"] = "127.0.0.1"
+    os.environ["COMFY_PORT"] = str(args.port)
+    os.chdir(tempfile.mkdtemp(prefix="bench_batch_"))
+
+    fake = FakeComfyUI(node_delay=args.node_delay, output_size=args.output_size, load_delay=args.load_delay)
+    fake.start(port=args.port)
+    import logging
+    import handler
+    logging.getLogger().setLevel(logging.WARNING)
+
+    inputs = make_inputs(args.jobs, args.mixed)
+    handler.comfy.wait_until_ready()
+    try:
+        started = time.perf_counter()
+        switches = handler.model_residency.switches
+        for index, job_input in enumerate(inputs):
+            result = handler.handler({"id": f"seq_{index}", "input": job_input})
+            assert "video" in result, result
+        sequential = time.perf_counter() - started
+        sequential_switches = handler.model_residency.switches - switches
+
+        started = time.perf_counter()
+        result = handler.handler({"id": "batch", "input": {"batch": inputs}})
+        batch = time.perf_counter() - started
+        assert result["succeeded"] == args.jobs, result
+        batch_switches = result["model_residency"]["switches"]
+    finally:
+        fake.stop()
+
+    print(f"jobs={args.jobs} node_delay={args.node_delay}s")
+    print(f"  sequential: {sequential:.2f}s ({args.jobs / sequential:.2f} jobs/s), model switches {sequential_switches}")
+    print(f"  batch:      {batch:.2f}s ({args.jobs / batch:.2f} jobs/s)  x{sequential / batch:.2f}, "
+          f"model switches {batch_switches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""GPU 없이 핸들러를 돌려보기 위한 ComfyUI 대역 서버
+
+ComfyUI가 핸들러에 노출하는 API 중 핸들러가 사용하는 부분만 흉내냅니다.
+
+    GET  /                 상태 확인
+    POST /prompt           프롬프트 큐잉 (클라이언트 지정 prompt_id 지원)
+    GET  /queue            실행 중/대기 중 프롬프트
+    GET  /history[/{id}]   실행 결과
+    POST /history          {"delete": [...]} / {"clear": true}
+    GET  /view             출력 파일 내려받기
+    POST /free             모델 언로드 요청 (호출 횟수만 기록)
+    GET  /ws?clientId=...  executing / progress / executed 메시지를 보내는 웹소켓
+
+실행은 한 번에 하나씩 순서대로 진행되며, 노드마다 `--node-delay`초를 쉬고
+`--output-size` 바이트짜리 가짜 MP4를 출력 디렉토리에 씁니다.
+큰 가중치 로더(MODEL_LOADER_CLASSES)는 같은 노드가 직전과 같은 모델을 읽으면 캐시된 것으로 보내고,
+다른 모델이면 `--load-delay`초를 더 쉬어 모델 전환 비용을 흉내냅니다.
+
+    python benchmarks/fake_comfyui.py --port 8188 --node-delay 0.01 --output-size 5000000 --load-delay 2
+"""
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+_WS_MAGIC = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# 실제 ComfyUI에서 출력 노드로 취급되는 클래스
+OUTPUT_CLASSES = {"VHS_VideoCombine", "SaveAudio", "PreviewAny"}
+# 모델 전환 비용을 흉내낼 로더 클래스
+MODEL_LOADER_CLASSES = {"MultiTalkModelLoader", "WanVideoModelLoader"}
+
+
+def _ws_frame(payload, opcode):
+    header = bytearray([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header.append(length)
+    elif length < 65536:
+        header.append(126)
+        header += struct.pack("!H", length)
+    else:
+        header.append(127)
+        header += struct.pack("!Q", length)
+    return bytes(header) + payload
+
+
+class _WebSocketPeer:
+    """서버 쪽 웹소켓 연결 하나 (송신은 잠금으로 직렬화)"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.lock = threading.Lock()
+        self.alive = True
+
+    def send_json(self, message):
+        self._send(_ws_frame(json.dumps(message).encode("utf-8"), 0x1))
+
+    def send_binary(self, payload):
+        self._send(_ws_frame(payload, 0x2))
+
+    def _send(self, frame):
+        if not self.alive:
+            return
+        try:
+            with self.lock:
+                self.sock.sendall(frame)
+        except OSError:
+            self.alive = False
+
+    def _recv_exact(self, n):
+        buf = b""
+        while len(buf) < n:
+            chunk = self.sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("closed")
+            buf += chunk
+        return buf
+
+    def serve(self):
+        """클라이언트 프레임을 읽어 ping/close에만 응답"""
+        try:
+            while self.alive:
+                b0, b1 = self._recv_exact(2)
+                opcode = b0 & 0x0F
+                length = b1 & 0x7F
+                if length == 126:
+                    length = struct.unpack("!H", self._recv_exact(2))[0]
+                elif length == 127:
+                    length = struct.unpack("!Q", self._recv_exact(8))[0]
+                mask = self._recv_exact(4) if b1 & 0x80 else b"\0\0\0\0"
+                payload = bytes(c ^ mask[i % 4] for i, c in enumerate(self._recv_exact(length)))
+                if opcode == 0x8:
+                    self._send(_ws_frame(payload[:2], 0x8))
+                    break
+                if opcode == 0x9:
+                    self._send(_ws_frame(payload, 0xA))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.alive = False
+
+
+class FakeComfyUI:
+    """가짜 ComfyUI 상태 (큐, history, 웹소켓 클라이언트)와 실행 스레드"""
+
+    def __init__(self, output_dir=None, node_delay=0.0, output_size=1024 * 1024,
+                 sampler_steps=4, send_previews=False, load_delay=0.0):
+        self.output_dir = output_dir or tempfile.mkdtemp(prefix="fake_comfyui_")
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.node_delay = node_delay
+        self.output_size = output_size
+        self.sampler_steps = sampler_steps
+        self.send_previews = send_previews
+        self.load_delay = load_delay
+        self.loaded = {}  # 로더 노드 ID -> 마지막으로 읽은 모델
+        self.model_loads = 0
+        self.pending = queue.Queue()
+        self.pending_ids = []
+        self.running_id = None
+        self.history = {}
+        self.clients = {}
+        self.free_calls = 0
+        self.submitted = []  # (prompt_id, 프롬프트, 제출 시점에 실행/대기 중인 프롬프트가 있었는지) 제출 순서
+        self.lock = threading.Lock()
+        self.server = None
+        self._worker = threading.Thread(target=self._run, name="fake-comfyui-exec", daemon=True)
+
+    # ---------------------------------------------------------------- #
+    def start(self, host="127.0.0.1", port=8188):
+        fake = self
+
+        class Handler(_RequestHandler):
+            comfy = fake
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="fake-comfyui-http", daemon=True).start()
+        self._worker.start()
+        return self.server.server_address
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    # ---------------------------------------------------------------- #
+    def broadcast(self, client_id, message):
+        peer = self.clients.get(client_id)
+        if peer is not None:
+            peer.send_json(message)
+
+    def enqueue(self, body):
+        prompt_id = str(body.get("prompt_id") or uuid.uuid4())
+        with self.lock:
+            number = len(self.history) + len(self.pending_ids)
+            self.submitted.append((prompt_id, body.get("prompt", {}), bool(self.running_id or self.pending_ids)))
+            self.pending_ids.append(prompt_id)
+        self.pending.put((prompt_id, number, body.get("prompt", {}), body.get("client_id")))
+        return {"prompt_id": prompt_id, "number": number, "node_errors": {}}
+
+    def _status_message(self):
+        with self.lock:
+            remaining = len(self.pending_ids) + (1 if self.running_id else 0)
+        return {"type": "status", "data": {"status": {"exec_info": {"queue_remaining": remaining}}}}
+
+    def _run(self):
+        while True:
+            prompt_id, number, prompt, client_id = self.pending.get()
+            with self.lock:
+                self.pending_ids.remove(prompt_id)
+                self.running_id = prompt_id
+            self.broadcast(client_id, self._status_message())
+            self.broadcast(client_id, {"type": "execution_start", "data": {"prompt_id": prompt_id}})
+            cached = [
+                node_id for node_id, node in prompt.items()
+                if node.get("class_type") in MODEL_LOADER_CLASSES
+                and self.loaded.get(node_id) == node.get("inputs", {}).get("model")
+            ]
+            if cached:
+                self.broadcast(client_id, {"type": "execution_cached", "data": {"nodes": cached, "prompt_id": prompt_id}})
+            outputs = {}
+            for node_id, node in prompt.items():
+                if node_id in cached:
+                    continue
+                self.broadcast(client_id, {"type": "executing", "data": {"node": node_id, "prompt_id": prompt_id}})
+                if node.get("class_type") in MODEL_LOADER_CLASSES:
+                    self.loaded[node_id] = node.get("inputs", {}).get("model")
+                    self.model_loads += 1
+                    time.sleep(self.load_delay)
+                if node.get("class_type") == "WanVideoSampler":
+                    for step in range(1, self.sampler_steps + 1):
+                        time.sleep(self.node_delay)
+                        self.broadcast(client_id, {"type": "progress", "data": {
+                            "value": step, "max": self.sampler_steps, "prompt_id": prompt_id, "node": node_id}})
+                        if self.send_previews and client_id in self.clients:
+                            self.clients[client_id].send_binary(struct.pack(">II", 1, 1) + b"\xff\xd8fakejpeg")
+                else:
+                    time.sleep(self.node_delay)
+                output = self._node_output(prompt_id, node_id, node)
+                if output is not None:
+                    outputs[node_id] = output
+                    self.broadcast(client_id, {"type": "executed", "data": {
+                        "node": node_id, "display_node": node_id, "output": output, "prompt_id": prompt_id}})
+            with self.lock:
+                self.history[prompt_id] = {
+                    "prompt": [number, prompt_id, prompt, {}, []],
+                    "outputs": outputs,
+                    "status": {"status_str": "success", "completed": True, "messages": []},
+                }
+                self.running_id = None
+            self.broadcast(client_id, {"type": "execution_success", "data": {"prompt_id": prompt_id}})
+            self.broadcast(client_id, {"type": "executing", "data": {"node": None, "prompt_id": prompt_id}})
+            self.broadcast(client_id, self._status_message())
+
+    def _node_output(self, prompt_id, node_id, node):
+        class_type = node.get("class_type")
+        inputs = node.get("inputs", {})
+        if class_type == "VHS_VideoCombine":
+            filename = f"{inputs.get('filename_prefix', 'fake')}_{prompt_id[:8]}.mp4"
+            fullpath = os.path.join(self.output_dir, filename)
+            _write_fake_file(fullpath, self.output_size)
+            return {"gifs": [{"filename": filename, "subfolder": "", "type": "output",
+                              "format": inputs.get("format", "video/h264-mp4"),
+                              "frame_rate": 25.0, "fullpath": fullpath}]}
+        if class_type == "SaveAudio":
+            filename = f"{inputs.get('filename_prefix', 'audio')}_{prompt_id[:8]}.flac"
+            _write_fake_file(os.path.join(self.output_dir, filename), 64 * 1024)
+            return {"audio": [{"filename": filename, "subfolder": "", "type": "output"}]}
+        if class_type == "PreviewAny":
+            return {"text": ["0"]}
+        return None
+
+
+def _write_fake_file(path, size):
+    chunk = os.urandom(min(size, 1024 * 1024)) or b"\0"
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            f.write(chunk[:remaining])
+            remaining -= len(chunk)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    comfy = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _send(self, status, body=b"", content_type="application/json"):
+        if not isinstance(body, (bytes, bytearray)):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        path = parsed.path
+        params = urllib.parse.parse_qs(parsed.query)
+        comfy = self.comfy
+
+        if path == "/ws":
+            return self._upgrade(params.get("clientId", [str(uuid.uuid4())])[0])
+        if path == "/":
+            return self._send(200, b"<html>fake comfyui</html>", "text/html")
+        if path == "/queue":
+            with comfy.lock:
+                running = [[0, comfy.running_id]] if comfy.running_id else []
+                pending = [[i + 1, pid] for i, pid in enumerate(comfy.pending_ids)]
+            return self._send(200, {"queue_running": running, "queue_pending": pending})
+        if path == "/history":
+            with comfy.lock:
+                return self._send(200, dict(comfy.history))
+        if path.startswith("/history/"):
+            prompt_id = path[len("/history/"):]
+            with comfy.lock:
+                entry = comfy.history.get(prompt_id)
+            return self._send(200, {prompt_id: entry} if entry else {})
+        if path == "/view":
+            filename = os.path.basename(params.get("filename", [""])[0])
+            fullpath = os.path.join(comfy.output_dir, params.get("subfolder", [""])[0], filename)
+            if not os.path.isfile(fullpath):
+                return self._send(404, {"error": "not found"})
+            with open(fullpath, "rb") as f:
+                return self._send(200, f.read(), "application/octet-stream")
+        return self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        path = urllib.parse.urlparse(self.path).path
+        comfy = self.comfy
+        body = self._read_json()
+        if path == "/prompt":
+            return self._send(200, comfy.enqueue(body))
+        if path == "/history":
+            with comfy.lock:
+                if body.get("clear"):
+                    comfy.history.clear()
+                for prompt_id in body.get("delete", []):
+                    comfy.history.pop(prompt_id, None)
+            return self._send(200, {})
+        if path == "/free":
+            with comfy.lock:
+                comfy.free_calls += 1
+            return self._send(200, {})
+        return self._send(404, {"error": "not found"})
+
+    def _upgrade(self, client_id):
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + _WS_MAGIC).encode()).digest()).decode()
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        peer = _WebSocketPeer(self.connection)
+        self.comfy.clients[client_id] = peer
+        peer.send_json({"type": "status", "data": {"status": {"exec_info": {"queue_remaining": 0}}, "sid": client_id}})
+        peer.serve()
+        self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument("--node-delay", type=float, default=0.0, help="노드당 실행 지연(초)")
+    parser.add_argument("--output-size", type=int, default=1024 * 1024, help="출력 MP4 크기(바이트)")
+    parser.add_argument("--output-dir", default=None)
+    parser.add_argument("--previews", action="store_true", help="샘플러 단계마다 바이너리 미리보기 전송")
+    parser.add_argument("--load-delay", type=float, default=0.0, help="모델 로더가 다른 모델을 읽을 때 추가 지연(초)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    fake = FakeComfyUI(args.output_dir, args.node_delay, args.output_size, send_previews=args.previews,
+                       load_delay=args.load_delay)
+    host, port = fake.start(args.host, args.port)
+    logger.info(f"fake ComfyUI listening on {host}:{port}, outputs -> {fake.output_dir}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
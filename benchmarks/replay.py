@@ -0,0 +1,280 @@
+"""핸들러 자체 오버헤드를 GPU 없이 측정하는 부하 드라이버
+
+ComfyUI 대역 서버(fake_comfyui)를 띄우고, JSONL 파일의 작업이나 합성 작업을
+handler.handler 또는 handler_callback.handler로 재생해 처리량, 지연 백분위수,
+최대 RSS, 복사된 바이트(/proc/self/io의 rchar/wchar, 응답/콜백 크기)를 보고합니다.
+
+    python benchmarks/replay.py --synthetic 32 --concurrency 2 --output-size 5000000
+    python benchmarks/replay.py --jobs jobs.jsonl --target callback --json
+    python benchmarks/replay.py --synthetic 16 --server 127.0.0.1:8188   # 별도로 띄운 대역 서버 사용
+
+JSONL의 각 줄은 {"input": {...}} 형태의 작업이며, input이 없는 줄은 건너뜁니다.
+대역 서버를 같은 프로세스에서 띄우면 RSS/바이트에 서버 몫도 포함되므로,
+정확한 값이 필요하면 fake_comfyui.py를 따로 실행하고 --server로 지정하세요.
+"""
+import argparse
+import base64
+import concurrent.futures
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_comfyui import FakeComfyUI  # noqa: E402
+
+WORKFLOW_MIX = (("image", "single"), ("image", "multi"), ("video", "single"), ("video", "multi"))
+
+
+def read_io_counters():
+    """현재 프로세스의 read/write 시스템 호출 바이트 수 (리눅스 외에서는 0)"""
+    try:
+        with open("/proc/self/io", "r") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return int(counters["rchar"]), int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# ---------------------------------------------------------------------- #
+# 작업 만들기
+# ---------------------------------------------------------------------- #
+def load_jobs(path):
+    jobs = []
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, dict) and isinstance(item.get("input"), dict):
+                jobs.append(item)
+    return jobs
+
+
+def synthetic_jobs(count, input_kind, work_dir):
+    """워크플로우 4종을 돌아가며 섞은 합성 작업 (입력은 examples 에셋)"""
+    image_path = os.path.join(ROOT, "examples", "image.jpg")
+    audio_path = os.path.join(ROOT, "examples", "audio.mp3")
+    # 대역 서버는 비디오를 디코딩하지 않으므로 존재하는 파일이면 충분
+    video_path = os.path.join(work_dir, "input_video.mp4")
+    with open(image_path, "rb") as src, open(video_path, "wb") as dst:
+        dst.write(src.read())
+
+    def source(prefix, path):
+        if input_kind == "base64":
+            with open(path, "rb") as f:
+                return {f"{prefix}_base64": base64.b64encode(f.read()).decode("utf-8")}
+        return {f"{prefix}_path": path}
+
+    jobs = []
+    for index in range(count):
+        input_type, person_count = WORKFLOW_MIX[index % len(WORKFLOW_MIX)]
+        job_input = {"input_type": input_type, "person_count": person_count,
+                     "prompt": f"synthetic job {index}", "width": 512, "height": 512, "max_frame": 81}
+        job_input.update(source("image" if input_type == "image" else "video",
+                                image_path if input_type == "image" else video_path))
+        job_input.update(source("wav", audio_path))
+        if person_count == "multi":
+            job_input.update({f"{key}_2": value for key, value in source("wav", audio_path).items()})
+        jobs.append({"id": f"replay_{index}", "input": job_input})
+    return jobs
+
+
+# ---------------------------------------------------------------------- #
+# 콜백 수신 서버
+# ---------------------------------------------------------------------- #
+class CallbackSink:
+    """handler_callback이 보내는 콜백을 받아 개수와 바이트 수만 기록"""
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with sink.lock:
+                    sink.count += 1
+                    sink.bytes += len(body)
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/callback"
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# ---------------------------------------------------------------------- #
+# 실행
+# ---------------------------------------------------------------------- #
+def run(jobs, job_handler, concurrency):
+    """작업을 concurrency개 스레드로 재생하고 (작업별 지연, 응답 바이트, 실패 수, 전체 시간)을 반환"""
+    latencies = []
+    response_bytes = 0
+    failures = 0
+    lock = threading.Lock()
+
+    def run_one(job):
+        nonlocal response_bytes, failures
+        t = time.perf_counter()
+        try:
+            result = job_handler(job)
+            failed = not isinstance(result, dict) or "error" in result
+            size = len(json.dumps(result))
+        except Exception as e:
+            logging.getLogger(__name__).error(f"작업 실패 {job.get('id')}: {e}")
+            failed, size = True, 0
+        elapsed = time.perf_counter() - t
+        with lock:
+            latencies.append(elapsed)
+            response_bytes += size
+            failures += failed
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run_one, jobs))
+    return latencies, response_bytes, failures, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--jobs", help="재생할 작업 JSONL 파일")
+    source.add_argument("--synthetic", type=int, default=16, help="합성 작업 수")
+    parser.add_argument("--input-kind", choices=("path", "base64"), default="path", help="합성 작업의 입력 방식")
+    parser.add_argument("--target", choices=("handler", "callback"), default="handler")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=1, help="측정 전에 버리는 작업 수")
+    parser.add_argument("--node-delay", type=float, default=0.0, help="대역 서버의 노드당 실행 지연(초)")
+    parser.add_argument("--output-size", type=int, default=1024 * 1024, help="대역 서버 출력 MP4 크기(바이트)")
+    parser.add_argument("--server", help="이미 실행 중인 대역 서버 주소 (host:port, 포트를 생략하면 8188)")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON으로 출력")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="replay_")
+    os.environ.setdefault("WORKFLOW_DIR", ROOT)
+    os.environ.setdefault("INPUT_CACHE_DIR", os.path.join(work_dir, "input_cache"))
+    os.environ.setdefault("WARMUP_TEMPLATES", "none")
+    # 같은 합성 작업이 반복되므로 결과 캐시를 끄지 않으면 ComfyUI를 거치지 않음
+    os.environ.setdefault("RESULT_CACHE_MAX_GB", "0")
+    fake = None
+    if args.server:
+        host, _, port = args.server.partition(":")
+        os.environ["SERVER_ADDRESS"] = host
+        os.environ["COMFY_PORT"] = port or "8188"
+    else:
+        # 같은 머신의 실제 ComfyUI(8188)와 겹치지 않게 빈 포트에 띄움
+        fake = FakeComfyUI(os.path.join(work_dir, "outputs"), args.node_delay, args.output_size)
+        host, port = fake.start(port=0)
+        os.environ["SERVER_ADDRESS"] = host
+        os.environ["COMFY_PORT"] = str(port)
+    os.chdir(work_dir)
+
+    # handler는 import 시점에 환경 변수를 읽음
+    import handler
+    import handler_callback
+    logging.getLogger().setLevel(logging.WARNING)
+
+    jobs = load_jobs(args.jobs) if args.jobs else synthetic_jobs(args.synthetic, args.input_kind, work_dir)
+    if not jobs:
+        parser.error("재생할 작업이 없습니다.")
+    sink = None
+    if args.target == "callback":
+        sink = CallbackSink()
+        jobs = [{**job, "input": {**job["input"], "callback_url": sink.url}} for job in jobs]
+        job_handler = handler_callback.handler
+    else:
+        job_handler = handler.handler
+
+    handler.comfy.wait_until_ready()
+    try:
+        if args.warmup:
+            run(jobs[:args.warmup], job_handler, 1)
+        rchar, wchar = read_io_counters()
+        latencies, response_bytes, failures, elapsed = run(jobs, job_handler, args.concurrency)
+        if sink is not None:
+            # 콜백은 백그라운드에서 보내므로 다 보낼 때까지 기다린 뒤 바이트 수를 셈
+            handler_callback.outbox.wait_idle(60)
+        rchar_end, wchar_end = read_io_counters()
+    finally:
+        if sink is not None:
+            sink.stop()
+        if fake is not None:
+            fake.stop()
+
+    report = {
+        "target": args.target,
+        "jobs": len(jobs),
+        "concurrency": args.concurrency,
+        "failures": failures,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_jobs_per_s": round(len(jobs) / elapsed, 3),
+        "latency_s": {
+            "mean": round(statistics.mean(latencies), 4),
+            "p50": round(percentile(latencies, 50), 4),
+            "p90": round(percentile(latencies, 90), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "max": round(max(latencies), 4),
+        },
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "bytes": {
+            "read": rchar_end - rchar,
+            "written": wchar_end - wchar,
+            "responses": response_bytes,
+            "callbacks": sink.bytes if sink else 0,
+            "per_job": round((rchar_end - rchar + wchar_end - wchar) / len(jobs)),
+        },
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['target']}: {report['jobs']} jobs x{report['concurrency']} in {report['elapsed_s']}s "
+          f"({report['throughput_jobs_per_s']} jobs/s, {failures} failed)")
+    latency = report["latency_s"]
+    print(f"  latency  mean {latency['mean']}s  p50 {latency['p50']}s  p90 {latency['p90']}s  "
+          f"p99 {latency['p99']}s  max {latency['max']}s")
+    print(f"  peak RSS {report['peak_rss_mb']} MB")
+    copied = report["bytes"]
+    print(f"  bytes    read {copied['read']}  written {copied['written']}  responses {copied['responses']}  "
+          f"callbacks {copied['callbacks']}  (~{copied['per_job']} per job)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+import http.client
+import json
+import logging
+import queue
+import struct
+import threading
+import time
+import urllib.parse
+import uuid
+
+import websocket
+
+logger = logging.getLogger(__name__)
+
+# 연결이 끊긴 keep-alive 소켓을 재사용하려 할 때 발생하는 예외들
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+class ComfyUIClient:
+    """프로세스당 하나만 생성해 모든 작업이 공유하는 ComfyUI 클라이언트
+
+    - HTTP 요청은 keep-alive 연결 풀을 재사용합니다.
+    - client_id에 묶인 웹소켓 하나를 백그라운드 스레드가 유지하며,
+      끊어지면 자동으로 재연결합니다.
+    - 수신한 메시지는 prompt_id별 큐로 분배됩니다.
+    """
+
+    def __init__(self, server_address, client_id, port=8188, pool_size=4, timeout=30):
+        self.server_address = server_address
+        self.client_id = client_id
+        self.port = port
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._ready = False
+        self._ready_lock = threading.Lock()
+        self._ws = None
+        self._ws_thread = None
+        self._closed = threading.Event()
+        self._subscribers = {}
+        self._preview_subscribers = set()
+        self._subscribers_lock = threading.Lock()
+        self._executing_prompt = None
+
+    @property
+    def http_url(self):
+        return f"http://{self.server_address}:{self.port}"
+
+    @property
+    def ws_url(self):
+        return f"ws://{self.server_address}:{self.port}/ws?clientId={self.client_id}"
+
+    # ------------------------------------------------------------------ #
+    # 준비 상태
+    # ------------------------------------------------------------------ #
+    def wait_until_ready(self, max_http_attempts=180, max_ws_attempts=36):
+        """ComfyUI가 응답할 때까지 한 번만 대기하고 웹소켓 수신 스레드를 시작"""
+        if self._ready:
+            return
+        with self._ready_lock:
+            if self._ready:
+                return
+
+            logger.info(f"Checking HTTP connection to: {self.http_url}/")
+            for http_attempt in range(max_http_attempts):
+                try:
+                    self.request("GET", "/")
+                    logger.info(f"HTTP 연결 성공 (시도 {http_attempt+1})")
+                    break
+                except Exception as e:
+                    logger.warning(f"HTTP 연결 실패 (시도 {http_attempt+1}/{max_http_attempts}): {e}")
+                    if http_attempt == max_http_attempts - 1:
+                        raise Exception("ComfyUI 서버에 연결할 수 없습니다. 서버가 실행 중인지 확인하세요.")
+                    time.sleep(1)
+
+            logger.info(f"Connecting to WebSocket: {self.ws_url}")
+            for attempt in range(max_ws_attempts):
+                try:
+                    self._connect_ws()
+                    logger.info(f"웹소켓 연결 성공 (시도 {attempt+1})")
+                    break
+                except Exception as e:
+                    logger.warning(f"웹소켓 연결 실패 (시도 {attempt+1}/{max_ws_attempts}): {e}")
+                    if attempt == max_ws_attempts - 1:
+                        raise Exception("웹소켓 연결 시간 초과 (3분)")
+                    time.sleep(5)
+
+            self._ws_thread = threading.Thread(target=self._ws_loop, name="comfyui-ws", daemon=True)
+            self._ws_thread.start()
+            self._ready = True
+
+    def close(self):
+        """웹소켓과 풀에 남은 HTTP 연결을 모두 닫음"""
+        self._closed.set()
+        if self._ws is not None:
+            try:
+                self._ws.close()
+            except Exception:
+                pass
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        self._ready = False
+
+    # ------------------------------------------------------------------ #
+    # HTTP
+    # ------------------------------------------------------------------ #
+    def _new_connection(self):
+        return http.client.HTTPConnection(self.server_address, self.port, timeout=self.timeout)
+
+    def _release(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method, path, body=None, headers=None):
+        """풀의 연결로 요청을 보내고 (status, body bytes)를 반환
+
+        재사용한 연결이 서버 쪽에서 이미 닫혀 있었다면 새 연결로 한 번 재시도합니다.
+        """
+        for attempt in range(2):
+            try:
+                conn = self._pool.get_nowait()
+                reused = True
+            except queue.Empty:
+                conn = self._new_connection()
+                reused = False
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                data = response.read()
+            except _STALE_CONNECTION_ERRORS:
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            return response.status, data
+
+    def _request_json(self, method, path, payload=None):
+        body = None
+        headers = {}
+        if payload is not None:
+            body = json.dumps(payload).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        status, data = self.request(method, path, body=body, headers=headers)
+        if status != 200:
+            raise Exception(f"ComfyUI HTTP 에러 {status} ({method} {path}): {data.decode('utf-8', 'replace')}")
+        return json.loads(data) if data else {}
+
+    def queue_prompt(self, prompt, prompt_id=None):
+        """/prompt로 워크플로우를 전송하고 응답(JSON)을 반환"""
+        payload = {"prompt": prompt, "client_id": self.client_id}
+        if prompt_id is not None:
+            payload["prompt_id"] = prompt_id
+        return self._request_json("POST", "/prompt", payload)
+
+    def get_history(self, prompt_id):
+        return self._request_json("GET", f"/history/{prompt_id}")
+
+    def delete_history(self, prompt_ids):
+        """끝난 프롬프트의 history 항목을 삭제 (ComfyUI는 history를 메모리에 계속 쌓음)"""
+        return self._request_json("POST", "/history", {"delete": list(prompt_ids)})
+
+    def free_models(self, unload_models=True, free_memory=False):
+        """/free로 모델 언로드를 요청 (실행 중인 프롬프트가 있으면 그 프롬프트가 끝난 뒤 적용됨)
+
+        free_memory=True는 노드 출력 캐시까지 비워 공통 로더(VAE, CLIP vision 등)도 다시 실행하게 합니다.
+        """
+        return self._request_json("POST", "/free", {"unload_models": unload_models, "free_memory": free_memory})
+
+    def get_view(self, filename, subfolder, folder_type):
+        query = urllib.parse.urlencode({"filename": filename, "subfolder": subfolder, "type": folder_type})
+        status, data = self.request("GET", f"/view?{query}")
+        if status != 200:
+            raise Exception(f"ComfyUI HTTP 에러 {status} (GET /view): {filename}")
+        return data
+
+    # ------------------------------------------------------------------ #
+    # 웹소켓
+    # ------------------------------------------------------------------ #
+    def _connect_ws(self):
+        ws = websocket.WebSocket()
+        ws.connect(self.ws_url, timeout=self.timeout)
+        self._ws = ws
+
+    def _ws_loop(self):
+        """웹소켓 메시지를 읽어 prompt_id별 구독 큐로 분배 (끊기면 재연결)"""
+        backoff = 1
+        while not self._closed.is_set():
+            if self._ws is None:
+                try:
+                    self._connect_ws()
+                    logger.info("웹소켓 재연결 성공")
+                    backoff = 1
+                except Exception as e:
+                    logger.warning(f"웹소켓 재연결 실패, {backoff}초 후 재시도: {e}")
+                    self._closed.wait(backoff)
+                    backoff = min(backoff * 2, 30)
+                    continue
+            try:
+                out = self._ws.recv()
+            except websocket.WebSocketTimeoutException:
+                # 유휴 상태에서는 ping으로 연결이 살아있는지만 확인
+                try:
+                    self._ws.ping()
+                    continue
+                except Exception as e:
+                    logger.warning(f"웹소켓 ping 실패: {e}")
+            except Exception as e:
+                if self._closed.is_set():
+                    break
+                logger.warning(f"웹소켓 수신 오류, 재연결합니다: {e}")
+            else:
+                if isinstance(out, str):
+                    self._dispatch(json.loads(out))
+                elif out:
+                    self._dispatch_binary(out)
+                continue
+
+            try:
+                self._ws.close()
+            except Exception:
+                pass
+            self._ws = None
+
+    def _dispatch(self, message):
+        # 큐에서 꺼낸 시각이 아니라 도착 시각으로 노드/대기 시간을 재도록 기록
+        message['received_at'] = time.perf_counter()
+        data = message.get('data') or {}
+        prompt_id = data.get('prompt_id') if isinstance(data, dict) else None
+        if message.get('type') == 'executing':
+            self._executing_prompt = prompt_id if data.get('node') is not None else None
+        with self._subscribers_lock:
+            if prompt_id is None:
+                # status(큐 길이) 같은 전역 메시지는 모든 구독자에게 전달
+                if message.get('type') != 'status':
+                    return
+                subscribers = list(self._subscribers.values())
+            else:
+                subscribers = [self._subscribers[prompt_id]] if prompt_id in self._subscribers else []
+        for subscriber in subscribers:
+            subscriber.put(message)
+
+    def _dispatch_binary(self, payload):
+        """바이너리 미리보기 프레임을 실행 중인 프롬프트의 미리보기 구독자에게 전달
+
+        미리보기를 원하는 구독자가 없으면 바로 버립니다.
+        """
+        prompt_id = self._executing_prompt
+        with self._subscribers_lock:
+            if prompt_id not in self._preview_subscribers:
+                return
+            subscriber = self._subscribers.get(prompt_id)
+        if subscriber is None or len(payload) < 8:
+            return
+        event_type, image_type = struct.unpack(">II", payload[:8])
+        if event_type != 1:  # PREVIEW_IMAGE
+            return
+        subscriber.put({
+            "type": "preview",
+            "received_at": time.perf_counter(),
+            "data": {"prompt_id": prompt_id, "format": "png" if image_type == 2 else "jpeg", "image": payload[8:]},
+        })
+
+    def subscribe(self, prompt_id, previews=False):
+        """prompt_id에 대한 메시지 큐를 등록하고 반환 (previews=True면 미리보기 프레임도 수신)"""
+        with self._subscribers_lock:
+            if previews:
+                self._preview_subscribers.add(prompt_id)
+            return self._subscribers.setdefault(prompt_id, queue.Queue())
+
+    def unsubscribe(self, prompt_id):
+        with self._subscribers_lock:
+            self._subscribers.pop(prompt_id, None)
+            self._preview_subscribers.discard(prompt_id)
+
+    def get_queue(self):
+        return self._request_json("GET", "/queue")
+
+    def queue_position(self, prompt_id):
+        """대기열에서 앞에 남은 프롬프트 수 (실행 중이면 0, 대기열에 없으면 None)"""
+        queue_state = self.get_queue()
+        running = [item[1] for item in queue_state.get('queue_running', [])]
+        if prompt_id in running:
+            return 0
+        pending = sorted(queue_state.get('queue_pending', []), key=lambda item: item[0])
+        for index, item in enumerate(pending):
+            if item[1] == prompt_id:
+                return len(running) + index
+        return None
+
+    def submit(self, prompt, previews=False):
+        """구독을 먼저 등록한 뒤 프롬프트를 큐에 넣고 최종 prompt_id를 반환
+
+        prompt_id를 클라이언트에서 정해 보내므로 실행 직후의 메시지도 놓치지 않습니다.
+        (prompt_id 지정을 지원하지 않는 구버전 ComfyUI는 서버가 준 ID로 다시 구독합니다.)
+        """
+        prompt_id = str(uuid.uuid4())
+        subscriber = self.subscribe(prompt_id, previews)
+        try:
+            result = self.queue_prompt(prompt, prompt_id)
+        except Exception:
+            self.unsubscribe(prompt_id)
+            raise
+        logger.info(f"프롬프트 전송 성공: {result}")
+        actual_id = result.get('prompt_id', prompt_id)
+        if actual_id != prompt_id:
+            with self._subscribers_lock:
+                self._subscribers.pop(prompt_id, None)
+                self._subscribers[actual_id] = subscriber
+                if previews:
+                    self._preview_subscribers.discard(prompt_id)
+                    self._preview_subscribers.add(actual_id)
+        return actual_id
+
+    def iter_events(self, prompt_id, poll_interval=10):
+        """프롬프트 실행이 끝날 때까지 수신한 메시지를 차례로 넘겨주는 제너레이터
+
+        실행이 끝나면 그대로 종료하고, 실패/중단 메시지를 받으면 예외를 올립니다.
+        웹소켓이 재연결되는 동안 메시지를 놓칠 수 있으므로, 일정 시간 메시지가 없으면
+        /history를 확인해 완료 여부를 판단합니다.
+        """
+        subscriber = self.subscribe(prompt_id)
+        try:
+            while True:
+                try:
+                    message = subscriber.get(timeout=poll_interval)
+                except queue.Empty:
+                    history = self.get_history(prompt_id)
+                    if prompt_id in history:
+                        status = history[prompt_id].get('status') or {}
+                        if status.get('status_str') == 'error':
+                            raise Exception(f"ComfyUI 실행 실패 (prompt_id={prompt_id})")
+                        return
+                    continue
+
+                message_type = message.get('type')
+                data = message.get('data') or {}
+                if message_type == 'execution_error':
+                    raise Exception(
+                        f"ComfyUI 실행 실패 (node {data.get('node_id')} {data.get('node_type')}): "
+                        f"{data.get('exception_message', '').strip()}"
+                    )
+                if message_type == 'execution_interrupted':
+                    raise Exception(f"ComfyUI 실행이 중단되었습니다 (prompt_id={prompt_id})")
+                yield message
+                if message_type == 'executing' and data.get('node') is None:
+                    return
+        finally:
+            self.unsubscribe(prompt_id)
+
+    def wait_for_prompt(self, prompt_id, on_message=None, poll_interval=10):
+        """프롬프트 실행이 끝날 때까지 대기하고 history 항목을 반환
+
+        on_message가 있으면 수신한 메시지마다 호출합니다. 실패해도 구독 큐는 해제됩니다.
+        """
+        try:
+            for message in self.iter_events(prompt_id, poll_interval):
+                if on_message is not None:
+                    on_message(message)
+        finally:
+            self.unsubscribe(prompt_id)
+        return self.get_history(prompt_id)[prompt_id]
@@ -0,0 +1,185 @@
+"""작업 비용(GPU 초, 최대 VRAM) 추정과 실행 전 수락 판단
+
+GPU 시간은 샘플러 윈도우 수 x 윈도우당 latent 토큰 수에 비례하는 샘플링 시간,
+swap되는 블록 전송 시간, 프레임 x 픽셀에 비례하는 VAE 디코드 시간의 합으로 추정합니다.
+작업이 끝날 때마다 실제 실행 시간(metrics의 execution)으로 워크플로우별 보정 계수를 갱신하고
+COST_CALIBRATION_PATH에 저장하므로, 워커를 다시 띄워도 보정값이 유지됩니다. 모델을 새로 읽은 실행은
+로딩 시간이 섞여 있으므로 보정에 쓰지 않습니다.
+구간 분할 작업은 구간마다 고정 비용이 드는 별도 실행이므로 구간별 추정을 더해 상한과 비교합니다.
+"""
+import json
+import logging
+import math
+import os
+import threading
+
+from planner import latent_tokens
+
+logger = logging.getLogger(__name__)
+
+COST_CALIBRATION_PATH = os.getenv('COST_CALIBRATION_PATH', '/tmp/cost_calibration.json')
+# 실행 시간 상한(초). 0이면 추정만 하고 거부/조정하지 않음
+MAX_GPU_SECONDS = float(os.getenv('MAX_GPU_SECONDS', '0'))
+# 상한을 넘는 작업 처리: "reject", "clamp"(max_frame/구간 수 줄임),
+# "segment"(렌더링하지 않고 작업마다 상한 안에 들어가는 구간 계획을 돌려줌)
+ADMISSION_POLICY = os.getenv('ADMISSION_POLICY', 'reject')
+ADMISSION_POLICIES = ("reject", "clamp", "segment")
+
+COEFFICIENTS = {
+    # 워크플로우별 고정 비용 (텍스트/CLIP/wav2vec 인코딩, 보컬 분리, 비디오 합치기)
+    "base_seconds": {"I2V_single": 15.0, "I2V_multi": 25.0, "V2V_single": 20.0, "V2V_multi": 30.0},
+    # 샘플러 윈도우 하나, latent 토큰 1000개당 초 (6 steps 기준)
+    "window_seconds_per_1k_tokens": 1.5,
+    # swap되는 블록 하나가 윈도우마다 더하는 전송 시간(초)
+    "swap_seconds_per_block_window": 0.3,
+    # VAE 디코드: 100만 픽셀 x 프레임당 초
+    "decode_seconds_per_mpixel_frame": 0.02,
+    # 보정 계수 갱신 비율 (지수 이동 평균)
+    "ema_alpha": 0.2,
+    "min_factor": 0.2,
+    "max_factor": 5.0,
+}
+
+# 이 로더가 실행된 작업은 실행 시간에 모델 로딩이 섞이므로 보정에 쓰지 않음
+MODEL_LOADER_CLASSES = ("MultiTalkModelLoader", "WanVideoModelLoader")
+
+_lock = threading.Lock()
+_corrections = {}
+
+
+def load_corrections(path=None):
+    """저장된 워크플로우별 보정 계수를 읽음"""
+    path = path or COST_CALIBRATION_PATH
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    with _lock:
+        _corrections.clear()
+        _corrections.update(data)
+    return data
+
+
+def record_timing(workflow, predicted_seconds, actual_seconds, path=None):
+    """실제 실행 시간으로 워크플로우의 보정 계수(실제/예측)를 갱신하고 저장"""
+    if not predicted_seconds or not actual_seconds:
+        return
+    path = path or COST_CALIBRATION_PATH
+    alpha = COEFFICIENTS["ema_alpha"]
+    # 측정 이상값 하나가 추정을 망가뜨리지 않도록 범위를 제한
+    ratio = min(max(actual_seconds / predicted_seconds, COEFFICIENTS["min_factor"]), COEFFICIENTS["max_factor"])
+    with _lock:
+        entry = _corrections.get(workflow, {"factor": ratio, "samples": 0})
+        entry["factor"] = ratio if entry["samples"] == 0 else (1 - alpha) * entry["factor"] + alpha * ratio
+        entry["samples"] += 1
+        _corrections[workflow] = entry
+        snapshot = dict(_corrections)
+    try:
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        logger.warning(f"비용 보정값을 저장하지 못했습니다: {e}")
+
+
+def weights_loaded(nodes):
+    """JobMetrics.nodes에 캐시되지 않고 실행된 큰 가중치 로더가 있는지 (콜드 스타트/모델 전환)"""
+    return any(
+        node.get("class_type") in MODEL_LOADER_CLASSES and not node.get("cached") for node in nodes.values()
+    )
+
+
+def correction_factor(workflow):
+    with _lock:
+        return _corrections.get(workflow, {}).get("factor", 1.0)
+
+
+def sampler_windows(max_frame, frame_window_size, motion_frame):
+    stride = frame_window_size - motion_frame
+    return max(1, math.ceil(max(max_frame - motion_frame, 1) / stride))
+
+
+def estimate_cost(workflow, width, height, max_frame, frame_window_size=81, motion_frame=9,
+                  blocks_to_swap=0, peak_gb=None):
+    """작업 하나의 GPU 시간(초)과 최대 VRAM(GB) 추정"""
+    windows = sampler_windows(max_frame, frame_window_size, motion_frame)
+    tokens = latent_tokens(width, height, frame_window_size)
+    sampling = windows * (tokens / 1000 * COEFFICIENTS["window_seconds_per_1k_tokens"]
+                          + blocks_to_swap * COEFFICIENTS["swap_seconds_per_block_window"])
+    decode = width * height * max_frame / 1e6 * COEFFICIENTS["decode_seconds_per_mpixel_frame"]
+    raw = COEFFICIENTS["base_seconds"].get(workflow, 20.0) + sampling + decode
+    factor = correction_factor(workflow)
+    return {
+        "workflow": workflow,
+        "frames": max_frame,
+        "windows": windows,
+        "gpu_seconds": round(raw * factor, 1),
+        "raw_gpu_seconds": round(raw, 1),
+        "correction_factor": round(factor, 3),
+        "peak_gb": peak_gb,
+    }
+
+
+def estimate_segments(segment_frames, workflow, width, height, frame_window_size=81, motion_frame=9,
+                      blocks_to_swap=0, peak_gb=None):
+    """구간마다 프롬프트를 따로 실행하는 작업의 비용 (구간별 추정의 합, 고정 비용도 구간마다 듦)"""
+    parts = [
+        estimate_cost(workflow, width, height, frames, frame_window_size, motion_frame, blocks_to_swap)
+        for frames in segment_frames
+    ]
+    return {
+        "workflow": workflow,
+        "frames": sum(part["frames"] for part in parts),
+        "windows": sum(part["windows"] for part in parts),
+        "segments": len(parts),
+        "gpu_seconds": round(sum(part["gpu_seconds"] for part in parts), 1),
+        "raw_gpu_seconds": round(sum(part["raw_gpu_seconds"] for part in parts), 1),
+        "correction_factor": round(correction_factor(workflow), 3),
+        "peak_gb": peak_gb,
+    }
+
+
+def segments_within(budget_seconds, segment_frames, workflow, width, height, frame_window_size=81, motion_frame=9,
+                    blocks_to_swap=0):
+    """앞 구간부터 더해 GPU 시간 예산 안에 들어가는 구간 수"""
+    total = 0.0
+    for count, frames in enumerate(segment_frames):
+        total += estimate_cost(
+            workflow, width, height, frames, frame_window_size, motion_frame, blocks_to_swap
+        )["gpu_seconds"]
+        if total > budget_seconds:
+            return count
+    return len(segment_frames)
+
+
+def max_frames_within(budget_seconds, workflow, width, height, frame_window_size=81, motion_frame=9,
+                      blocks_to_swap=0):
+    """GPU 시간 예산 안에 들어가는 가장 큰 max_frame (윈도우 경계 기준, 하나도 안 들어가면 0)"""
+    stride = frame_window_size - motion_frame
+    best = 0
+    windows = 1
+    while True:
+        frames = windows * stride + motion_frame
+        cost = estimate_cost(workflow, width, height, frames, frame_window_size, motion_frame, blocks_to_swap)
+        if cost["gpu_seconds"] > budget_seconds:
+            return best
+        best = frames
+        windows += 1
+
+
+def admit(estimate, policy, max_gpu_seconds=None, vram_budget_gb=None):
+    """추정 비용으로 수락 여부를 판단해 (action, reason)을 반환
+
+    action은 "accept", "reject", "clamp", "segment" 중 하나이며,
+    VRAM이 부족한 작업은 정책과 관계없이 거부합니다.
+    """
+    max_gpu_seconds = MAX_GPU_SECONDS if max_gpu_seconds is None else max_gpu_seconds
+    if vram_budget_gb and estimate.get("peak_gb") and estimate["peak_gb"] > vram_budget_gb:
+        return "reject", f"예상 VRAM {estimate['peak_gb']}GB가 예산 {vram_budget_gb:.1f}GB를 넘습니다"
+    if not max_gpu_seconds or estimate["gpu_seconds"] <= max_gpu_seconds:
+        return "accept", None
+    reason = f"예상 GPU 시간 {estimate['gpu_seconds']}초가 상한 {max_gpu_seconds:.0f}초를 넘습니다"
+    if policy not in ADMISSION_POLICIES:
+        policy = "reject"
+    return policy, reason
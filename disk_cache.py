@@ -0,0 +1,188 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def sha256_file(file_path, chunk_size=1024 * 1024):
+    """파일 내용의 sha256 해시"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """내용 해시로 주소가 정해지는 디스크 캐시 (용량 상한 + LRU 제거)
+
+    - blobs/<sha256><ext>: 실제 파일. 같은 내용은 키가 달라도 한 번만 저장됩니다.
+    - index/<sha256(key)>.json: 키 -> blob 해시와 부가 정보(ETag 등)
+    - locks/: 키별 flock. 같은 키를 동시에 채우려는 작업(스레드/프로세스)을 직렬화합니다.
+
+    조회 시 blob의 mtime을 갱신해 LRU 순서로 사용하며, 용량을 넘으면 가장 오래
+    쓰이지 않은 blob부터 지웁니다. 방금 사용된 항목(min_age 이내)은 실행 중인
+    작업이 읽고 있을 수 있으므로 지우지 않습니다.
+    """
+
+    def __init__(self, root, max_bytes, min_age=3600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self.blob_dir = os.path.join(root, "blobs")
+        self.index_dir = os.path.join(root, "index")
+        self.lock_dir = os.path.join(root, "locks")
+        self.tmp_dir = os.path.join(root, "tmp")
+        for path in (self.blob_dir, self.index_dir, self.lock_dir, self.tmp_dir):
+            os.makedirs(path, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def _key_hash(key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _index_path(self, key):
+        return os.path.join(self.index_dir, f"{self._key_hash(key)}.json")
+
+    def blob_path(self, digest, ext=""):
+        return os.path.join(self.blob_dir, f"{digest}{ext}")
+
+    def make_temp_path(self, suffix=""):
+        """캐시와 같은 파일시스템의 임시 경로 (put_file에서 원자적 rename 가능)"""
+        fd, path = tempfile.mkstemp(dir=self.tmp_dir, suffix=suffix)
+        os.close(fd)
+        return path
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """키 단위 배타 잠금 (다른 스레드/프로세스의 같은 키 작업과 직렬화)"""
+        lock_path = os.path.join(self.lock_dir, f"{self._key_hash(key)}.lock")
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, key):
+        """키에 대한 항목을 반환 (없거나 blob이 지워졌으면 None)
+
+        반환값은 put 때 저장한 메타데이터에 "path"(blob 경로)가 추가된 딕셔너리입니다.
+        """
+        if not self.enabled:
+            return None
+        try:
+            with open(self._index_path(key), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        path = self.blob_path(entry["sha256"], entry.get("ext", ""))
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # blob이 제거된 항목은 색인에서도 지움
+            self._remove_index(key)
+            return None
+        entry["path"] = path
+        return entry
+
+    def _remove_index(self, key):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._index_path(key))
+
+    def put_file(self, key, src_path, ext="", meta=None, move=True, digest=None):
+        """파일을 캐시에 넣고 blob 경로를 반환
+
+        move=True이면 원본을 옮기고(같은 파일시스템이면 rename), 아니면 복사합니다.
+        이미 같은 내용의 blob이 있으면 원본은 버리고 기존 blob을 사용합니다.
+        """
+        if not self.enabled:
+            return src_path
+        digest = digest or sha256_file(src_path)
+        path = self.blob_path(digest, ext)
+        if os.path.exists(path):
+            os.utime(path)
+            if move:
+                os.remove(src_path)
+        else:
+            staging = self.make_temp_path(ext)
+            if move:
+                shutil.move(src_path, staging)
+            else:
+                shutil.copyfile(src_path, staging)
+            os.replace(staging, path)
+        self.put_meta(key, digest, ext, meta)
+        self.evict()
+        return path
+
+    def put_meta(self, key, digest, ext="", meta=None):
+        """키 -> 기존 blob 매핑만 기록 (원자적 교체)"""
+        entry = dict(meta or {})
+        entry.update({"key": key, "sha256": digest, "ext": ext, "stored_at": time.time()})
+        staging = self.make_temp_path(".json")
+        with open(staging, 'w') as f:
+            json.dump(entry, f)
+        os.replace(staging, self._index_path(key))
+
+    def evict(self):
+        """용량 상한을 넘으면 가장 오래 사용되지 않은 blob부터 삭제하고 회수한 바이트를 반환"""
+        blobs = []
+        total = 0
+        for entry in os.scandir(self.blob_dir):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            blobs.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return 0
+
+        reclaimed = 0
+        now = time.time()
+        for mtime, size, path in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            if now - mtime < self.min_age:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            reclaimed += size
+        if reclaimed:
+            self.prune_index()
+        if total > self.max_bytes:
+            logger.warning(f"⚠️ 캐시 용량 초과 ({total} > {self.max_bytes} bytes): 최근 사용 항목만 남아 있습니다 ({self.root})")
+        if reclaimed:
+            logger.info(f"🧹 캐시 정리: {reclaimed} bytes 회수 ({self.root})")
+        return reclaimed
+
+    def prune_index(self):
+        """blob이 없어진 색인 항목을 지우고 지운 개수를 반환"""
+        removed = 0
+        for entry in os.scandir(self.index_dir):
+            try:
+                with open(entry.path, 'r') as f:
+                    meta = json.load(f)
+                path = self.blob_path(meta["sha256"], meta.get("ext", ""))
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, KeyError):
+                path = None
+            if path is None or not os.path.exists(path):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(entry.path)
+                    removed += 1
+        return removed
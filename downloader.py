@@ -0,0 +1,111 @@
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = int(os.getenv('DOWNLOAD_TIMEOUT', '30'))
+DOWNLOAD_MAX_RETRIES = int(os.getenv('DOWNLOAD_MAX_RETRIES', '3'))
+DOWNLOAD_MAX_WORKERS = int(os.getenv('DOWNLOAD_MAX_WORKERS', '4'))
+
+
+class DownloadCancelled(Exception):
+    """다른 입력이 실패해 다운로드가 중단된 경우"""
+
+
+class NotModified(Exception):
+    """조건부 요청(If-None-Match/If-Modified-Since)에 서버가 304로 응답한 경우"""
+
+
+def download_file(url, output_path, timeout=DOWNLOAD_TIMEOUT, max_retries=DOWNLOAD_MAX_RETRIES,
+                  cancel_event=None, headers=None):
+    """URL을 프로세스 안에서 직접 내려받아 output_path에 저장하고 응답 헤더를 반환
+
+    연결이 중간에 끊기면 이미 받은 크기부터 Range 요청으로 이어받고,
+    서버가 Range를 지원하지 않으면(200 응답) 처음부터 다시 받습니다.
+    cancel_event가 설정되면 청크 사이에서 즉시 중단합니다.
+    조건부 헤더를 넘겼고 서버가 304로 응답하면 NotModified를 올립니다.
+    """
+    part_path = f"{output_path}.part"
+    if os.path.exists(part_path):
+        os.remove(part_path)
+
+    for attempt in range(max_retries + 1):
+        received = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        request = urllib.request.Request(url, headers={"User-Agent": "avatar-handler", **(headers or {})})
+        if received:
+            request.add_header("Range", f"bytes={received}-")
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                if received and response.status != 206:
+                    # Range 미지원: 처음부터 다시 받기
+                    received = 0
+                mode = 'ab' if received else 'wb'
+                response_headers = response.headers
+                expected = response.headers.get("Content-Length")
+                expected = received + int(expected) if expected is not None else None
+                with open(part_path, mode) as f:
+                    for chunk in iter(lambda: response.read(DOWNLOAD_CHUNK_SIZE), b''):
+                        if cancel_event is not None and cancel_event.is_set():
+                            raise DownloadCancelled(f"다운로드 취소됨: {url}")
+                        f.write(chunk)
+                        received += len(chunk)
+            if expected is not None and received < expected:
+                raise ConnectionError(f"응답이 중간에 끊겼습니다 ({received}/{expected} bytes)")
+            os.replace(part_path, output_path)
+            return response_headers
+        except DownloadCancelled:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                raise NotModified(url)
+            # 4xx는 재시도해도 소용이 없음 (416은 Range 문제이므로 처음부터 재시도)
+            if e.code == 416 and os.path.exists(part_path):
+                os.remove(part_path)
+            elif 400 <= e.code < 500:
+                raise Exception(f"URL 다운로드 실패: HTTP {e.code} {e.reason}")
+            last_error = e
+        except Exception as e:
+            last_error = e
+
+        if attempt < max_retries:
+            delay = min(2 ** attempt, 10)
+            logger.warning(f"⚠️ 다운로드 재시도 {attempt+1}/{max_retries} ({delay}초 후): {url} - {last_error}")
+            if cancel_event is not None and cancel_event.wait(delay):
+                raise DownloadCancelled(f"다운로드 취소됨: {url}")
+            elif cancel_event is None:
+                time.sleep(delay)
+
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    raise Exception(f"URL 다운로드 실패: {last_error}")
+
+
+def fetch_all(tasks, max_workers=DOWNLOAD_MAX_WORKERS):
+    """이름 -> 작업 함수(cancel_event를 인자로 받음) 딕셔너리를 병렬로 실행
+
+    모든 결과를 {이름: 반환값}으로 돌려주며, 하나라도 실패하면 나머지 작업에
+    취소 신호를 보내고 첫 번째 예외를 그대로 올립니다.
+    """
+    if not tasks:
+        return {}
+    cancel_event = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(tasks)), thread_name_prefix="fetch")
+    try:
+        futures = {executor.submit(task, cancel_event): name for name, task in tasks.items()}
+        done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+        failed = [f for f in done if f.exception() is not None]
+        if failed:
+            # 진행 중인 다운로드는 다음 청크에서 취소 신호를 보고 스스로 정리됨
+            cancel_event.set()
+            raise failed[0].exception()
+        return {futures[f]: f.result() for f in futures}
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -1,17 +1,22 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
+# 미리보기 프레임은 스트리밍 모드에서 stream_previews를 쓸 때만 필요 (기본: 보내지 않음)
+export COMFY_PREVIEW_METHOD="${COMFY_PREVIEW_METHOD:-none}"
+# 핸들러도 같은 값을 읽어 접속하므로 export
+export COMFY_PORT="${COMFY_PORT:-8188}"
+
 echo "[entrypoint] starting ComfyUI..."
-python -u /ComfyUI/main.py --disable-auto-launch --listen 0.0.0.0 --port 8188 &
+python -u /ComfyUI/main.py --disable-auto-launch --listen 0.0.0.0 --port "${COMFY_PORT}" --preview-method "${COMFY_PREVIEW_METHOD}" &
 
-echo "[entrypoint] waiting ComfyUI on 127.0.0.1:8188 ..."
+echo "[entrypoint] waiting ComfyUI on 127.0.0.1:${COMFY_PORT} ..."
 for i in {1..180}; do
-  if wget -qO- http://127.0.0.1:8188/ >/dev/null 2>&1; then
+  if wget -qO- http://127.0.0.1:${COMFY_PORT}/ >/dev/null 2>&1; then
     echo "[entrypoint] ComfyUI is up."
     break
   fi
   sleep 1
 done
 
-echo "[entrypoint] starting RunPod handler..."
+echo "[entrypoint] starting RunPod handler (warmup runs before it accepts jobs)..."
 exec python -u /handler.py
@@ -1,67 +1,226 @@
 import runpod
 from runpod.serverless.utils import rp_upload
 import os
-import websocket
 import base64
 import json
 import uuid
 import logging
-import urllib.request
-import urllib.parse
 import binascii # Base64 에러 처리를 위해 import
-import subprocess
 import time
-import librosa
+import functools
+import hashlib
+import shutil
+import asyncio
+import collections
+import subprocess
+from comfy_client import ComfyUIClient
+from downloader import DownloadCancelled, NotModified, download_file, fetch_all
+from disk_cache import DiskCache
+from workflows import OUTPUT_PROFILES, apply_output_profile, apply_start_image, get_template, load_templates
+import audio_probe
+import segments
+import warmup
+import planner
+import cost_model
+import result_cache
+import stems
+import video_prep
+import image_prep
+import scratch
+import residency
+from residency import model_residency
+from metrics import JobMetrics, observe as observe_metrics, span, start_http_server as start_metrics_server
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 server_address = os.getenv('SERVER_ADDRESS', '127.0.0.1')
+comfy_port = int(os.getenv('COMFY_PORT', '8188'))
 client_id = str(uuid.uuid4())
+# 모든 작업이 공유하는 ComfyUI 클라이언트 (HTTP keep-alive 풀 + 재연결 웹소켓)
+comfy = ComfyUIClient(server_address, client_id, port=comfy_port)
+
+# 워크플로우 템플릿은 시작 시 한 번만 읽고 검증
+templates = load_templates()
+
+# 결과 전달 방식: "base64"(응답에 포함) 또는 "s3"(버킷 업로드 후 URL 반환)
+OUTPUT_MODES = ("base64", "s3")
+DEFAULT_OUTPUT_MODE = os.getenv('OUTPUT_MODE', 'base64')
+# 출력 인코딩 프로필: "preview"(축소 + 높은 CRF), "standard"(워크플로우 기본값) 또는 "archive"(H.265 10bit)
+DEFAULT_OUTPUT_PROFILE = os.getenv('OUTPUT_PROFILE', 'standard')
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# 메모리 계획에 쓸 VRAM 예산 (VRAM_BUDGET_GB 또는 감지한 값, 모르면 워크플로우 기본 설정 사용)
+VRAM_BUDGET_GB = planner.detect_vram_gb()
+PLANNER_CALIBRATION = planner.load_calibration()
+# 이전 실행 기록으로 보정한 비용 모델 계수
+cost_model.load_corrections()
+
+# Base64 입력은 이 크기(문자 수, 4의 배수)씩 나눠 디코딩해 전체 디코딩 결과를 메모리에 두지 않음
+BASE64_CHUNK_CHARS = 4 * 1024 * 1024
+# 디코딩 후 입력 하나의 최대 크기 (0이면 제한 없음)
+MAX_BASE64_BYTES = int(float(os.getenv('MAX_BASE64_MB', '200')) * 1024 * 1024)
+# 로그에 남길 때 이보다 긴 문자열 필드는 길이와 해시로 대체
+LOG_FIELD_MAX_CHARS = 256
 
-def download_file_from_url(url, output_path):
-    """URL에서 파일을 다운로드하는 함수"""
+# 핸들러 모드: "sync"(기본, 결과만 반환), "stream"(진행 이벤트를 yield) 또는 "async"(여러 작업을 겹쳐 처리)
+HANDLER_MODE = os.getenv('HANDLER_MODE', 'sync')
+# async 모드에서 워커가 동시에 받는 작업 수 (GPU 실행은 한 번에 하나, 나머지는 입력 준비/결과 전달)
+MAX_CONCURRENCY = int(os.getenv('MAX_CONCURRENCY', '2'))
+# entrypoint.sh가 ComfyUI에 넘기는 미리보기 방식 (none이면 미리보기 프레임을 보내지 않음)
+PREVIEW_METHOD = os.getenv('COMFY_PREVIEW_METHOD', 'none')
+PROGRESS_MIN_INTERVAL = 0.5
+
+# URL/Base64 입력 캐시 (INPUT_CACHE_MAX_GB=0이면 사용 안 함)
+input_cache = DiskCache(
+    os.getenv('INPUT_CACHE_DIR', '/tmp/input_cache'),
+    int(float(os.getenv('INPUT_CACHE_MAX_GB', '10')) * 1024 ** 3),
+)
+
+def download_file_from_url(url, output_path, cancel_event=None):
+    """URL에서 파일을 다운로드하는 함수 (Range 이어받기 지원)"""
     try:
-        # wget을 사용하여 파일 다운로드
-        result = subprocess.run([
-            'wget', '-O', output_path, '--no-verbose', '--timeout=30', url
-        ], capture_output=True, text=True, timeout=60)
-        
-        if result.returncode == 0:
-            logger.info(f"✅ URL에서 파일을 성공적으로 다운로드했습니다: {url} -> {output_path}")
-            return output_path
-        else:
-            logger.error(f"❌ wget 다운로드 실패: {result.stderr}")
-            raise Exception(f"URL 다운로드 실패: {result.stderr}")
-    except subprocess.TimeoutExpired:
-        logger.error("❌ 다운로드 시간 초과")
-        raise Exception("다운로드 시간 초과")
+        download_file(url, output_path, cancel_event=cancel_event)
+        logger.info(f"✅ URL에서 파일을 성공적으로 다운로드했습니다: {url} -> {output_path}")
+        return output_path
+    except DownloadCancelled:
+        logger.info(f"⏹️ 다른 입력 실패로 다운로드를 중단했습니다: {url}")
+        raise
     except Exception as e:
         logger.error(f"❌ 다운로드 중 오류 발생: {e}")
         raise Exception(f"다운로드 중 오류 발생: {e}")
 
+def base64_payload_start(base64_data):
+    """data URI 접두어("data:...;base64,")가 있으면 그 뒤의 시작 위치를 반환"""
+    if base64_data.startswith("data:"):
+        comma = base64_data.find(",", 0, 256)
+        if comma >= 0:
+            return comma + 1
+    return 0
+
+def check_base64_size(base64_data):
+    """디코딩 전에 길이로 디코딩 후 크기를 추정해 MAX_BASE64_BYTES를 넘으면 거부"""
+    estimated = (len(base64_data) - base64_payload_start(base64_data)) * 3 // 4 - base64_data[-2:].count("=")
+    if MAX_BASE64_BYTES and estimated > MAX_BASE64_BYTES:
+        raise Exception(
+            f"Base64 입력이 너무 큽니다: 약 {estimated / 1024 ** 2:.1f}MB "
+            f"(최대 {MAX_BASE64_BYTES / 1024 ** 2:.0f}MB, MAX_BASE64_MB). URL 입력을 사용하세요."
+        )
+
+def decode_base64_to_file(base64_data, file_path, chunk_chars=BASE64_CHUNK_CHARS):
+    """Base64 문자열을 청크 단위로 디코딩해 파일에 쓰고 디코딩된 바이트 수를 반환
+
+    청크 경계가 4문자 단위가 되도록 남는 문자는 다음 청크로 넘기며, 줄바꿈 등 공백은 무시합니다.
+    """
+    written = 0
+    carry = ""
+    with open(file_path, 'wb') as f:
+        for start in range(base64_payload_start(base64_data), len(base64_data), chunk_chars):
+            chunk = carry + base64_data[start:start + chunk_chars]
+            if not chunk.isalnum():
+                # 영숫자가 아닌 문자(+, /, =, 공백)가 있을 때만 공백 제거
+                chunk = "".join(chunk.split())
+            usable = len(chunk) - len(chunk) % 4
+            carry = chunk[usable:]
+            if usable:
+                written += f.write(base64.b64decode(chunk[:usable], validate=True))
+        if carry:
+            # 패딩이 생략된 입력도 받아줌
+            written += f.write(base64.b64decode(carry + "=" * (-len(carry) % 4), validate=True))
+    return written
+
 def save_base64_to_file(base64_data, temp_dir, output_filename):
     """Base64 데이터를 파일로 저장하는 함수"""
+    check_base64_size(base64_data)
+    # 디렉토리가 존재하지 않으면 생성
+    os.makedirs(temp_dir, exist_ok=True)
+    file_path = os.path.abspath(os.path.join(temp_dir, output_filename))
     try:
-        # Base64 문자열 디코딩
-        decoded_data = base64.b64decode(base64_data)
-        
-        # 디렉토리가 존재하지 않으면 생성
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # 파일로 저장
-        file_path = os.path.abspath(os.path.join(temp_dir, output_filename))
-        with open(file_path, 'wb') as f:
-            f.write(decoded_data)
-        
-        logger.info(f"✅ Base64 입력을 '{file_path}' 파일로 저장했습니다.")
-        return file_path
+        size = decode_base64_to_file(base64_data, file_path)
     except (binascii.Error, ValueError) as e:
+        if os.path.exists(file_path):
+            os.remove(file_path)
         logger.error(f"❌ Base64 디코딩 실패: {e}")
         raise Exception(f"Base64 디코딩 실패: {e}")
 
-def process_input(input_data, temp_dir, output_filename, input_type):
+    logger.info(f"✅ Base64 입력을 '{file_path}' 파일로 저장했습니다 ({size} bytes).")
+    return file_path
+
+def base64_sha256(base64_data, chunk_chars=BASE64_CHUNK_CHARS):
+    """Base64 문자열의 sha256 (인코딩 사본을 한 번에 만들지 않도록 청크 단위로 계산)"""
+    digest = hashlib.sha256()
+    for start in range(0, len(base64_data), chunk_chars):
+        digest.update(base64_data[start:start + chunk_chars].encode('utf-8'))
+    return digest.hexdigest()
+
+def summarize_for_log(value, max_chars=LOG_FIELD_MAX_CHARS):
+    """로그용으로 긴 문자열(base64 등)을 길이와 해시로 줄인 사본을 반환"""
+    if isinstance(value, dict):
+        return {key: summarize_for_log(item, max_chars) for key, item in value.items()}
+    if isinstance(value, list):
+        return [summarize_for_log(item, max_chars) for item in value]
+    if isinstance(value, str) and len(value) > max_chars:
+        return f"<{len(value)} chars sha256={base64_sha256(value)[:16]} {value[:32]!r}...>"
+    return value
+
+def download_file_cached(url, output_filename, cancel_event=None):
+    """URL 입력을 캐시를 거쳐 가져오고 캐시된 파일 경로를 반환
+
+    캐시에 있으면 ETag/Last-Modified로 조건부 요청을 보내 304이면 바로 재사용하고,
+    내용이 바뀌었으면 새로 받아 내용 해시로 저장합니다. 같은 URL을 동시에 요청한
+    작업은 잠금으로 직렬화되어 한 번만 다운로드합니다.
+    """
+    ext = os.path.splitext(output_filename)[1]
+    key = f"url:{url}"
+    with input_cache.lock(key):
+        entry = input_cache.get(key)
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        temp_path = input_cache.make_temp_path(ext)
+        try:
+            response_headers = download_file(url, temp_path, headers=headers, cancel_event=cancel_event)
+        except NotModified:
+            os.remove(temp_path)
+            logger.info(f"♻️ 입력 캐시 적중 (304): {url} -> {entry['path']}")
+            return entry["path"]
+        except DownloadCancelled:
+            logger.info(f"⏹️ 다른 입력 실패로 다운로드를 중단했습니다: {url}")
+            raise
+        except Exception as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            logger.error(f"❌ 다운로드 중 오류 발생: {e}")
+            raise Exception(f"다운로드 중 오류 발생: {e}")
+
+        meta = {
+            "url": url,
+            "etag": response_headers.get("ETag"),
+            "last_modified": response_headers.get("Last-Modified"),
+        }
+        file_path = input_cache.put_file(key, temp_path, ext, meta)
+        logger.info(f"✅ URL에서 파일을 성공적으로 다운로드했습니다: {url} -> {file_path}")
+        return file_path
+
+def save_base64_cached(base64_data, temp_dir, output_filename):
+    """Base64 입력을 캐시를 거쳐 저장하고 캐시된 파일 경로를 반환 (적중 시 디코딩 생략)"""
+    ext = os.path.splitext(output_filename)[1]
+    check_base64_size(base64_data)
+    key = f"b64:{base64_sha256(base64_data)}"
+    with input_cache.lock(key):
+        entry = input_cache.get(key)
+        if entry:
+            logger.info(f"♻️ 입력 캐시 적중 (base64): {entry['path']}")
+            return entry["path"]
+        file_path = save_base64_to_file(base64_data, temp_dir, output_filename)
+        return input_cache.put_file(key, file_path, ext)
+
+def process_input(input_data, temp_dir, output_filename, input_type, cancel_event=None, metrics=None):
     """입력 데이터를 처리하여 파일 경로를 반환하는 함수"""
     if input_type == "path":
         # 경로인 경우 그대로 반환
@@ -70,21 +229,43 @@ def process_input(input_data, temp_dir, output_filename, input_type):
     elif input_type == "url":
         # URL인 경우 다운로드
         logger.info(f"🌐 URL 입력 처리: {input_data}")
-        os.makedirs(temp_dir, exist_ok=True)
-        file_path = os.path.abspath(os.path.join(temp_dir, output_filename))
-        return download_file_from_url(input_data, file_path)
+        with span(metrics, "download"):
+            if input_cache.enabled:
+                return download_file_cached(input_data, output_filename, cancel_event)
+            os.makedirs(temp_dir, exist_ok=True)
+            file_path = os.path.abspath(os.path.join(temp_dir, output_filename))
+            return download_file_from_url(input_data, file_path, cancel_event)
     elif input_type == "base64":
         # Base64인 경우 디코딩하여 저장
         logger.info(f"🔢 Base64 입력 처리")
-        return save_base64_to_file(input_data, temp_dir, output_filename)
+        with span(metrics, "base64_decode"):
+            if input_cache.enabled:
+                return save_base64_cached(input_data, temp_dir, output_filename)
+            return save_base64_to_file(input_data, temp_dir, output_filename)
     else:
         raise Exception(f"지원하지 않는 입력 타입: {input_type}")
 
-def queue_prompt(prompt, input_type="image", person_count="single"):
-    url = f"http://{server_address}:8188/prompt"
-    logger.info(f"Queueing prompt to: {url}")
-    p = {"prompt": prompt, "client_id": client_id}
-    data = json.dumps(p).encode('utf-8')
+def find_input_source(job_input, prefix, suffix=""):
+    """{prefix}_path / _url / _base64{suffix} 중 주어진 하나를 (값, 입력 타입)으로 반환"""
+    for input_kind in ("path", "url", "base64"):
+        key = f"{prefix}_{input_kind}{suffix}"
+        if key in job_input:
+            return job_input[key], input_kind
+    return None, None
+
+def fetch_inputs(sources, task_dir, metrics=None):
+    """이름 -> (입력값, 입력 타입, 저장 파일명) 딕셔너리의 입력들을 병렬로 준비
+
+    하나라도 실패하면 나머지 다운로드를 취소하고 즉시 예외를 올립니다.
+    """
+    tasks = {
+        name: functools.partial(process_input, value, task_dir, filename, kind, metrics=metrics)
+        for name, (value, kind, filename) in sources.items()
+    }
+    return fetch_all(tasks)
+
+def queue_prompt(prompt, input_type="image", person_count="single", previews=False, metrics=None):
+    logger.info(f"Queueing prompt to: {comfy.http_url}/prompt")
     
     # 디버깅을 위해 워크플로우 내용 로깅
     logger.info(f"워크플로우 노드 수: {len(prompt)}")
@@ -100,85 +281,147 @@ def queue_prompt(prompt, input_type="image", person_count="single"):
         elif "313" in prompt:
             logger.info(f"두 번째 오디오 노드(313) 설정: {prompt.get('313', {}).get('inputs', {}).get('audio', 'NOT_FOUND')}")
     
-    req = urllib.request.Request(url, data=data)
-    req.add_header('Content-Type', 'application/json')
-    
+    # 다른 모델로 바뀌면 이전 모델을 내리고 전환으로 기록 (같은 모델이면 /free를 보내지 않음)
+    key = residency.model_key(prompt)
+    load = model_residency.before_submit(key, comfy.free_models)
+    if metrics is not None and metrics.annotations.get("model_residency", {}).get("load") in (None, "resident"):
+        metrics.annotate("model_residency", {"model": key, "load": load})
+
     try:
-        response = urllib.request.urlopen(req)
-        result = json.loads(response.read())
-        logger.info(f"프롬프트 전송 성공: {result}")
-        return result
-    except urllib.error.HTTPError as e:
-        logger.error(f"HTTP 에러 발생: {e.code} - {e.reason}")
-        logger.error(f"응답 내용: {e.read().decode('utf-8')}")
-        raise
+        return comfy.submit(prompt, previews)
     except Exception as e:
         logger.error(f"프롬프트 전송 중 오류: {e}")
         raise
 
 def get_image(filename, subfolder, folder_type):
-    url = f"http://{server_address}:8188/view"
-    logger.info(f"Getting image from: {url}")
-    data = {"filename": filename, "subfolder": subfolder, "type": folder_type}
-    url_values = urllib.parse.urlencode(data)
-    with urllib.request.urlopen(f"{url}?{url_values}") as response:
-        return response.read()
+    logger.info(f"Getting image from: {comfy.http_url}/view")
+    return comfy.get_view(filename, subfolder, folder_type)
 
 def get_history(prompt_id):
-    url = f"http://{server_address}:8188/history/{prompt_id}"
-    logger.info(f"Getting history from: {url}")
-    with urllib.request.urlopen(url) as response:
-        return json.loads(response.read())
+    logger.info(f"Getting history from: {comfy.http_url}/history/{prompt_id}")
+    return comfy.get_history(prompt_id)
 
-def get_videos(ws, prompt, input_type="image", person_count="single"):
-    prompt_id = queue_prompt(prompt, input_type, person_count)['prompt_id']
+def collect_videos(history):
+    """history 항목에서 노드별 출력 비디오 파일 경로 목록을 추출"""
     output_videos = {}
-    while True:
-        out = ws.recv()
-        if isinstance(out, str):
-            message = json.loads(out)
-            if message['type'] == 'executing':
-                data = message['data']
-                if data['node'] is None and data['prompt_id'] == prompt_id:
-                    break
-        else:
-            continue
-
-    history = get_history(prompt_id)[prompt_id]
     for node_id in history['outputs']:
         node_output = history['outputs'][node_id]
         videos_output = []
         if 'gifs' in node_output:
             for video in node_output['gifs']:
-                # fullpath를 이용하여 직접 파일을 읽고 base64로 인코딩
-                with open(video['fullpath'], 'rb') as f:
-                    video_data = base64.b64encode(f.read()).decode('utf-8')
-                videos_output.append(video_data)
+                videos_output.append(video['fullpath'])
         output_videos[node_id] = videos_output
 
     return output_videos
 
-def load_workflow(workflow_path):
-    with open(workflow_path, 'r') as file:
-        return json.load(file)
+def wait_for_prompt(prompt_id, prompt, metrics=None):
+    """프롬프트 실행이 끝날 때까지 기다리며 대기/노드별 실행 시간을 기록하고 history 항목을 반환"""
+    on_message = functools.partial(metrics.observe_message, prompt=prompt) if metrics is not None else None
+    return comfy.wait_for_prompt(prompt_id, on_message)
 
-def get_workflow_path(input_type, person_count):
-    """input_type과 person_count에 따라 적절한 워크플로우 파일 경로를 반환"""
-    if input_type == "image":
-        if person_count == "single":
-            return "/I2V_single.json"
-        else:  # multi
-            return "/I2V_multi.json"
-    else:  # video
-        if person_count == "single":
-            return "/V2V_single.json"
-        else:  # multi
-            return "/V2V_multi.json"
+def get_videos(prompt, input_type="image", person_count="single", metrics=None, stem_saves=None, job_scratch=None):
+    """프롬프트를 실행하고 노드별 출력 비디오 파일 경로 목록을 반환
+
+    stem_saves의 분리 결과는 스템 캐시에 저장하고, job_scratch가 있으면 출력 파일을 작업 정리 대상으로 기록합니다.
+    """
+    if metrics is not None:
+        metrics.mark_queued()
+    prompt_id = queue_prompt(prompt, input_type, person_count, metrics=metrics)
+    history = wait_for_prompt(prompt_id, prompt, metrics)
+    stems.store_stems(history, stem_saves, get_image)
+    if job_scratch is not None:
+        job_scratch.track_history(prompt_id, history)
+    return collect_videos(history)
+
+def encode_video_base64(video_path):
+    """비디오 파일을 base64 문자열로 인코딩"""
+    with open(video_path, 'rb') as f:
+        return base64.b64encode(f.read()).decode('utf-8')
+
+def file_sha256(file_path, chunk_size=UPLOAD_CHUNK_SIZE):
+    """파일을 청크 단위로 읽어 (sha256, 크기)를 계산"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+def upload_video_to_bucket(video_path, job_id):
+    """비디오를 S3 호환 버킷에 멀티파트로 업로드하고 URL/크기/체크섬을 반환
+
+    자격 증명은 rp_upload와 동일하게 BUCKET_ENDPOINT_URL, BUCKET_ACCESS_KEY_ID,
+    BUCKET_SECRET_ACCESS_KEY 환경 변수를 사용합니다 (MinIO도 그대로 동작).
+    """
+    boto_client, _ = rp_upload.get_boto_client()
+    if boto_client is None:
+        raise Exception("버킷 업로드 설정이 없습니다. BUCKET_ENDPOINT_URL/BUCKET_ACCESS_KEY_ID/BUCKET_SECRET_ACCESS_KEY를 확인하세요.")
+    from boto3.s3.transfer import TransferConfig
+
+    sha256, size = file_sha256(video_path)
+    bucket_name = os.getenv('BUCKET_NAME') or time.strftime("%m-%y")
+    key = f"{job_id}/{os.path.basename(video_path)}"
+    prefix = os.getenv('BUCKET_PREFIX')
+    if prefix:
+        key = f"{prefix.strip('/')}/{key}"
+
+    # rp_upload 기본 설정(25KB 파트)은 대용량 비디오에서 파트 수 제한에 걸리므로 직접 지정
+    transfer_config = TransferConfig(
+        multipart_threshold=UPLOAD_CHUNK_SIZE,
+        multipart_chunksize=UPLOAD_CHUNK_SIZE,
+        max_concurrency=4,
+        use_threads=True,
+    )
+    logger.info(f"☁️ 버킷 업로드 시작: {video_path} -> s3://{bucket_name}/{key} ({size} bytes)")
+    boto_client.upload_file(
+        video_path, bucket_name, key,
+        Config=transfer_config,
+        ExtraArgs={"ContentType": "video/mp4", "Metadata": {"sha256": sha256}},
+    )
+    video_url = boto_client.generate_presigned_url(
+        "get_object", Params={"Bucket": bucket_name, "Key": key}, ExpiresIn=604800
+    )
+    logger.info(f"✅ 버킷 업로드 완료: s3://{bucket_name}/{key}")
+    return {"video_url": video_url, "video_size": size, "video_sha256": sha256}
+
+def probe_video_duration(video_path):
+    """ffprobe로 비디오 길이(초)를 구함 (실패하면 None)"""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=nw=1:nk=1', video_path],
+            capture_output=True, text=True, timeout=30,
+        )
+        return float(result.stdout.strip())
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+def video_stats(video_path):
+    """결과 비디오의 인코딩 크기(바이트), 길이(초), 평균 비트레이트(kbps)"""
+    size = os.path.getsize(video_path)
+    duration = probe_video_duration(video_path)
+    stats = {"video_size": size, "video_duration": duration, "video_bitrate_kbps": None}
+    if duration:
+        stats["video_bitrate_kbps"] = round(size * 8 / duration / 1000, 1)
+    return stats
+
+def deliver_video(video_path, output_mode, job_id, metrics=None):
+    """output_mode에 따라 결과 비디오를 base64로 반환하거나 버킷에 업로드 (크기/비트레이트 포함)"""
+    stats = video_stats(video_path)
+    logger.info(f"🎬 결과 비디오: {stats['video_size']} bytes, {stats['video_duration']}초, "
+                f"{stats['video_bitrate_kbps']} kbps")
+    if output_mode == "s3":
+        with span(metrics, "output_upload"):
+            return {**stats, **upload_video_to_bucket(video_path, job_id)}
+    if output_mode == "base64":
+        with span(metrics, "output_encode"):
+            return {"video": encode_video_base64(video_path), **stats}
+    raise Exception(f"지원하지 않는 output_mode: {output_mode}")
 
 def get_audio_duration(audio_path):
-    """오디오 파일의 길이(초)를 반환"""
+    """오디오 파일의 길이(초)를 반환 (헤더 우선, 필요할 때만 디코더 사용)"""
     try:
-        duration = librosa.get_duration(path=audio_path)
+        duration = audio_probe.get_duration(audio_path)
         return duration
     except Exception as e:
         logger.warning(f"오디오 길이 계산 실패 ({audio_path}): {e}")
@@ -194,8 +437,8 @@ def calculate_max_frames_from_audio(wav_path, wav_path_2=None, fps=25):
         durations.append(duration1)
         logger.info(f"첫 번째 오디오 길이: {duration1:.2f}초")
     
-    # 두 번째 오디오 길이 계산 (multi person인 경우)
-    if wav_path_2:
+    # 두 번째 오디오 길이 계산 (multi person인 경우, 첫 번째와 같은 파일이면 생략)
+    if wav_path_2 and wav_path_2 != wav_path:
         duration2 = get_audio_duration(wav_path_2)
         if duration2 is not None:
             durations.append(duration2)
@@ -212,76 +455,140 @@ def calculate_max_frames_from_audio(wav_path, wav_path_2=None, fps=25):
     logger.info(f"가장 긴 오디오 길이: {max_duration:.2f}초, 계산된 max_frames: {max_frames}")
     return max_frames
 
-def handler(job):
-    job_input = job.get("input", {})
+def longest_audio_duration(wav_path, wav_path_2=None):
+    """두 오디오 중 긴 쪽의 길이(초) (둘 다 알 수 없으면 None)"""
+    durations = [get_audio_duration(wav_path)]
+    if wav_path_2 and wav_path_2 != wav_path:
+        durations.append(get_audio_duration(wav_path_2))
+    return max((duration for duration in durations if duration), default=None)
 
-    logger.info(f"Received job input: {job_input}")
-    task_id = f"task_{uuid.uuid4()}"
+def prepare_job(job_input, task_id, metrics=None):
+    """입력을 가져오고 ComfyUI에 보낼 프롬프트까지 준비
+
+    준비된 작업 정보(prompt, input_type, person_count, output_mode, 구간 분할 여부 등)를 딕셔너리로 반환하며,
+    입력 파일이 없으면 {"error": ...}를 반환합니다. 작업 파일은 job_state["scratch"]에 모이며,
+    실패한 경우에는 여기서 바로 정리합니다.
+    """
+    job_scratch = scratch.JobScratch(task_id)
+    try:
+        job_state = build_job_state(job_input, job_scratch, metrics)
+    except Exception:
+        job_scratch.cleanup()
+        raise
+    if "error" in job_state:
+        release_job(job_scratch, metrics)
+        return job_state
+    job_state["scratch"] = job_scratch
+    return job_state
+
+def release_job(job_scratch, metrics=None):
+    """결과 전달이 끝난 작업의 입력/출력 파일과 ComfyUI history를 정리하고 회수한 바이트를 기록"""
+    reclaimed = job_scratch.cleanup(comfy.delete_history)
+    if reclaimed:
+        logger.info(f"🧹 작업 파일 정리: {reclaimed} bytes 회수 ({job_scratch.dir})")
+    if metrics is not None:
+        metrics.annotate("scratch", job_scratch.summary(reclaimed))
+    return reclaimed
+
+def finish_job(result, job_state):
+    """결과 전달이 끝난 작업의 파일을 정리하고 결과에 측정값을 붙임"""
+    release_job(job_state["scratch"], job_state["metrics"])
+    return attach_metrics(result, job_state["metrics"])
 
+def apply_memory_plan(params, metrics=None):
+    """params의 해상도/프레임 수와 VRAM 예산으로 메모리 계획을 세워 params에 반영하고 계획을 반환"""
+    plan = planner.plan_memory(params["width"], params["height"], params["max_frame"], VRAM_BUDGET_GB, PLANNER_CALIBRATION)
+    logger.info(f"🧮 메모리 계획: {plan}")
+    # 다시 계획하는 경우 이전 계획의 타일 크기가 남지 않게 함
+    for key in ("tile_x", "tile_y", "tile_stride_x", "tile_stride_y"):
+        params.pop(key, None)
+    params.update(planner.plan_params(plan))
+    if metrics is not None:
+        metrics.annotate("memory_plan", plan)
+    return plan
+
+def estimate_job_cost(max_frame, segment_plan, cost_args, peak_gb=None):
+    """작업의 GPU 비용 추정 (구간 분할 작업은 구간별 추정의 합)"""
+    if segment_plan is None:
+        return cost_model.estimate_cost(max_frame=max_frame, peak_gb=peak_gb, **cost_args)
+    return cost_model.estimate_segments(
+        [segment["max_frame"] for segment in segment_plan["segments"]], peak_gb=peak_gb, **cost_args
+    )
+
+def build_job_state(job_input, job_scratch, metrics=None):
+    """prepare_job의 본체: 입력 파일은 job_scratch의 작업 폴더에 씀"""
     # 입력 타입과 인물 수 확인
     input_type = job_input.get("input_type", "image")  # "image" 또는 "video"
     person_count = job_input.get("person_count", "single")  # "single" 또는 "multi"
+    output_mode = job_input.get("output_mode", DEFAULT_OUTPUT_MODE)  # "base64" 또는 "s3"
+    if output_mode not in OUTPUT_MODES:
+        return {"error": f"지원하지 않는 output_mode: {output_mode} (가능: {', '.join(OUTPUT_MODES)})"}
+    output_profile = job_input.get("output_profile", DEFAULT_OUTPUT_PROFILE)  # "preview", "standard", "archive"
+    if output_profile not in OUTPUT_PROFILES:
+        return {"error": f"지원하지 않는 output_profile: {output_profile} (가능: {', '.join(OUTPUT_PROFILES)})"}
     
     logger.info(f"워크플로우 타입: {input_type}, 인물 수: {person_count}")
 
-    # 워크플로우 파일 경로 결정
-    workflow_path = get_workflow_path(input_type, person_count)
-    logger.info(f"사용할 워크플로우: {workflow_path}")
+    # 워크플로우 템플릿 선택
+    template = get_template(input_type, person_count)
+    logger.info(f"사용할 워크플로우: {template.name}")
+    if metrics is not None:
+        metrics.workflow = template.name
 
-    # 이미지/비디오 입력 처리
-    media_path = None
-    if input_type == "image":
-        # 이미지 입력 처리 (image_path, image_url, image_base64 중 하나만 사용)
-        if "image_path" in job_input:
-            media_path = process_input(job_input["image_path"], task_id, "input_image.jpg", "path")
-        elif "image_url" in job_input:
-            media_path = process_input(job_input["image_url"], task_id, "input_image.jpg", "url")
-        elif "image_base64" in job_input:
-            media_path = process_input(job_input["image_base64"], task_id, "input_image.jpg", "base64")
-        else:
-            # 기본값 사용
-            media_path = "/examples/image.jpg"
-            logger.info("기본 이미지 파일을 사용합니다: /examples/image.jpg")
-    else:  # video
-        # 비디오 입력 처리 (video_path, video_url, video_base64 중 하나만 사용)
-        if "video_path" in job_input:
-            media_path = process_input(job_input["video_path"], task_id, "input_video.mp4", "path")
-        elif "video_url" in job_input:
-            media_path = process_input(job_input["video_url"], task_id, "input_video.mp4", "url")
-        elif "video_base64" in job_input:
-            media_path = process_input(job_input["video_base64"], task_id, "input_video.mp4", "base64")
-        else:
-            # 기본값 사용 (비디오가 없는 경우 기본 이미지 사용)
-            media_path = "/examples/image.jpg"
-            logger.info("기본 이미지 파일을 사용합니다: /examples/image.jpg")
+    # 이미지/비디오, 오디오 입력 확인 (각각 path, url, base64 중 하나만 사용)
+    media_prefix, media_filename = ("image", "input_image.jpg") if input_type == "image" else ("video", "input_video.mp4")
+    input_specs = {
+        "media": (media_prefix, "", media_filename),
+        "wav": ("wav", "", "input_audio.wav"),
+    }
+    if person_count == "multi":
+        # 다중 인물용 두 번째 오디오
+        input_specs["wav_2"] = ("wav", "_2", "input_audio_2.wav")
 
-    # 오디오 입력 처리 (wav_path, wav_url, wav_base64 중 하나만 사용)
-    wav_path = None
-    wav_path_2 = None  # 다중 인물용 두 번째 오디오
-    
-    if "wav_path" in job_input:
-        wav_path = process_input(job_input["wav_path"], task_id, "input_audio.wav", "path")
-    elif "wav_url" in job_input:
-        wav_path = process_input(job_input["wav_url"], task_id, "input_audio.wav", "url")
-    elif "wav_base64" in job_input:
-        wav_path = process_input(job_input["wav_base64"], task_id, "input_audio.wav", "base64")
-    else:
+    sources = {}
+    for name, (prefix, suffix, filename) in input_specs.items():
+        value, kind = find_input_source(job_input, prefix, suffix)
+        if kind is not None:
+            sources[name] = (value, kind, filename)
+
+    # 작업 폴더에 쓰일 입력 크기를 알 수 있으면(base64, 캐시로 가는 URL) 빠른 경로에 둠
+    # (전처리 결과 크기는 프레임 수를 안 뒤에 더해 다시 정함)
+    expected_bytes = 0
+    for value, kind, _ in sources.values():
+        if kind == "base64":
+            expected_bytes += len(value) * 3 // 4
+        elif kind == "url" and not input_cache.enabled:
+            expected_bytes = None
+            break
+    task_dir = job_scratch.stage(expected_bytes)
+
+    # 모든 입력을 병렬로 가져옴
+    with span(metrics, "input_fetch"):
+        fetched = fetch_inputs(sources, task_dir, metrics)
+
+    media_path = fetched.get("media")
+    if media_path is None:
+        # 기본값 사용 (비디오가 없는 경우에도 기본 이미지 사용)
+        media_path = "/examples/image.jpg"
+        logger.info("기본 이미지 파일을 사용합니다: /examples/image.jpg")
+
+    wav_path = fetched.get("wav")
+    if wav_path is None:
         # 기본값 사용
         wav_path = "/examples/audio.mp3"
         logger.info("기본 오디오 파일을 사용합니다: /examples/audio.mp3")
-    
-    # 다중 인물용 두 번째 오디오 처리
+
+    wav_path_2 = None  # 다중 인물용 두 번째 오디오
     if person_count == "multi":
-        if "wav_path_2" in job_input:
-            wav_path_2 = process_input(job_input["wav_path_2"], task_id, "input_audio_2.wav", "path")
-        elif "wav_url_2" in job_input:
-            wav_path_2 = process_input(job_input["wav_url_2"], task_id, "input_audio_2.wav", "url")
-        elif "wav_base64_2" in job_input:
-            wav_path_2 = process_input(job_input["wav_base64_2"], task_id, "input_audio_2.wav", "base64")
-        else:
+        wav_path_2 = fetched.get("wav_2")
+        if wav_path_2 is None:
             # 기본값 사용 (첫 번째 오디오와 동일)
             wav_path_2 = wav_path
             logger.info("두 번째 오디오가 없어 첫 번째 오디오를 사용합니다.")
+        elif stems.same_audio(wav_path, wav_path_2, input_cache):
+            # 같은 내용이면 같은 경로로 맞춰 길이 확인/로드/분리/임베딩을 한 번만 함
+            wav_path_2 = wav_path
+            logger.info("두 오디오의 내용이 같아 첫 번째 오디오를 함께 사용합니다.")
 
     # 필수 필드 검증 및 기본값 설정
     prompt_text = job_input.get("prompt", "A person talking naturally")
@@ -292,9 +599,23 @@ def handler(job):
     max_frame = job_input.get("max_frame")
     if max_frame is None:
         logger.info("max_frame이 입력되지 않았습니다. 오디오 길이를 기반으로 자동 계산합니다.")
-        max_frame = calculate_max_frames_from_audio(wav_path, wav_path_2 if person_count == "multi" else None)
+        with span(metrics, "audio_probe"):
+            max_frame = calculate_max_frames_from_audio(wav_path, wav_path_2 if person_count == "multi" else None)
     else:
         logger.info(f"사용자 지정 max_frame: {max_frame}")
+
+    # 전처리 캐시를 끄면 전처리 결과가 작업 폴더에 쓰이므로 프레임 수 x 해상도로 추정해 작업 폴더 크기에 더함
+    use_video_prep = input_type == "video" and video_prep.VIDEO_PREP and job_input.get("video_prep", True)
+    use_image_prep = input_type == "image" and image_prep.IMAGE_PREP and job_input.get("image_prep", True)
+    if expected_bytes is not None:
+        if use_video_prep and not video_prep.video_prep_cache.enabled:
+            expected_bytes += scratch.estimate_video_bytes(max_frame, width, height)
+        elif use_image_prep and not image_prep.image_prep_cache.enabled:
+            expected_bytes += width * height * 3
+        moved_from, task_dir = task_dir, job_scratch.stage(expected_bytes)
+        media_path, wav_path, wav_path_2 = (
+            scratch.moved_path(path, moved_from, task_dir) for path in (media_path, wav_path, wav_path_2)
+        )
     
     logger.info(f"워크플로우 설정: prompt='{prompt_text}', width={width}, height={height}, max_frame={max_frame}")
     logger.info(f"미디어 경로: {media_path}")
@@ -302,8 +623,6 @@ def handler(job):
     if person_count == "multi":
         logger.info(f"두 번째 오디오 경로: {wav_path_2}")
 
-    prompt = load_workflow(workflow_path)
-
     # 파일 존재 여부 확인
     if not os.path.exists(media_path):
         logger.error(f"미디어 파일이 존재하지 않습니다: {media_path}")
@@ -322,75 +641,701 @@ def handler(job):
     if person_count == "multi" and wav_path_2:
         logger.info(f"두 번째 오디오 파일 크기: {os.path.getsize(wav_path_2)} bytes")
 
-    # 워크플로우 노드 설정
-    if input_type == "image":
-        # I2V 워크플로우: 이미지 입력 설정
-        prompt["284"]["inputs"]["image"] = media_path
-    else:
-        # V2V 워크플로우: 비디오 입력 설정
-        prompt["228"]["inputs"]["video"] = media_path
-    
-    # 공통 설정
-    prompt["125"]["inputs"]["audio"] = wav_path
-    prompt["241"]["inputs"]["positive_prompt"] = prompt_text
-    prompt["245"]["inputs"]["value"] = width
-    prompt["246"]["inputs"]["value"] = height
-    
-    prompt["270"]["inputs"]["value"] = max_frame
-    
-    # 다중 인물용 두 번째 오디오 설정
-    if person_count == "multi":
-        # 워크플로우 타입에 따라 두 번째 오디오 노드 설정
-        if input_type == "image":  # I2V_multi.json의 경우
-            if "307" in prompt:
-                prompt["307"]["inputs"]["audio"] = wav_path_2
-        else:  # V2V_multi.json의 경우
-            if "313" in prompt:
-                prompt["313"]["inputs"]["audio"] = wav_path_2
-
-    ws_url = f"ws://{server_address}:8188/ws?clientId={client_id}"
-    logger.info(f"Connecting to WebSocket: {ws_url}")
-    
-    # 먼저 HTTP 연결이 가능한지 확인
-    http_url = f"http://{server_address}:8188/"
-    logger.info(f"Checking HTTP connection to: {http_url}")
-    
-    # HTTP 연결 확인 (최대 1분)
-    max_http_attempts = 180
-    for http_attempt in range(max_http_attempts):
-        try:
-            import urllib.request
-            response = urllib.request.urlopen(http_url, timeout=5)
-            logger.info(f"HTTP 연결 성공 (시도 {http_attempt+1})")
-            break
-        except Exception as e:
-            logger.warning(f"HTTP 연결 실패 (시도 {http_attempt+1}/{max_http_attempts}): {e}")
-            if http_attempt == max_http_attempts - 1:
-                raise Exception("ComfyUI 서버에 연결할 수 없습니다. 서버가 실행 중인지 확인하세요.")
-            time.sleep(1)
-    
-    ws = websocket.WebSocket()
-    # 웹소켓 연결 시도 (최대 3분)
-    max_attempts = int(180/5)  # 3분 (1초에 한 번씩 시도)
-    for attempt in range(max_attempts):
-        import time
-        try:
-            ws.connect(ws_url)
-            logger.info(f"웹소켓 연결 성공 (시도 {attempt+1})")
-            break
-        except Exception as e:
-            logger.warning(f"웹소켓 연결 실패 (시도 {attempt+1}/{max_attempts}): {e}")
-            if attempt == max_attempts - 1:
-                raise Exception("웹소켓 연결 시간 초과 (3분)")
-            time.sleep(5)
-    videos = get_videos(ws, prompt, input_type, person_count)
-    ws.close()
+    # 워크플로우 노드 설정 (템플릿의 패치 지점에 작업 파라미터 적용)
+    params = {
+        "media": media_path,
+        "audio": wav_path,
+        "prompt": prompt_text,
+        "width": width,
+        "height": height,
+        "max_frame": max_frame,
+        "audio_2": wav_path_2,
+    }
+
+    # block swap / VAE 타일링 / frame window를 해상도, 프레임 수, VRAM 예산에 맞춤 (memory_plan=false면 기본값)
+    plan = None
+    if job_input.get("memory_plan", True) and VRAM_BUDGET_GB:
+        plan = apply_memory_plan(params, metrics)
+
+    inputs_192 = template.graph["192"]["inputs"]
+    cost_args = {
+        "workflow": template.name,
+        "width": width,
+        "height": height,
+        "frame_window_size": params.get("frame_window_size", inputs_192["frame_window_size"]),
+        "motion_frame": inputs_192["motion_frame"],
+        "blocks_to_swap": params.get("blocks_to_swap", template.graph["134"]["inputs"]["blocks_to_swap"]),
+    }
+
+    # 긴 오디오는 구간별 프롬프트로 나눠 렌더링 (segmented=true 또는 SEGMENT_AUTO_SECONDS 초과)
+    # 구간마다 고정 비용이 들므로 비용 추정 전에 구간 계획을 세움
+    longest = None
+    segment_plan = None
+    if job_input.get("segmented") or ("segmented" not in job_input and segments.SEGMENT_AUTO_SECONDS > 0):
+        with span(metrics, "audio_probe"):
+            longest = longest_audio_duration(wav_path, wav_path_2)
+        if longest is None:
+            logger.warning("오디오 길이를 알 수 없어 구간 분할 없이 렌더링합니다.")
+        elif segments.should_segment(job_input, longest):
+            with span(metrics, "segment_plan"):
+                segment_plan = segments.plan_job(
+                    media_path, input_type == "video", wav_path, wav_path_2, longest,
+                    cost_args["frame_window_size"], cost_args["motion_frame"],
+                    float(job_input.get("segment_seconds", segments.SEGMENT_SECONDS)),
+                )
+
+    # GPU 작업 전에 비용을 추정하고 상한(MAX_GPU_SECONDS)을 넘으면 거부/프레임 축소/구간 계획 반환
+    peak_gb = plan["estimated_peak_gb"] if plan else None
+    estimate = estimate_job_cost(max_frame, segment_plan, cost_args, peak_gb)
+    policy = job_input.get("over_budget", cost_model.ADMISSION_POLICY)
+    action, reason = cost_model.admit(estimate, policy, vram_budget_gb=VRAM_BUDGET_GB)
+    if action in ("clamp", "segment"):
+        budget_frames = cost_model.max_frames_within(cost_model.MAX_GPU_SECONDS, **cost_args)
+        if budget_frames == 0:
+            action, reason = "reject", f"{reason} (윈도우 하나도 상한 안에 들어가지 않음)"
+        elif action == "clamp" and segment_plan is not None:
+            # 구간 분할 작업은 앞 구간부터 상한 안에 들어가는 만큼만 렌더링
+            planned = segment_plan["segments"]
+            kept = cost_model.segments_within(
+                cost_model.MAX_GPU_SECONDS, [segment["max_frame"] for segment in planned], **cost_args
+            )
+            if kept == 0:
+                action, reason = "reject", f"{reason} (첫 구간도 상한 안에 들어가지 않음)"
+            else:
+                logger.warning(f"✂️ {reason}: 구간 {len(planned)}개 중 앞 {kept}개만 렌더링")
+                segment_plan["segments"] = planned[:kept]
+                estimate = estimate_job_cost(max_frame, segment_plan, cost_args, peak_gb)
+                estimate["clamped_from_segments"] = len(planned)
+        elif action == "clamp":
+            logger.warning(f"✂️ {reason}: max_frame {max_frame} -> {budget_frames}")
+            requested_frames = max_frame
+            max_frame = params["max_frame"] = budget_frames
+            if plan is not None:
+                # 프레임 수가 줄었으므로 메모리 계획도 줄어든 프레임 수 기준으로 다시 세움
+                plan = apply_memory_plan(params, metrics)
+                cost_args["frame_window_size"] = params["frame_window_size"]
+                cost_args["blocks_to_swap"] = params["blocks_to_swap"]
+                peak_gb = plan["estimated_peak_gb"]
+            estimate = cost_model.estimate_cost(max_frame=max_frame, peak_gb=peak_gb, **cost_args)
+            estimate["clamped_from"] = requested_frames
+        else:
+            # 한 작업 안에서 구간을 나눠 렌더링해도 전체 GPU 시간은 줄지 않으므로, 렌더링하지 않고
+            # 구간 하나가 상한 안에 들어가는 구간 계획을 돌려줌 (호출 측이 구간마다 작업을 나눠 요청)
+            if longest is None:
+                with span(metrics, "audio_probe"):
+                    longest = longest_audio_duration(wav_path, wav_path_2)
+            if longest is None:
+                action, reason = "reject", f"{reason} (오디오 길이를 알 수 없어 구간을 계획할 수 없음)"
+            else:
+                with span(metrics, "segment_plan"):
+                    segment_plan = segments.plan_job(
+                        media_path, input_type == "video", wav_path, wav_path_2, longest,
+                        cost_args["frame_window_size"], cost_args["motion_frame"],
+                        float(job_input.get("segment_seconds", segments.SEGMENT_SECONDS)), max_frames=budget_frames,
+                    )
+                planned = [
+                    {**segment, "gpu_seconds": cost_model.estimate_cost(
+                        max_frame=segment["max_frame"], **cost_args)["gpu_seconds"]}
+                    for segment in segment_plan["segments"]
+                ]
+                logger.warning(f"🎞️ {reason}: 구간 {len(planned)}개로 나눠 요청해야 합니다")
+                estimate.update({"action": action, "reason": reason})
+                if metrics is not None:
+                    metrics.annotate("cost_estimate", estimate)
+                return {
+                    "error": f"작업이 허용 범위를 넘어 구간 분할이 필요합니다: {reason}",
+                    "segmentation_required": True,
+                    "segments": planned,
+                }
+    estimate.update({"action": action, "reason": reason})
+    if metrics is not None:
+        metrics.annotate("cost_estimate", estimate)
+    if action == "reject":
+        logger.error(f"❌ 작업 거부: {reason}")
+        return {"error": f"작업이 허용 범위를 넘습니다: {reason}"}
+
+    # V2V: 원본 비디오를 렌더링할 프레임 수/목표 크기로 미리 줄여 ComfyUI의 디코딩량을 줄임
+    if use_video_prep:
+        with span(metrics, "video_prep"):
+            media_path, prep_info = video_prep.prepare_source(
+                media_path, max_frame, width, height, task_dir, input_cache
+            )
+        params["media"] = media_path
+        if metrics is not None:
+            metrics.annotate("source_video", prep_info)
+    # I2V: 입력 이미지를 281과 같은 방식으로 미리 줄여 LoadImage가 원본 크기로 디코딩하지 않게 함
+    elif use_image_prep:
+        with span(metrics, "image_prep"):
+            media_path, prep_info = image_prep.normalize_image(media_path, width, height, task_dir, input_cache)
+        params["media"] = media_path
+        if metrics is not None:
+            metrics.annotate("source_image", prep_info)
+
+    with span(metrics, "workflow_build"):
+        prompt = apply_output_profile(template.instantiate(**params), output_profile)
+    job_state = {
+        "prompt": prompt,
+        "input_type": input_type,
+        "person_count": person_count,
+        "output_mode": output_mode,
+        "output_profile": output_profile,
+        "template": template,
+        "params": params,
+        "segmented": False,
+        "metrics": metrics,
+        "model_key": residency.model_key(prompt),
+    }
+
+    if segment_plan is not None:
+        job_state.update({
+            "segmented": True,
+            "segment_plan": segment_plan,
+            "media_path": media_path,
+            "wav_path": wav_path,
+            "wav_path_2": wav_path_2,
+        })
+        with span(metrics, "cache_key"):
+            job_state["checkpoint_key"] = segments.checkpoint_key(
+                job_input, (media_path, wav_path, wav_path_2), input_cache
+            )
+
+    # 같은 입력 내용 + 같은 프롬프트(seed 포함)면 결과도 같으므로 결과 캐시 키를 만듦 (bypass_cache=true면 생략)
+    audio_is_clean = bool(job_input.get("audio_is_clean", False))
+    job_state["audio_is_clean"] = audio_is_clean
+    job_state["cache_key"] = None
+    if result_cache.result_cache.enabled and not job_input.get("bypass_cache", False):
+        with span(metrics, "cache_key"):
+            extra = {"audio_is_clean": True} if audio_is_clean else {}
+            if job_state["segmented"]:
+                extra["segments"] = [[segment["start_frame"], segment["frames"]] for segment in segment_plan["segments"]]
+            job_state["cache_key"] = result_cache.cache_key(
+                prompt, (media_path, wav_path, wav_path_2), extra, input_cache,
+            )
+    if metrics is not None:
+        metrics.annotate("result_cache", "bypass" if job_state["cache_key"] is None else "miss")
 
+    # 보컬 분리: 캐시된 스템이 있거나 audio_is_clean이면 분리 노드를 건너뜀 (결과 캐시 키는 바꾸기 전 프롬프트 기준)
+    with span(metrics, "stem_lookup"):
+        job_state["prompt"], job_state["stem_saves"] = stems.apply_stems(
+            prompt, {"audio_1": wav_path, "audio_2": wav_path_2}, audio_is_clean, input_cache
+        )
+
+    return job_state
+
+def deliver_cached(job_state, job_id):
+    """결과 캐시에 같은 작업의 결과가 있으면 ComfyUI 없이 바로 전달 (없으면 None)"""
+    entry = result_cache.lookup(job_state["cache_key"])
+    if entry is None:
+        return None
+    metrics = job_state["metrics"]
+    logger.info(f"♻️ 결과 캐시 적중: {entry['path']}")
+    if metrics is not None:
+        metrics.annotate("result_cache", "hit")
+    if job_state["output_mode"] == "s3":
+        upload = result_cache.reusable_upload(entry)
+        if upload is not None:
+            return upload
+        result = deliver_video(entry["path"], "s3", job_id, metrics)
+        result_cache.remember_upload(job_state["cache_key"], entry, result)
+        return result
+    return deliver_video(entry["path"], job_state["output_mode"], job_id, metrics)
+
+def deliver_result(videos, output_mode, job_id, metrics=None, cache_key=None):
+    """첫 번째 출력 비디오를 output_mode에 맞게 전달 (cache_key가 있으면 결과 캐시에 저장)"""
     # 이미지가 없는 경우 처리
     for node_id in videos:
         if videos[node_id]:
-            return {"video": videos[node_id][0]}
+            result = deliver_video(videos[node_id][0], output_mode, job_id, metrics)
+            result_cache.store(cache_key, videos[node_id][0], result if output_mode == "s3" else None)
+            return result
     
     return {"error": "비디오를를 찾을 수 없습니다."}
 
-runpod.serverless.start({"handler": handler})
\ No newline at end of file
+def attach_metrics(result, metrics):
+    """결과에 단계/노드별 측정값을 붙이고 프로세스 전체 집계에 반영"""
+    # 모델을 새로 올린 작업은 큰 가중치 로더의 실행 시간을 로드 시간으로 기록
+    loaded = metrics.annotations.get("model_residency")
+    if loaded is not None and loaded["load"] != "resident":
+        seconds = residency.load_seconds(metrics.nodes)
+        loaded["load_seconds"] = round(seconds, 3)
+        if loaded["load"] == "switch":
+            model_residency.record_reload(seconds)
+            metrics.record("model_reload", seconds)
+    if loaded is not None:
+        loaded.update(model_residency.summary())
+    observe_metrics(metrics, "error" if "error" in result else "success")
+    # 실제 실행 시간으로 비용 모델 보정 (모델을 새로 읽은 실행은 로딩 시간이 섞이므로 제외)
+    estimate = metrics.annotations.get("cost_estimate")
+    if (estimate and "error" not in result and metrics.stages.get("execution")
+            and not cost_model.weights_loaded(metrics.nodes)):
+        cost_model.record_timing(estimate["workflow"], estimate["raw_gpu_seconds"], metrics.stages["execution"])
+    return {**result, **metrics.annotations, "metrics": metrics.as_dict()}
+
+def render_segment(job_state, overrides):
+    """구간 하나를 별도 프롬프트로 렌더링하고 출력 MP4 경로를 반환"""
+    params = {**job_state["params"], **overrides}
+    start_image = params.pop("start_image", None)
+    prompt = job_state["template"].instantiate(**params)
+    # 마지막 프레임이 다음 구간의 시작 이미지가 되므로 축소 없이 샘플링 크기 그대로 출력
+    prompt = apply_output_profile(prompt, job_state["output_profile"], scale=False)
+    if start_image is not None:
+        prompt = apply_start_image(prompt, start_image)
+    prompt, stem_saves = stems.apply_stems(
+        prompt, {"audio_1": params["audio"], "audio_2": params.get("audio_2")}, job_state["audio_is_clean"], input_cache
+    )
+    videos = get_videos(
+        prompt, job_state["input_type"], job_state["person_count"], job_state["metrics"], stem_saves,
+        job_state["scratch"],
+    )
+    for paths in videos.values():
+        if paths:
+            return paths[0]
+    raise Exception("구간 렌더링 결과 비디오를 찾을 수 없습니다.")
+
+def render_and_deliver_segmented(job_state, job_id):
+    """긴 오디오를 구간별로 렌더링해 이어붙인 결과를 전달하고 체크포인트를 정리"""
+    video_path, checkpoint_dir = segments.render_segmented(job_state, functools.partial(render_segment, job_state))
+    result = deliver_video(video_path, job_state["output_mode"], job_id, job_state["metrics"])
+    result_cache.store(job_state["cache_key"], video_path, result if job_state["output_mode"] == "s3" else None)
+    # 전달까지 끝난 작업은 재시도할 필요가 없으므로 체크포인트 삭제
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    return result
+
+def load_batch_inputs(job_input, work_dir):
+    """배치 입력 목록을 반환 (batch 리스트, batch_path JSONL 파일, batch_url JSONL URL 중 하나)
+
+    JSONL의 각 줄은 작업 입력 객체이며, {"input": {...}} 형태로 감싸져 있어도 됩니다.
+    """
+    if "batch" in job_input:
+        items = job_input["batch"]
+    else:
+        if "batch_url" in job_input:
+            os.makedirs(work_dir, exist_ok=True)
+            batch_path = download_file_from_url(job_input["batch_url"], os.path.join(work_dir, "batch.jsonl"))
+        else:
+            batch_path = job_input["batch_path"]
+        with open(batch_path, 'r') as f:
+            items = [json.loads(line) for line in f if line.strip()]
+    return [item.get("input", item) if isinstance(item, dict) else item for item in items]
+
+def is_batch_input(job_input):
+    return any(key in job_input for key in ("batch", "batch_path", "batch_url"))
+
+def handler_batch(job):
+    """여러 입력을 한 번에 처리하는 배치 핸들러
+
+    입력을 준비하는 대로 프롬프트를 큐에 넣어 ComfyUI가 작업 사이에 쉬지 않게 하고,
+    하나의 웹소켓에서 prompt_id별로 나뉜 메시지로 각 결과를 모읍니다.
+    제출 순서는 ComfyUI에 올라가 있는 모델을 쓰는 항목을 먼저 넣도록 바꾸며(RESIDENCY_WINDOW까지),
+    모델 전환은 이전 모델의 프롬프트가 모두 끝난 뒤에 합니다.
+    항목별 성공/실패를 results에 담아 반환하며, 한 항목의 실패가 다른 항목에 영향을 주지 않습니다.
+    """
+    job_input = job.get("input", {})
+    job_id = job.get("id") or f"batch_{uuid.uuid4()}"
+    batch_scratch = scratch.JobScratch(f"batch_{uuid.uuid4()}")
+    try:
+        items = load_batch_inputs(job_input, batch_scratch.dir)
+    finally:
+        batch_scratch.cleanup()
+    default_output_mode = job_input.get("output_mode")
+    logger.info(f"📦 배치 작업: {len(items)}개 항목")
+
+    comfy.wait_until_ready()
+    results = [None] * len(items)
+    switches_before = model_residency.switches
+    reload_before = model_residency.reload_seconds
+    pending = residency.ResidencyQueue()  # 준비가 끝나 제출을 기다리는 (index, job_state)
+    queued = collections.deque()  # (index, job_state, prompt_id), 큐에 넣은 순서
+    deferred = []  # 구간 분할 항목은 큐가 빈 뒤에 차례로 처리
+
+    def collect_next():
+        # 큐에 넣은 순서대로 실행되므로 같은 순서로 결과를 기다림 (다른 프롬프트 메시지는 각자의 구독 큐에 쌓임)
+        index, job_state, prompt_id = queued.popleft()
+        try:
+            history = wait_for_prompt(prompt_id, job_state["prompt"], job_state["metrics"])
+            job_state["scratch"].track_history(prompt_id, history)
+            stems.store_stems(history, job_state["stem_saves"], get_image)
+            result = deliver_result(
+                collect_videos(history), job_state["output_mode"], f"{job_id}_{index}", job_state["metrics"],
+                job_state["cache_key"],
+            )
+            result = finish_job(result, job_state)
+            status = "ERROR" if "error" in result else "SUCCESS"
+            results[index] = {"index": index, "status": status, "prompt_id": prompt_id, **result}
+        except Exception as e:
+            logger.error(f"❌ 배치 항목 {index} 실패 (prompt_id={prompt_id}): {e}")
+            job_state["scratch"].cleanup(comfy.delete_history)
+            results[index] = {"index": index, "status": "ERROR", "prompt_id": prompt_id, "error": str(e)}
+
+    def submit_pending(final):
+        # 모델을 바꿔야 하는 항목만 남았으면, 아직 준비할 항목이 있고 이전 모델 프롬프트가 실행 중인 동안은
+        # 같은 모델 항목이 더 오기를 기다림. 전환할 때는 이전 모델의 프롬프트가 모두 끝난 뒤 제출
+        while pending:
+            key, overdue = pending.next_key(model_residency)
+            if model_residency.switch_needed(key):
+                if not final and not overdue and queued and comfy.queue_position(queued[-1][2]) is not None:
+                    return
+                while queued:
+                    collect_next()
+            index, job_state = pending.pop(model_residency)
+            try:
+                job_state["metrics"].mark_queued()
+                prompt_id = queue_prompt(
+                    job_state["prompt"], job_state["input_type"], job_state["person_count"],
+                    metrics=job_state["metrics"],
+                )
+                queued.append((index, job_state, prompt_id))
+            except Exception as e:
+                logger.error(f"❌ 배치 항목 {index} 제출 실패: {e}")
+                job_state["scratch"].cleanup(comfy.delete_history)
+                results[index] = {"index": index, "status": "ERROR", "error": str(e)}
+
+    try:
+        for index, item_input in enumerate(items):
+            job_state = None
+            try:
+                if not isinstance(item_input, dict):
+                    raise Exception("배치 항목은 객체여야 합니다.")
+                if default_output_mode and "output_mode" not in item_input:
+                    item_input = {**item_input, "output_mode": default_output_mode}
+                job_state = prepare_job(item_input, f"task_{uuid.uuid4()}", JobMetrics())
+                if "error" in job_state:
+                    results[index] = {"index": index, "status": "ERROR", "error": job_state["error"]}
+                    continue
+                cached = deliver_cached(job_state, f"{job_id}_{index}")
+                if cached is not None:
+                    results[index] = {"index": index, "status": "SUCCESS", **finish_job(cached, job_state)}
+                elif job_state["segmented"]:
+                    deferred.append((index, job_state))
+                else:
+                    pending.push(job_state["model_key"], (index, job_state))
+            except Exception as e:
+                logger.error(f"❌ 배치 항목 {index} 준비 실패: {e}")
+                if job_state is not None and "scratch" in job_state:
+                    job_state["scratch"].cleanup(comfy.delete_history)
+                results[index] = {"index": index, "status": "ERROR", "error": str(e)}
+                continue
+            submit_pending(final=False)
+
+        submit_pending(final=True)
+        while queued:
+            collect_next()
+    finally:
+        # 예외로 빠져나가면 결과를 기다리지 않은 프롬프트의 구독 큐를 해제
+        for _, _, prompt_id in queued:
+            comfy.unsubscribe(prompt_id)
+
+    # 구간 분할 항목도 올라가 있는 모델을 쓰는 것부터 (같은 모델끼리는 도착 순서 유지)
+    deferred.sort(key=lambda entry: model_residency.switch_needed(entry[1]["model_key"]))
+    for index, job_state in deferred:
+        try:
+            result = render_and_deliver_segmented(job_state, f"{job_id}_{index}")
+            result = finish_job(result, job_state)
+            results[index] = {"index": index, "status": "SUCCESS", **result}
+        except Exception as e:
+            logger.error(f"❌ 배치 항목 {index} 구간 렌더링 실패: {e}")
+            job_state["scratch"].cleanup(comfy.delete_history)
+            results[index] = {"index": index, "status": "ERROR", "error": str(e)}
+
+    succeeded = sum(1 for result in results if result["status"] == "SUCCESS")
+    switches = model_residency.switches - switches_before
+    logger.info(f"📦 배치 완료: 성공 {succeeded}, 실패 {len(results) - succeeded}, 모델 전환 {switches}회")
+    return {
+        "results": results, "succeeded": succeeded, "failed": len(results) - succeeded,
+        "model_residency": {
+            "switches": switches, "reload_seconds": round(model_residency.reload_seconds - reload_before, 3),
+        },
+    }
+
+def handler(job):
+    job_input = job.get("input", {})
+    if is_batch_input(job_input):
+        return handler_batch(job)
+
+    logger.info(f"Received job input: {summarize_for_log(job_input)}")
+    task_id = f"task_{uuid.uuid4()}"
+    metrics = JobMetrics()
+
+    job_state = prepare_job(job_input, task_id, metrics)
+    if "error" in job_state:
+        return attach_metrics(job_state, metrics)
+    try:
+        cached = deliver_cached(job_state, job.get("id") or task_id)
+        if cached is not None:
+            return finish_job(cached, job_state)
+
+        # 프로세스 단위 클라이언트는 첫 작업에서만 ComfyUI 준비를 기다립니다
+        comfy.wait_until_ready()
+        if job_state["segmented"]:
+            return finish_job(render_and_deliver_segmented(job_state, job.get("id") or task_id), job_state)
+
+        videos = get_videos(
+            job_state["prompt"], job_state["input_type"], job_state["person_count"], metrics, job_state["stem_saves"],
+            job_state["scratch"],
+        )
+
+        result = deliver_result(videos, job_state["output_mode"], job.get("id") or task_id, metrics, job_state["cache_key"])
+        return finish_job(result, job_state)
+    finally:
+        # 실패한 작업도 파일을 남기지 않음 (이미 정리했으면 아무것도 하지 않음)
+        job_state["scratch"].cleanup(comfy.delete_history)
+
+def progress_event(message, prompt):
+    """ComfyUI 웹소켓 메시지를 스트리밍용 진행 이벤트로 변환 (필요 없는 메시지는 None)"""
+    message_type = message.get('type')
+    data = message.get('data') or {}
+    if message_type == 'executing' and data.get('node') is not None:
+        node_id = data['node']
+        return {"event": "executing", "node": node_id, "class_type": prompt.get(node_id, {}).get("class_type")}
+    if message_type == 'progress':
+        return {"event": "progress", "node": data.get('node'), "value": data.get('value'), "max": data.get('max')}
+    if message_type == 'execution_cached':
+        return {"event": "cached", "nodes": data.get('nodes', [])}
+    if message_type == 'preview':
+        return {
+            "event": "preview",
+            "format": data['format'],
+            "image": base64.b64encode(data['image']).decode('utf-8'),
+        }
+    return None
+
+def handler_stream(job):
+    """진행 상황을 이벤트로 흘려보내는 제너레이터 핸들러 (HANDLER_MODE=stream)
+
+    queued(대기 순번) -> executing / progress / cached / preview -> result 순서로 yield하며,
+    preview는 입력에 stream_previews=true를 주고 ComfyUI 미리보기가 켜져 있을 때만 보냅니다.
+    """
+    job_input = job.get("input", {})
+
+    logger.info(f"Received job input: {summarize_for_log(job_input)}")
+    task_id = f"task_{uuid.uuid4()}"
+    metrics = JobMetrics()
+
+    job_state = prepare_job(job_input, task_id, metrics)
+    if "error" in job_state:
+        yield attach_metrics(job_state, metrics)
+        return
+    prompt_id = None
+    try:
+        cached = deliver_cached(job_state, job.get("id") or task_id)
+        if cached is not None:
+            yield {"event": "result", **finish_job(cached, job_state)}
+            return
+
+        previews = bool(job_input.get("stream_previews", False))
+        if previews and PREVIEW_METHOD == "none":
+            logger.warning("stream_previews가 요청되었지만 ComfyUI 미리보기가 꺼져 있습니다 (COMFY_PREVIEW_METHOD=none).")
+
+        comfy.wait_until_ready()
+        if job_state["segmented"]:
+            # 구간 분할 작업은 구간마다 프롬프트가 바뀌므로 최종 결과만 보냄
+            result = render_and_deliver_segmented(job_state, job.get("id") or task_id)
+            yield {"event": "result", **finish_job(result, job_state)}
+            return
+
+        prompt = job_state["prompt"]
+        metrics.mark_queued()
+        prompt_id = queue_prompt(prompt, job_state["input_type"], job_state["person_count"], previews, metrics)
+        yield {"event": "queued", "prompt_id": prompt_id, "queue_position": comfy.queue_position(prompt_id)}
+
+        started = False
+        last_progress = {}
+        for message in comfy.iter_events(prompt_id):
+            metrics.observe_message(message, prompt)
+            message_type = message.get('type')
+            if message_type == 'status' and not started:
+                # 실행 전에는 대기열이 바뀔 때마다 대기 순번을 알림
+                yield {"event": "queued", "prompt_id": prompt_id, "queue_position": comfy.queue_position(prompt_id)}
+                continue
+            if message_type == 'execution_start':
+                started = True
+            event = progress_event(message, prompt)
+            if event is None:
+                continue
+            if event["event"] == "progress":
+                # VAE 타일 처리 등은 진행 메시지가 매우 잦으므로 노드별로 간격을 둠
+                now = time.monotonic()
+                if event["value"] != event["max"] and now - last_progress.get(event["node"], 0) < PROGRESS_MIN_INTERVAL:
+                    continue
+                last_progress[event["node"]] = now
+            yield event
+
+        history = comfy.get_history(prompt_id)[prompt_id]
+        job_state["scratch"].track_history(prompt_id, history)
+        stems.store_stems(history, job_state["stem_saves"], get_image)
+        videos = collect_videos(history)
+        result = deliver_result(videos, job_state["output_mode"], job.get("id") or task_id, metrics, job_state["cache_key"])
+        yield {"event": "result", **finish_job(result, job_state)}
+    finally:
+        # 이벤트를 다 읽기 전에 스트림이 끊기거나 실패해도 구독 큐를 남기지 않음
+        if prompt_id is not None:
+            comfy.unsubscribe(prompt_id)
+        job_state["scratch"].cleanup(comfy.delete_history)
+
+class SubmissionOrder:
+    """ComfyUI 큐에 프롬프트를 넣는 차례를 정하는 순번표
+
+    입력 준비는 작업마다 끝나는 시점이 다르므로 기본적으로는 먼저 도착한 작업의 차례가 올 때까지
+    뒤 작업의 제출을 기다리게 합니다. 다만 가장 앞 작업이 모델 전환을 해야 하면, 준비를 마친 뒤 작업 중
+    지금 올라가 있는 모델을 쓰는 작업이 먼저 제출할 수 있습니다 (한 작업이 추월당하는 횟수는 RESIDENCY_WINDOW까지).
+    모델 전환은 이전 모델로 실행 중인 작업이 모두 끝난 뒤에 합니다.
+    차례를 쓰지 않고 끝나거나 취소된 순번은 건너뜁니다.
+    """
+
+    def __init__(self, window=None):
+        self.window = residency.RESIDENCY_WINDOW if window is None else window
+        self._issued = 0
+        self._open = {}  # 아직 제출하지 않은 순번 -> 모델 키 (준비 중이면 None)
+        self._overtaken = {}  # 순번 -> 뒤 작업에 추월당한 횟수
+        self._serving = None  # 지금 제출 중인 순번
+        self._running = set()  # 제출했고 실행이 끝나지 않은 순번
+        self._condition = asyncio.Condition()
+
+    def take(self):
+        ticket = self._issued
+        self._issued += 1
+        self._open[ticket] = None
+        return ticket
+
+    def _choose(self):
+        """지금 제출해도 되는 순번 (없으면 None)"""
+        if self._serving is not None or not self._open:
+            return None
+        tickets = sorted(self._open)
+        head = tickets[0]
+        if self._open[head] is None:
+            return None
+        if not model_residency.switch_needed(self._open[head]):
+            return head
+        if self._overtaken.get(head, 0) < self.window:
+            for ticket in tickets[1:]:
+                key = self._open[ticket]
+                if key is None:
+                    # 아직 준비 중인 작업은 건너뛰지 않음
+                    break
+                if not model_residency.switch_needed(key):
+                    return ticket
+        return head if not self._running else None
+
+    async def release(self, ticket):
+        """제출을 마쳤거나 제출하지 않고 끝난 순번을 대기열에서 뺌"""
+        async with self._condition:
+            self._open.pop(ticket, None)
+            self._overtaken.pop(ticket, None)
+            if self._serving == ticket:
+                self._serving = None
+            self._condition.notify_all()
+
+    async def finish(self, ticket):
+        """순번의 실행이 끝났음을 알림 (모델 전환을 기다리는 작업이 진행할 수 있음)"""
+        await self.release(ticket)
+        async with self._condition:
+            self._running.discard(ticket)
+            self._condition.notify_all()
+
+    async def wait_turn(self, ticket, key=None):
+        """key 모델을 쓰는 ticket의 제출 차례가 올 때까지 기다림 (이후 finish()를 불러야 함)"""
+        async with self._condition:
+            self._open[ticket] = key
+            self._condition.notify_all()
+            await self._condition.wait_for(lambda: self._choose() == ticket)
+            for older in self._open:
+                if older < ticket:
+                    self._overtaken[older] = self._overtaken.get(older, 0) + 1
+            self._serving = ticket
+            self._running.add(ticket)
+
+submission_order = SubmissionOrder()
+
+async def handler_async(job):
+    """입력 준비/결과 전달을 다른 작업의 GPU 실행과 겹쳐 처리하는 비동기 핸들러 (HANDLER_MODE=async)
+
+    블로킹 단계(다운로드, 디코딩, 결과 인코딩/업로드, 완료 대기)는 스레드에서 실행하고,
+    프롬프트 제출만 SubmissionOrder로 직렬화합니다 (도착 순서, 올라가 있는 모델 우선).
+    """
+    job_input = job.get("input", {})
+    if is_batch_input(job_input):
+        return await asyncio.to_thread(handler_batch, job)
+
+    logger.info(f"Received job input: {summarize_for_log(job_input)}")
+    task_id = f"task_{uuid.uuid4()}"
+    job_id = job.get("id") or task_id
+    metrics = JobMetrics()
+    ticket = submission_order.take()
+    job_state = None
+    prompt_id = None
+    try:
+        try:
+            job_state = await asyncio.to_thread(prepare_job, job_input, task_id, metrics)
+            if "error" in job_state:
+                return attach_metrics(job_state, metrics)
+            cached = await asyncio.to_thread(deliver_cached, job_state, job_id)
+            if cached is not None:
+                return await asyncio.to_thread(finish_job, cached, job_state)
+            await asyncio.to_thread(comfy.wait_until_ready)
+
+            await submission_order.wait_turn(ticket, job_state["model_key"])
+            if job_state["segmented"]:
+                # 구간 분할 작업은 구간마다 제출하므로 순번은 시작 순서에만 적용
+                await submission_order.release(ticket)
+                result = await asyncio.to_thread(render_and_deliver_segmented, job_state, job_id)
+                return await asyncio.to_thread(finish_job, result, job_state)
+            metrics.mark_queued()
+            prompt_id = await asyncio.to_thread(
+                queue_prompt, job_state["prompt"], job_state["input_type"], job_state["person_count"], False, metrics
+            )
+        finally:
+            await submission_order.release(ticket)
+
+        history = await asyncio.to_thread(wait_for_prompt, prompt_id, job_state["prompt"], metrics)
+        # GPU 실행이 끝났으므로 결과 전달을 기다리지 않고 모델 전환을 허용
+        await submission_order.finish(ticket)
+        job_state["scratch"].track_history(prompt_id, history)
+        await asyncio.to_thread(stems.store_stems, history, job_state["stem_saves"], get_image)
+        result = await asyncio.to_thread(
+            deliver_result, collect_videos(history), job_state["output_mode"], job_id, metrics, job_state["cache_key"]
+        )
+        return await asyncio.to_thread(finish_job, result, job_state)
+    finally:
+        await submission_order.finish(ticket)
+        # 제출 직후 취소되면 완료를 기다리지 않으므로 구독 큐를 여기서 해제
+        if prompt_id is not None:
+            comfy.unsubscribe(prompt_id)
+        # 실패/취소된 작업도 파일을 남기지 않음 (이미 정리했으면 아무것도 하지 않음)
+        if job_state is not None and "scratch" in job_state:
+            await asyncio.to_thread(job_state["scratch"].cleanup, comfy.delete_history)
+
+def concurrency_modifier(current_concurrency):
+    """RunPod이 워커에 동시에 넘길 작업 수"""
+    return MAX_CONCURRENCY
+
+def run_warmup():
+    """활성화된 템플릿을 예제 에셋으로 한 번씩 실행해 모델을 미리 로드
+
+    웜업 출력 파일과 history 항목은 작업과 같은 방식으로 JobScratch가 정리하며,
+    웜업 중의 모델 교체는 전환 횟수/지표에 넣지 않고 /free도 보내지 않습니다.
+    """
+    comfy.wait_until_ready()
+    warmup_scratch = scratch.JobScratch("warmup")
+    try:
+        with model_residency.warming():
+            return warmup.run_warmup(templates, functools.partial(get_videos, job_scratch=warmup_scratch))
+    finally:
+        reclaimed = warmup_scratch.cleanup(comfy.delete_history)
+        logger.info(f"🧹 웜업 파일 정리: {reclaimed} bytes 회수, history {len(warmup_scratch.prompt_ids)}개 삭제")
+
+def start_worker(job_handler=None):
+    """웜업이 끝난 뒤 RunPod 워커를 시작 (그 전에는 작업을 받지 않음)"""
+    start_metrics_server()
+    run_warmup()
+    if job_handler is not None:
+        runpod.serverless.start({"handler": job_handler})
+    elif HANDLER_MODE == "stream":
+        runpod.serverless.start({"handler": handler_stream, "return_aggregate_stream": True})
+    elif HANDLER_MODE == "async":
+        runpod.serverless.start({"handler": handler_async, "concurrency_modifier": concurrency_modifier})
+    else:
+        runpod.serverless.start({"handler": handler})
+
+if __name__ == "__main__":
+    start_worker()
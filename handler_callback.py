@@ -1,7 +1,12 @@
 import os
 import json
-import base64
+import gzip
+import time
+import uuid
+import random
+import shutil
 import logging
+import threading
 import traceback
 import urllib.request
 import urllib.error
@@ -13,16 +18,212 @@ import handler as base_handler
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("callback-handler")
 
-def _http_post(url: str, payload: dict, headers: dict | None = None, timeout: int = 30):
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(url, data=data, headers=headers or {"Content-Type": "application/json"})
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        return resp.read().decode("utf-8")
+# очередь коллбэков на диске: задача не ждёт доставки, а недоставленное переживает перезапуск воркера
+CALLBACK_OUTBOX_DIR = os.getenv("CALLBACK_OUTBOX_DIR", "/tmp/callback_outbox")
+CALLBACK_TIMEOUT = int(os.getenv("CALLBACK_TIMEOUT", "30"))
+CALLBACK_MAX_ATTEMPTS = int(os.getenv("CALLBACK_MAX_ATTEMPTS", "8"))
+# экспоненциальная пауза между попытками: base, 2*base, 4*base ... но не больше max (секунды)
+CALLBACK_BACKOFF_BASE = float(os.getenv("CALLBACK_BACKOFF_BASE", "2"))
+CALLBACK_BACKOFF_MAX = float(os.getenv("CALLBACK_BACKOFF_MAX", "300"))
+# true — слать тело с Content-Encoding: gzip (только если получатель его понимает);
+# для отдельной задачи можно переопределить через input.callback_gzip
+CALLBACK_GZIP = os.getenv("CALLBACK_GZIP", "false").lower() == "true"
 
-def _make_success_body(video_b64: str | None, extra: dict | None = None):
+# поля результата с самим видео: в meta.raw_result вместо них кладём ссылку на поле тела
+VIDEO_FIELDS = ("video", "video_base64")
+# 4xx, которые имеет смысл повторить
+RETRYABLE_STATUSES = {408, 425, 429}
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def _write_atomic(path: str, write):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class CallbackOutbox:
+    """
+    Очередь коллбэков на диске + фоновый поток-отправитель.
+
+    Каждая запись — два файла: <id>.json (тело) и <id>.meta.json (url, заголовки, попытки).
+    meta пишется последним, поэтому запись без meta считается недописанной и не отправляется.
+    Тело (если для записи включён gzip) сжимается в <id>.json.gz один раз перед первой попыткой и при
+    повторах читается с диска потоком, а не целиком в память. Записи, которые так и не удалось доставить, переносятся в failed/.
+    """
+
+    def __init__(self, directory: str = CALLBACK_OUTBOX_DIR):
+        self.dir = directory
+        self.failed_dir = os.path.join(directory, "failed")
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def put(self, url: str, payload: dict, headers: dict | None = None, compress: bool | None = None) -> str:
+        """сохраняет коллбэк в очередь и сразу возвращает id записи (отправка — в фоне)
+
+        compress — сжимать ли тело gzip (None — по CALLBACK_GZIP)
+        """
+        os.makedirs(self.dir, exist_ok=True)
+        entry_id = f"{int(time.time() * 1000):013d}_{uuid.uuid4().hex}"
+        body_path = os.path.join(self.dir, f"{entry_id}.json")
+        _write_atomic(body_path, lambda f: f.write(json.dumps(payload).encode("utf-8")))
+        # заголовки (в т.ч. Authorization) лежат на локальном диске воркера до доставки
+        meta = {"url": url, "headers": headers or {}, "attempts": 0, "next_at": 0, "created_at": time.time(),
+                "gzip": CALLBACK_GZIP if compress is None else bool(compress)}
+        self._write_meta(entry_id, meta)
+        self.start()
+        with self._lock:
+            self._idle.clear()
+            self._wake.set()
+        return entry_id
+
+    def start(self):
+        """запускает поток-отправитель (один на процесс); подхватывает записи, оставшиеся с прошлого запуска"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="callback-sender", daemon=True)
+                self._thread.start()
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """ждёт, пока очередь не опустеет (всё доставлено или перенесено в failed/) — для бенчмарков и остановки"""
+        return self._idle.wait(timeout)
+
+    # ------------------------------------------------------------------ #
+    def _meta_path(self, entry_id: str) -> str:
+        return os.path.join(self.dir, f"{entry_id}.meta.json")
+
+    def _write_meta(self, entry_id: str, meta: dict):
+        _write_atomic(self._meta_path(entry_id), lambda f: f.write(json.dumps(meta).encode("utf-8")))
+
+    def _entries(self) -> list:
+        try:
+            names = sorted(os.listdir(self.dir))
+        except FileNotFoundError:
+            return []
+        return [name[:-len(".meta.json")] for name in names if name.endswith(".meta.json")]
+
+    def _run(self):
+        while True:
+            try:
+                next_due = self._send_due()
+            except Exception:
+                # например, каталог очереди недоступен — поток не должен умирать, попробуем позже
+                log.exception("❌ callback outbox pass failed")
+                next_due = time.time() + CALLBACK_BACKOFF_BASE
+            with self._lock:
+                # новая запись могла появиться во время обхода — тогда put() уже выставил _wake
+                if next_due is None and not self._wake.is_set() and not self._entries():
+                    self._idle.set()
+            self._wake.wait(timeout=max(0.0, next_due - time.time()) if next_due else 60)
+            self._wake.clear()
+
+    def _send_due(self) -> float | None:
+        """один проход по очереди: отправляет записи, чей срок подошёл; возвращает время ближайшего повтора"""
+        now = time.time()
+        next_due = None
+        for entry_id in self._entries():
+            try:
+                with open(self._meta_path(entry_id), "r") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if meta["next_at"] <= now:
+                try:
+                    self._attempt(entry_id, meta)
+                except Exception:
+                    # ошибка записи meta/переноса в failed/ (диск полон и т.п.): запись остаётся, повторим позже
+                    log.exception("❌ callback %s: outbox bookkeeping failed", entry_id)
+                    meta["next_at"] = time.time() + CALLBACK_BACKOFF_BASE
+                now = time.time()
+                if not os.path.exists(self._meta_path(entry_id)):
+                    continue
+            next_due = min(next_due or meta["next_at"], meta["next_at"])
+        return next_due
+
+    def _body_path(self, entry_id: str, compress: bool) -> tuple[str, dict]:
+        """путь к телу для отправки и заголовки кодирования (сжимает один раз, при первой попытке)"""
+        plain_path = os.path.join(self.dir, f"{entry_id}.json")
+        if not compress:
+            return plain_path, {}
+        gz_path = f"{plain_path}.gz"
+        if not os.path.exists(gz_path):
+            def compress(f):
+                with open(plain_path, "rb") as src, gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, STREAM_CHUNK_SIZE)
+            _write_atomic(gz_path, compress)
+        return gz_path, {"Content-Encoding": "gzip"}
+
+    def _attempt(self, entry_id: str, meta: dict):
+        meta["attempts"] += 1
+        try:
+            body_path, encoding = self._body_path(entry_id, meta.get("gzip", CALLBACK_GZIP))
+            headers = {"Content-Type": "application/json", **meta["headers"], **encoding,
+                       "Content-Length": str(os.path.getsize(body_path))}
+            with open(body_path, "rb") as body:
+                req = urllib.request.Request(meta["url"], data=body, headers=headers, method="POST")
+                with urllib.request.urlopen(req, timeout=CALLBACK_TIMEOUT) as resp:
+                    resp.read()
+        except urllib.error.HTTPError as e:
+            retry_after = e.headers.get("Retry-After") if e.headers else None
+            if 400 <= e.code < 500 and e.code not in RETRYABLE_STATUSES:
+                self._give_up(entry_id, meta, f"HTTP {e.code}")
+            else:
+                self._retry_later(entry_id, meta, f"HTTP {e.code}", retry_after)
+            return
+        except Exception as e:
+            self._retry_later(entry_id, meta, f"{e.__class__.__name__}: {e}")
+            return
+        log.info("✅ callback posted to %s (attempt %d)", meta["url"], meta["attempts"])
+        self._remove(entry_id)
+
+    def _retry_later(self, entry_id: str, meta: dict, error: str, retry_after: str | None = None):
+        if meta["attempts"] >= CALLBACK_MAX_ATTEMPTS:
+            self._give_up(entry_id, meta, error)
+            return
+        delay = min(CALLBACK_BACKOFF_BASE * 2 ** (meta["attempts"] - 1), CALLBACK_BACKOFF_MAX)
+        # разброс, чтобы повторы нескольких воркеров не приходили к получателю одновременно
+        delay *= random.uniform(0.5, 1.0)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        meta.update({"next_at": time.time() + delay, "last_error": error})
+        self._write_meta(entry_id, meta)
+        log.warning("⚠️ callback to %s failed (%s), retry %d/%d in %.1fs",
+                    meta["url"], error, meta["attempts"], CALLBACK_MAX_ATTEMPTS, delay)
+
+    def _give_up(self, entry_id: str, meta: dict, error: str):
+        os.makedirs(self.failed_dir, exist_ok=True)
+        meta["last_error"] = error
+        self._write_meta(entry_id, meta)
+        for suffix in (".json", ".meta.json"):
+            path = os.path.join(self.dir, f"{entry_id}{suffix}")
+            if os.path.exists(path):
+                os.replace(path, os.path.join(self.failed_dir, f"{entry_id}{suffix}"))
+        self._remove(entry_id)
+        log.error("❌ callback to %s dropped after %d attempts (%s), kept in %s",
+                  meta["url"], meta["attempts"], error, self.failed_dir)
+
+    def _remove(self, entry_id: str):
+        for suffix in (".meta.json", ".json", ".json.gz"):
+            try:
+                os.remove(os.path.join(self.dir, f"{entry_id}{suffix}"))
+            except FileNotFoundError:
+                pass
+
+
+outbox = CallbackOutbox()
+
+
+def _make_success_body(video_b64: str | None, extra: dict | None = None, video_ref: dict | None = None):
     body = {"status": "SUCCESS"}
     if video_b64 is not None:
         body["video_base64"] = video_b64
+    if video_ref:
+        body.update(video_ref)
     if extra:
         body["meta"] = extra
     return body
@@ -33,16 +234,25 @@ def _make_error_body(message: str, extra: dict | None = None):
         body["meta"] = extra
     return body
 
+def _raw_result_ref(result):
+    """результат без второй копии видео: поле с видео заменяем JSON-ссылкой на video_base64 в теле"""
+    if not isinstance(result, dict):
+        return result
+    return {key: ({"$ref": "#/video_base64"} if key in VIDEO_FIELDS and isinstance(value, str) else value)
+            for key, value in result.items()}
+
 def handler(job: dict):
     """
     Расширенный обработчик:
     - поддерживает input.callback_url (опционально)
     - всегда возвращает обычный ответ (для совместимости)
-    - если задан callback_url, по завершении отдельно шлёт POST с SUCCESS/ERROR
+    - если задан callback_url, по завершении кладёт SUCCESS/ERROR в очередь на диске;
+      отправка (повторы с экспоненциальной паузой, gzip по желанию) идёт в фоне, ответ не ждёт доставки
     """
     job_input = job.get("input", {}) or {}
     callback_url = job_input.get("callback_url")
     callback_headers = job_input.get("callback_headers")  # опционально: {"Authorization":"Bearer ..."}
+    callback_gzip = job_input.get("callback_gzip")  # опционально: true/false вместо CALLBACK_GZIP
     meta = {"job_id": job.get("id")}
 
     try:
@@ -51,20 +261,26 @@ def handler(job: dict):
 
         # извлечём видео (у них обычно {"video": "<b64>"}), но оставим гибко
         video_b64 = None
+        video_ref = None
         if isinstance(result, dict):
             if "video" in result and isinstance(result["video"], str):
                 video_b64 = result["video"]
             elif "video_base64" in result and isinstance(result["video_base64"], str):
                 video_b64 = result["video_base64"]
+            elif "video_url" in result:
+                # output_mode=s3: видео уже в бакете, шлём только ссылку
+                video_ref = {k: result[k] for k in ("video_url", "video_size", "video_sha256") if k in result}
 
-        # если задан callback_url — отправим успешный коллбэк
+        # если задан callback_url — поставим успешный коллбэк в очередь
         if callback_url:
             try:
-                payload = _make_success_body(video_b64, extra=meta | {"raw_result": result})
-                _http_post(callback_url, payload, headers=callback_headers)
-                log.info("✅ callback SUCCESS posted to %s", callback_url)
+                payload = _make_success_body(
+                    video_b64, extra=meta | {"raw_result": _raw_result_ref(result)}, video_ref=video_ref
+                )
+                outbox.put(callback_url, payload, headers=callback_headers, compress=callback_gzip)
+                log.info("📮 callback SUCCESS queued for %s", callback_url)
             except Exception as e:
-                log.error("❌ callback post failed: %s", e)
+                log.error("❌ callback enqueue failed: %s", e)
 
         # вернём обычный ответ как раньше
         return result
@@ -77,10 +293,17 @@ def handler(job: dict):
         if callback_url:
             try:
                 payload = _make_error_body(err_msg, extra=meta)
-                _http_post(callback_url, payload, headers=callback_headers)
-                log.info("✅ callback ERROR posted to %s", callback_url)
+                outbox.put(callback_url, payload, headers=callback_headers, compress=callback_gzip)
+                log.info("📮 callback ERROR queued for %s", callback_url)
             except Exception as ee:
-                log.error("❌ callback error-post failed: %s", ee)
+                log.error("❌ callback error-enqueue failed: %s", ee)
 
         # и в сам ответ тоже вернём ошибку (как раньше делал ранпод)
-        return {"error": err_msg, "status": "ERROR"}
\ No newline at end of file
+        return {"error": err_msg, "status": "ERROR"}
+
+
+if __name__ == "__main__":
+    # сначала дошлём коллбэки, оставшиеся с прошлого запуска
+    outbox.start()
+    # handler.py при импорте воркер не запускает — стартуем его здесь (после прогрева)
+    base_handler.start_worker(handler)
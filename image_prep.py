@@ -0,0 +1,103 @@
+"""I2V 입력 이미지를 LoadImage(284) 전에 CPU에서 목표 크기로 정리하는 전처리
+
+LoadImage는 보낸 이미지를 원본 크기 그대로 float 텐서로 디코딩하고, ImageResizeKJv2(281)가
+그제서야 목표 크기로 줄입니다. 여기서는 281과 같은 방식(비율 유지 + 가운데 crop, lanczos,
+16의 배수)으로 미리 줄여 작은 JPEG로 넘기므로 281은 크기가 같은 이미지를 그대로 통과시킵니다.
+
+- EXIF 방향을 먼저 적용 (LoadImage와 같은 방향)
+- JPEG는 draft 모드로 필요한 크기 이상인 가장 작은 1/2^n 크기로만 디코딩
+- 결과는 원본 내용 해시 + 목표 크기를 키로 DiskCache에 저장
+"""
+import logging
+import os
+
+from PIL import Image, ImageOps
+
+from disk_cache import DiskCache
+from result_cache import content_digest
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PREP = os.getenv('IMAGE_PREP', 'true').lower() == 'true'
+# IMAGE_PREP_CACHE_MAX_GB=0이면 캐시하지 않음 (매번 작업 폴더에 새로 만듦)
+image_prep_cache = DiskCache(
+    os.getenv('IMAGE_PREP_CACHE_DIR', '/tmp/image_prep_cache'),
+    int(float(os.getenv('IMAGE_PREP_CACHE_MAX_GB', '1')) * 1024 ** 3),
+)
+# 281의 divisible_by
+DIVISIBLE_BY = 16
+JPEG_QUALITY = 95
+# EXIF Orientation 중 가로/세로가 바뀌는 값
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def target_size(width, height, divisible_by=DIVISIBLE_BY):
+    """281이 만드는 출력 크기 (16의 배수로 내림)"""
+    return max(divisible_by, width - width % divisible_by), max(divisible_by, height - height % divisible_by)
+
+
+def crop_box(src_width, src_height, width, height):
+    """목표 비율에 맞춘 가운데 crop 영역 (281의 keep_proportion=crop, crop_position=center)"""
+    src_ratio = src_width / src_height
+    ratio = width / height
+    if src_ratio > ratio:
+        crop_width = round(src_height * ratio)
+        left = (src_width - crop_width) // 2
+        return left, 0, left + crop_width, src_height
+    crop_height = round(src_width / ratio)
+    top = (src_height - crop_height) // 2
+    return 0, top, src_width, top + crop_height
+
+
+def normalize_image(image_path, width, height, work_dir, input_cache=None):
+    """이미지를 목표 크기로 정리한 파일 경로와 정보를 반환
+
+    (경로, 정보)를 반환합니다. 정보에는 원본 크기(width/height, EXIF 방향 적용 후)와
+    mode("none": 원본 사용, "resized", "cached")가 들어가며, 읽을 수 없는 이미지는 원본을 그대로 돌려줍니다.
+    """
+    out_width, out_height = target_size(width, height)
+    try:
+        with Image.open(image_path) as image:
+            orientation = image.getexif().get(0x0112, 1)
+            src_width, src_height = image.size
+            if orientation in _TRANSPOSED_ORIENTATIONS:
+                src_width, src_height = src_height, src_width
+    except (OSError, ValueError) as e:
+        logger.warning(f"입력 이미지를 열 수 없어 전처리 없이 사용합니다 ({image_path}): {e}")
+        return image_path, {"mode": "none"}
+    info = {"width": src_width, "height": src_height, "normalized_width": out_width, "normalized_height": out_height}
+    if (src_width, src_height) == (out_width, out_height) and orientation == 1:
+        return image_path, {**info, "mode": "none"}
+
+    key = f"image:{content_digest(image_path, input_cache)}:{out_width}x{out_height}"
+    with image_prep_cache.lock(key):
+        entry = image_prep_cache.get(key)
+        if entry is not None:
+            logger.info(f"♻️ 입력 이미지 전처리 캐시 적중: {entry['path']}")
+            return entry["path"], {**info, "mode": "cached"}
+
+        with Image.open(image_path) as image:
+            # 가운데 crop 뒤에도 목표 크기 이상이 남도록 draft 크기를 정함 (EXIF 적용 전 방향 기준)
+            left, top, right, bottom = crop_box(src_width, src_height, out_width, out_height)
+            scale = min((right - left) / out_width, (bottom - top) / out_height)
+            draft_size = (round(src_width / scale), round(src_height / scale))
+            if orientation in _TRANSPOSED_ORIENTATIONS:
+                draft_size = draft_size[::-1]
+            image.draft("RGB", draft_size)
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            # draft로 줄어든 비율만큼 crop 영역도 줄임
+            ratio = image.width / src_width
+            box = (left * ratio, top * ratio, right * ratio, bottom * ratio)
+            image = image.resize((out_width, out_height), Image.Resampling.LANCZOS, box=box)
+
+            if image_prep_cache.enabled:
+                output_path = image_prep_cache.make_temp_path(".jpg")
+            else:
+                os.makedirs(work_dir, exist_ok=True)
+                output_path = os.path.abspath(os.path.join(work_dir, "input_image_normalized.jpg"))
+            image.save(output_path, "JPEG", quality=JPEG_QUALITY, subsampling=0)
+
+        if image_prep_cache.enabled:
+            output_path = image_prep_cache.put_file(key, output_path, ".jpg")
+    logger.info(f"🖼️ 입력 이미지 전처리: {src_width}x{src_height} -> {out_width}x{out_height}")
+    return output_path, {**info, "mode": "resized"}
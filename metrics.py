@@ -0,0 +1,216 @@
+"""작업 단계별 소요 시간과 ComfyUI 노드별 실행 시간 측정
+
+JobMetrics는 작업 하나의 단계(span)와 노드 시간을 모아 결과의 "metrics" 키로 돌려주고,
+observe()로 프로세스 전체 히스토그램에 누적해 Prometheus/OpenMetrics 텍스트로 내보낼 수 있습니다.
+METRICS_PORT를 지정하면 해당 포트의 /metrics에서 노출합니다.
+"""
+import contextlib
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+# 단계/노드 시간 히스토그램 버킷(초). 다운로드(수 초)부터 샘플러(수십 분)까지 포괄
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 3600)
+
+
+class JobMetrics:
+    """작업 하나의 단계별 시간과 노드별 실행 시간
+
+    입력 준비는 여러 스레드에서 동시에 기록하므로 기록은 잠금으로 보호합니다.
+    같은 이름의 단계가 여러 번 기록되면 시간을 더합니다 (예: 입력 두 개의 base64 디코딩).
+    """
+
+    def __init__(self, workflow=None):
+        self.workflow = workflow
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.nodes = {}
+        # 결과에 함께 실을 작업 정보 (메모리 계획 등)
+        self.annotations = {}
+        self._lock = threading.Lock()
+        self._queued_at = None
+        self._execution_started_at = None
+        self._current_node = None
+        self._node_started_at = None
+
+    def annotate(self, key, value):
+        self.annotations[key] = value
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def span(self, name):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t)
+
+    # ------------------------------------------------------------------ #
+    # ComfyUI 실행 추적
+    # ------------------------------------------------------------------ #
+    def mark_queued(self):
+        self._queued_at = time.perf_counter()
+
+    def _finish_node(self, now):
+        if self._current_node is not None:
+            node = self.nodes.setdefault(self._current_node[0], {"class_type": self._current_node[1], "seconds": 0.0})
+            node["seconds"] += now - self._node_started_at
+        self._current_node = None
+
+    def observe_message(self, message, prompt):
+        """웹소켓 메시지로 대기 시간, 실행 시간, 노드별 시간을 계산
+
+        노드 시간은 executing 메시지가 다음 노드로 넘어갈 때까지의 시간이며,
+        캐시된 노드는 0초로 기록합니다. 시각은 클라이언트가 메시지를 받은 시각(received_at)을 쓰므로
+        메시지를 늦게 꺼내 처리해도 시간이 밀리지 않습니다.
+        """
+        message_type = message.get('type')
+        data = message.get('data') or {}
+        now = message.get('received_at', time.perf_counter())
+        if message_type == 'execution_start':
+            if self._queued_at is not None:
+                self.record("queue_wait", now - self._queued_at)
+            self._execution_started_at = now
+        elif message_type == 'execution_cached':
+            for node_id in data.get('nodes', []):
+                self.nodes.setdefault(node_id, {
+                    "class_type": prompt.get(node_id, {}).get("class_type"), "seconds": 0.0, "cached": True,
+                })
+        elif message_type == 'executing':
+            self._finish_node(now)
+            node_id = data.get('node')
+            if node_id is None:
+                if self._execution_started_at is not None:
+                    self.record("execution", now - self._execution_started_at)
+                return
+            self._current_node = (node_id, prompt.get(node_id, {}).get("class_type"))
+            self._node_started_at = now
+
+    def as_dict(self):
+        return {
+            "workflow": self.workflow,
+            "total": time.perf_counter() - self.started,
+            "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            "nodes": {
+                node_id: {**node, "seconds": round(node["seconds"], 4)}
+                for node_id, node in sorted(self.nodes.items(), key=lambda item: -item[1]["seconds"])
+            },
+        }
+
+
+def span(metrics, name):
+    """metrics가 None이면 아무것도 기록하지 않는 span"""
+    return metrics.span(name) if metrics is not None else contextlib.nullcontext()
+
+
+# ---------------------------------------------------------------------- #
+# 프로세스 전체 집계 / OpenMetrics 내보내기
+# ---------------------------------------------------------------------- #
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+_registry_lock = threading.Lock()
+_stage_histograms = {}  # (workflow, stage) -> _Histogram
+_node_histograms = {}  # (workflow, class_type) -> _Histogram
+_job_counts = {}  # (workflow, status) -> int
+_model_switches = {}  # 전환해 올린 모델 -> 횟수
+
+
+def observe(job_metrics, status="success"):
+    """작업 하나의 측정값을 프로세스 전체 히스토그램에 누적"""
+    workflow = job_metrics.workflow or "unknown"
+    with _registry_lock:
+        _job_counts[(workflow, status)] = _job_counts.get((workflow, status), 0) + 1
+        _stage_histograms.setdefault((workflow, "total"), _Histogram()).observe(
+            time.perf_counter() - job_metrics.started
+        )
+        for stage, seconds in job_metrics.stages.items():
+            _stage_histograms.setdefault((workflow, stage), _Histogram()).observe(seconds)
+        for node in job_metrics.nodes.values():
+            if not node.get("cached"):
+                _node_histograms.setdefault((workflow, node["class_type"]), _Histogram()).observe(node["seconds"])
+
+
+def observe_model_switch(model):
+    """ComfyUI에 올라간 모델이 바뀐 횟수를 누적"""
+    with _registry_lock:
+        _model_switches[model] = _model_switches.get(model, 0) + 1
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _render_histogram(lines, name, histograms, label):
+    lines.append(f"# TYPE {name} histogram")
+    lines.append(f"# UNIT {name} seconds")
+    for (workflow, key), histogram in sorted(histograms.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+        labels = f'workflow="{_escape(workflow)}",{label}="{_escape(key)}"'
+        for bound, count in zip(BUCKETS, histogram.counts):
+            lines.append(f'{name}_bucket{{{labels},le="{float(bound)}"}} {count}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+
+
+def render_openmetrics():
+    """누적된 측정값을 OpenMetrics 텍스트 형식으로 반환 (Prometheus도 읽을 수 있음)"""
+    lines = []
+    with _registry_lock:
+        lines.append("# TYPE infinitetalk_jobs counter")
+        for (workflow, status), count in sorted(_job_counts.items()):
+            lines.append(f'infinitetalk_jobs_total{{workflow="{_escape(workflow)}",status="{_escape(status)}"}} {count}')
+        lines.append("# TYPE infinitetalk_model_switches counter")
+        for model, count in sorted(_model_switches.items()):
+            lines.append(f'infinitetalk_model_switches_total{{model="{_escape(model)}"}} {count}')
+        _render_histogram(lines, "infinitetalk_stage_seconds", _stage_histograms, "stage")
+        _render_histogram(lines, "infinitetalk_node_seconds", _node_histograms, "class_type")
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render_openmetrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_http_server(port=None):
+    """/metrics 엔드포인트를 백그라운드 스레드로 시작 (포트가 0이면 시작하지 않음)"""
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"📈 메트릭 엔드포인트: http://0.0.0.0:{port}/metrics")
+    return server
@@ -0,0 +1,134 @@
+"""해상도/프레임 수/VRAM 예산으로 block swap, VAE 타일링, frame window를 고르는 메모리 계획
+
+GPU나 ComfyUI 없이 계산만 하는 모듈입니다. 메모리 사용량은 보정 테이블(CALIBRATION)의
+계수로 추정하며, PLANNER_CALIBRATION에 JSON 파일을 지정하면 값을 덮어씁니다.
+
+추정 모델:
+- 샘플링 중 VRAM = 상주 오버헤드 + 상주 블록 수 x 블록 크기 + 윈도우 활성값
+  (활성값은 윈도우 하나의 latent 토큰 수에 비례)
+- VAE 디코드 VRAM = 오버헤드 + 디코드 영역 픽셀 x 프레임 수 x 계수
+  (샘플러가 force_offload로 모델을 내린 뒤 실행되므로 블록 메모리는 포함하지 않음)
+"""
+import json
+import logging
+import math
+import os
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION = {
+    # Wan2.1 I2V 14B Q8 GGUF: 트랜스포머 블록 40개, 블록당 약 0.37GB
+    "total_blocks": 40,
+    "block_gb": 0.37,
+    # 텍스트/CLIP vision/wav2vec/MultiTalk/VAE 등 샘플링 중 상주하는 나머지
+    "overhead_gb": 3.0,
+    # 1000 latent 토큰(16x16 픽셀 패치 x latent 프레임)당 활성값 GB
+    "activation_gb_per_1k_tokens": 0.25,
+    # VAE 디코드: 픽셀 x 프레임당 바이트, 디코드 중 상주 오버헤드
+    "vae_bytes_per_pixel_frame": 60.0,
+    "vae_overhead_gb": 1.5,
+    # 단편화 등을 고려한 여유분
+    "safety_margin_gb": 1.5,
+    # 큰 것부터 시도하는 frame_window_size 후보 (4n+1)
+    "frame_windows": [81, 65, 49, 33],
+    # (tile, stride_x, stride_y) 후보, 큰 것부터
+    "vae_tiles": [[512, 272, 256], [384, 208, 192], [272, 144, 128], [192, 112, 96]],
+}
+
+
+def load_calibration(path=None):
+    """기본 보정 테이블에 PLANNER_CALIBRATION JSON 파일 값을 덮어쓴 테이블"""
+    calibration = dict(CALIBRATION)
+    path = path or os.getenv('PLANNER_CALIBRATION')
+    if path:
+        with open(path, 'r') as f:
+            calibration.update(json.load(f))
+    return calibration
+
+
+def detect_vram_gb():
+    """VRAM_BUDGET_GB 설정값, 없으면 nvidia-smi로 확인한 총 VRAM의 90% (확인 불가면 None)"""
+    configured = float(os.getenv('VRAM_BUDGET_GB', '0'))
+    if configured > 0:
+        return configured
+    try:
+        result = subprocess.run(
+            ['nvidia-smi', '--query-gpu=memory.total', '--format=csv,noheader,nounits'],
+            capture_output=True, text=True, timeout=10,
+        )
+        return int(result.stdout.splitlines()[0]) / 1024 * 0.9
+    except (OSError, ValueError, IndexError, subprocess.SubprocessError):
+        return None
+
+
+def latent_tokens(width, height, frames):
+    """Wan latent 토큰 수 (VAE 8배 축소 + 2x2 패치, 시간축 4배 축소)"""
+    return math.ceil(width / 16) * math.ceil(height / 16) * ((frames - 1) // 4 + 1)
+
+
+def plan_memory(width, height, max_frame, vram_budget_gb, calibration=None):
+    """작업 하나의 메모리/속도 설정을 계획
+
+    frame_window_size는 가능한 한 큰 값을 유지하고(품질/속도), 그 윈도우의 활성값을 올린 뒤
+    남는 VRAM만큼 블록을 상주시켜 blocks_to_swap을 정합니다. 블록을 모두 내려도 활성값이
+    들어가지 않으면 더 작은 윈도우를 시도합니다. VAE 디코드가 예산을 넘으면 들어가는
+    가장 큰 타일로 타일링을 켭니다.
+    """
+    calibration = calibration or CALIBRATION
+    total_blocks = calibration["total_blocks"]
+    block_gb = calibration["block_gb"]
+    usable = vram_budget_gb - calibration["overhead_gb"] - calibration["safety_margin_gb"]
+
+    window = None
+    for candidate in calibration["frame_windows"]:
+        activation = latent_tokens(width, height, candidate) / 1000 * calibration["activation_gb_per_1k_tokens"]
+        window = (candidate, activation)
+        if usable - activation >= 0:
+            break
+    frame_window_size, activation_gb = window
+    block_slots = max(0, int((usable - activation_gb) // block_gb))
+    if block_slots >= total_blocks:
+        resident_blocks, prefetch_blocks = total_blocks, 0
+    else:
+        # 블록을 내려야 하면 미리 가져올 블록 자리를 먼저 떼어 두고, 자리가 넉넉하면 두 블록씩 가져와 전송 대기를 줄임
+        prefetch_blocks = 2 if block_slots >= 4 else 1
+        resident_blocks = max(0, block_slots - prefetch_blocks)
+    blocks_to_swap = total_blocks - resident_blocks
+    sampling_peak = calibration["overhead_gb"] + (resident_blocks + prefetch_blocks) * block_gb + activation_gb
+
+    vae_budget = vram_budget_gb - calibration["vae_overhead_gb"] - calibration["safety_margin_gb"]
+    bytes_per = calibration["vae_bytes_per_pixel_frame"]
+    decode_gb = width * height * max_frame * bytes_per / 1024 ** 3
+    vae_tiling = None
+    if decode_gb > vae_budget:
+        tiles = calibration["vae_tiles"]
+        for tile, stride_x, stride_y in tiles:
+            if tile * tile * max_frame * bytes_per / 1024 ** 3 <= vae_budget:
+                break
+        vae_tiling = {"tile_x": tile, "tile_y": tile, "tile_stride_x": stride_x, "tile_stride_y": stride_y}
+        decode_gb = tile * tile * max_frame * bytes_per / 1024 ** 3
+    decode_peak = calibration["vae_overhead_gb"] + decode_gb
+
+    return {
+        "vram_budget_gb": round(vram_budget_gb, 2),
+        "frame_window_size": frame_window_size,
+        "blocks_to_swap": blocks_to_swap,
+        "prefetch_blocks": prefetch_blocks,
+        "vae_tiling": vae_tiling,
+        "estimated_peak_gb": round(max(sampling_peak, decode_peak), 2),
+        "fits": sampling_peak <= vram_budget_gb and decode_peak <= vram_budget_gb,
+    }
+
+
+def plan_params(plan):
+    """계획을 템플릿 instantiate() 파라미터로 변환"""
+    params = {
+        "frame_window_size": plan["frame_window_size"],
+        "blocks_to_swap": plan["blocks_to_swap"],
+        "prefetch_blocks": plan["prefetch_blocks"],
+        "vae_tiling": plan["vae_tiling"] is not None,
+    }
+    if plan["vae_tiling"]:
+        params.update(plan["vae_tiling"])
+    return params
@@ -0,0 +1,147 @@
+"""ComfyUI에 올라가 있는 모델을 기준으로 작업 제출 순서를 정하는 스케줄링
+
+single/multi 템플릿은 서로 다른 InfiniteTalk GGUF(MultiTalkModelLoader, 120)를 쓰므로 작업 종류가
+번갈아 오면 ComfyUI가 수 GB의 가중치를 계속 내리고 다시 읽습니다. I2V/V2V는 로더 노드와 입력이
+같아 ComfyUI 캐시가 그대로 재사용되므로, 상주 모델은 템플릿 이름이 아니라 큰 가중치 로더
+(RESIDENT_LOADER_CLASSES)가 읽는 파일로 구분합니다.
+
+- 여러 작업이 대기 중이면(배치, async 동시 처리) 지금 올라가 있는 모델을 쓰는 작업을 먼저 제출하되,
+  어떤 작업도 뒤에 온 작업에 RESIDENCY_WINDOW번 넘게 추월당하지 않게 합니다.
+- 모델을 바꿔야 하면 이전 모델로 실행 중인 프롬프트가 모두 끝난 뒤 /free(unload_models)를 보내
+  두 모델이 동시에 메모리에 올라가지 않게 합니다. 모델이 바뀌지 않는 제출에는 /free를 보내지 않습니다.
+- 전환 횟수와 전환 후 로더 노드 실행 시간(재로드 시간)을 집계합니다. 워커 시작 시 웜업의 제출은
+  warming() 안에서 하므로 상주 모델만 바뀌고 전환으로 세지 않으며 /free도 보내지 않습니다.
+"""
+import contextlib
+import logging
+import os
+import threading
+
+from cost_model import MODEL_LOADER_CLASSES
+from metrics import observe_model_switch
+
+logger = logging.getLogger(__name__)
+
+# 대기 중인 작업 하나가 상주 모델을 쓰는 뒤 작업에 추월당할 수 있는 최대 횟수 (0이면 도착 순서 그대로)
+RESIDENCY_WINDOW = int(os.getenv('RESIDENCY_WINDOW', '4'))
+# false면 모델 전환 때 /free를 보내지 않음 (ComfyUI가 새 모델을 올리면서 알아서 내리게 둠)
+RESIDENCY_FREE = os.getenv('RESIDENCY_FREE', 'true').lower() == 'true'
+# 전환 비용의 대부분을 차지하는 수 GB 가중치 로더 (비용 보정에서 로딩이 섞인 실행을 가를 때와 같은 로더)
+RESIDENT_LOADER_CLASSES = MODEL_LOADER_CLASSES
+
+
+def model_key(prompt):
+    """프롬프트가 올리는 큰 가중치 파일 목록으로 만든 상주 모델 식별자 (로더가 없으면 None)"""
+    models = sorted(
+        (node["class_type"], node["inputs"].get("model"))
+        for node in prompt.values()
+        if node.get("class_type") in RESIDENT_LOADER_CLASSES
+    )
+    return "+".join(str(model) for _, model in models) or None
+
+
+def load_seconds(nodes):
+    """JobMetrics.nodes에서 캐시되지 않고 실행된 큰 가중치 로더의 시간 합계"""
+    return sum(
+        node["seconds"] for node in nodes.values()
+        if node.get("class_type") in RESIDENT_LOADER_CLASSES and not node.get("cached")
+    )
+
+
+class ModelResidency:
+    """ComfyUI에 지금 올라가 있는 모델과 전환 통계 (프로세스에 하나)
+
+    상주 모델은 마지막으로 제출한 프롬프트의 모델로 봅니다. 제출 순서를 정하는 쪽(배치 핸들러,
+    SubmissionOrder)이 전환 전에 이전 모델의 프롬프트가 끝나기를 기다리므로 ComfyUI 큐와 어긋나지 않습니다.
+    """
+
+    def __init__(self):
+        self.resident = None
+        self.switches = 0
+        self.reload_seconds = 0.0
+        self._warming = False
+        self._lock = threading.Lock()
+
+    def switch_needed(self, key):
+        """key 모델로 실행하려면 올라가 있는 모델을 바꿔야 하는지"""
+        return key is not None and self.resident is not None and key != self.resident
+
+    def before_submit(self, key, free_models=None):
+        """프롬프트 제출 직전에 호출해 상주 모델을 갱신하고 로드 종류를 반환
+
+        "resident"(이미 올라가 있음), "cold"(처음 로드) 또는 "switch"(다른 모델에서 전환) 중 하나이며,
+        전환이면 free_models()로 이전 모델을 내립니다. /free 실패는 경고만 남깁니다.
+        """
+        with self._lock:
+            if key is None or key == self.resident:
+                return "resident"
+            previous = self.resident
+            self.resident = key
+            if previous is None or self._warming:
+                return "cold"
+            self.switches += 1
+        observe_model_switch(key)
+        logger.info(f"🔁 모델 전환 ({self.switches}번째): {previous} -> {key}")
+        if RESIDENCY_FREE and free_models is not None:
+            try:
+                free_models()
+            except Exception as e:
+                logger.warning(f"/free 요청 실패, 그대로 진행합니다: {e}")
+        return "switch"
+
+    @contextlib.contextmanager
+    def warming(self):
+        """웜업 제출 구간: 상주 모델은 갱신하되 전환 횟수/지표와 /free에서는 제외"""
+        with self._lock:
+            self._warming = True
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._warming = False
+
+    def record_reload(self, seconds):
+        with self._lock:
+            self.reload_seconds += seconds
+
+    def summary(self):
+        return {"resident": self.resident, "switches_total": self.switches,
+                "reload_seconds_total": round(self.reload_seconds, 3)}
+
+
+class ResidencyQueue:
+    """도착 순서를 기억하며 상주 모델 기준으로 다음 작업을 고르는 대기열 (한 스레드에서만 사용)"""
+
+    def __init__(self, window=None):
+        self.window = RESIDENCY_WINDOW if window is None else window
+        self._items = []  # [모델 키, 추월당한 횟수, 항목] (도착 순서)
+
+    def __len__(self):
+        return len(self._items)
+
+    def push(self, key, item):
+        self._items.append([key, 0, item])
+
+    def _choose(self, residency):
+        """(다음에 제출할 위치, 추월 한도에 걸려 더 미룰 수 없는지)"""
+        if self._items[0][1] >= self.window:
+            return 0, True
+        for position, (key, _, _) in enumerate(self._items):
+            if not residency.switch_needed(key):
+                return position, False
+        return 0, False
+
+    def next_key(self, residency):
+        """다음에 제출할 항목의 모델 키와 더 미룰 수 없는지 여부"""
+        position, overdue = self._choose(residency)
+        return self._items[position][0], overdue
+
+    def pop(self, residency):
+        """다음에 제출할 항목을 꺼냄 (앞선 항목들은 추월당한 횟수가 늘어남)"""
+        position, _ = self._choose(residency)
+        for older in self._items[:position]:
+            older[1] += 1
+        return self._items.pop(position)[2]
+
+
+model_residency = ModelResidency()
@@ -0,0 +1,82 @@
+"""같은 입력/설정의 렌더링 결과를 재사용하는 결과 캐시
+
+샘플러(128)는 고정 seed를 쓰므로 입력 파일 내용과 최종 프롬프트가 같으면 결과도 같습니다.
+키는 ComfyUI에 보낼 프롬프트(템플릿, 패치된 파라미터, seed, 출력 프로필 포함)에서
+입력 파일 경로를 내용 해시로 바꾼 JSON의 해시이며, 결과 비디오는 DiskCache에 저장해
+용량 상한을 넘으면 오래 쓰이지 않은 것부터 지웁니다.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+
+from disk_cache import DiskCache, sha256_file
+
+logger = logging.getLogger(__name__)
+
+# RESULT_CACHE_MAX_GB=0이면 사용 안 함
+result_cache = DiskCache(
+    os.getenv('RESULT_CACHE_DIR', '/tmp/result_cache'),
+    int(float(os.getenv('RESULT_CACHE_MAX_GB', '10')) * 1024 ** 3),
+)
+# 저장해 둔 버킷 URL을 다시 돌려줄 최대 경과 시간(초). presigned URL 만료(7일)보다 짧게 둠
+UPLOAD_REUSE_SECONDS = 6 * 24 * 3600
+
+
+def content_digest(file_path, input_cache=None):
+    """입력 파일의 sha256 (입력 캐시 blob이면 파일 이름이 곧 해시이므로 다시 읽지 않음)"""
+    if input_cache is not None and os.path.dirname(os.path.abspath(file_path)) == os.path.abspath(input_cache.blob_dir):
+        return os.path.splitext(os.path.basename(file_path))[0]
+    return sha256_file(file_path)
+
+
+def cache_key(prompt, input_paths, extra=None, input_cache=None):
+    """프롬프트 안의 입력 파일 경로를 내용 해시로 바꿔 결과 캐시 키를 만듦
+
+    작업마다 달라지는 임시 경로 대신 내용이 키에 들어가므로, 같은 파일을 다른 방식
+    (경로/URL/base64)으로 보내도 같은 키가 됩니다.
+    """
+    digests = {path: f"sha256:{content_digest(path, input_cache)}" for path in input_paths if path}
+    normalized = {
+        node_id: {**node, "inputs": {
+            name: digests.get(value, value) if isinstance(value, str) else value
+            for name, value in node["inputs"].items()
+        }}
+        for node_id, node in prompt.items()
+    }
+    payload = json.dumps({"prompt": normalized, **(extra or {})}, sort_keys=True, ensure_ascii=False)
+    return f"result:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def lookup(key):
+    """캐시된 결과 항목 (없으면 None). "path"는 결과 비디오, "upload"는 마지막 버킷 업로드 결과"""
+    if not key or not result_cache.enabled:
+        return None
+    return result_cache.get(key)
+
+
+def reusable_upload(entry):
+    """아직 만료되지 않은 이전 버킷 업로드 결과 (없으면 None)"""
+    upload = entry.get("upload")
+    if upload and time.time() - upload.get("uploaded_at", 0) < UPLOAD_REUSE_SECONDS:
+        return {name: value for name, value in upload.items() if name != "uploaded_at"}
+    return None
+
+
+def store(key, video_path, upload=None):
+    """전달이 끝난 결과 비디오를 캐시에 넣음 (비디오는 옮기므로 이후 원본 경로는 쓰지 않아야 함)"""
+    if not key or not result_cache.enabled:
+        return None
+    meta = {"upload": {**upload, "uploaded_at": time.time()}} if upload else None
+    try:
+        with result_cache.lock(key):
+            return result_cache.put_file(key, video_path, os.path.splitext(video_path)[1], meta)
+    except OSError as e:
+        logger.warning(f"결과를 캐시에 저장하지 못했습니다: {e}")
+        return None
+
+
+def remember_upload(key, entry, upload):
+    """캐시 적중 결과를 다시 업로드했으면 새 URL로 메타데이터만 갱신"""
+    result_cache.put_meta(key, entry["sha256"], entry.get("ext", ""), {"upload": {**upload, "uploaded_at": time.time()}})
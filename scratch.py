@@ -0,0 +1,229 @@
+"""작업별 임시 파일(입력 디코딩, 전처리 결과, ComfyUI 출력) 관리
+
+- 작업 폴더에 쓰일 크기(캐시에 두지 않는 입력, 전처리 결과)를 추정할 수 있고 빠른 경로(기본 /dev/shm)에
+  여유가 있으면 그곳에 작업 폴더를 만들고, 아니면 디스크(SCRATCH_DIR)에 만듭니다.
+- 결과 전달이 끝나면 작업 폴더, ComfyUI가 남긴 출력 파일, ComfyUI history 항목을 지우고
+  회수한 바이트 수를 보고합니다.
+- 작업 폴더 전체가 SCRATCH_QUOTA_GB를 넘으면 실행 중이 아닌 오래된 폴더(실패로 남은 것 등)부터 지웁니다.
+- 재시도 때 이어서 쓰는 폴더(구간 분할 체크포인트)는 작업이 끝나도 남기되 같은 할당량으로 관리합니다.
+
+입력 캐시/결과 캐시 등 DiskCache 안의 파일과 사용자가 경로로 준 파일은 지우지 않습니다.
+"""
+import logging
+import os
+import shutil
+import threading
+
+logger = logging.getLogger(__name__)
+
+SCRATCH_DIR = os.getenv('SCRATCH_DIR', '/tmp/jobs')
+SCRATCH_FAST_DIR = os.getenv('SCRATCH_FAST_DIR', '/dev/shm/jobs')
+# 빠른 경로에 둘 작업 폴더 하나의 최대 크기 (0이면 사용 안 함)
+SCRATCH_FAST_MAX_BYTES = int(float(os.getenv('SCRATCH_FAST_MAX_MB', '1024')) * 1024 ** 2)
+# 빠른 경로(메모리)에 항상 남겨 둘 여유 공간
+SCRATCH_FAST_RESERVE_BYTES = 2 * 1024 ** 3
+SCRATCH_QUOTA_BYTES = int(float(os.getenv('SCRATCH_QUOTA_GB', '20')) * 1024 ** 3)
+# 작업 폴더에 쓰이는 비디오 크기 추정용 픽셀당 바이트 (전처리의 crf 12 ultrafast 인코딩 기준으로 넉넉하게)
+ENCODED_BYTES_PER_PIXEL = 0.5
+# ComfyUI 출력/임시 폴더 (history의 type -> 폴더)
+COMFY_OUTPUT_DIRS = {
+    "output": os.getenv('COMFY_OUTPUT_DIR', '/ComfyUI/output'),
+    "temp": os.getenv('COMFY_TEMP_DIR', '/ComfyUI/temp'),
+}
+# true면 디버깅을 위해 작업 파일을 지우지 않음
+KEEP_JOB_FILES = os.getenv('KEEP_JOB_FILES', 'false').lower() == 'true'
+
+_lock = threading.Lock()
+_active = set()  # 실행 중인 작업 폴더 (할당량 정리에서 제외)
+_fast_reserved = 0  # 실행 중인 작업이 빠른 경로에 잡아 둔 바이트
+
+
+def path_size(path):
+    """파일 또는 폴더 전체의 바이트 수 (없으면 0)"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def enforce_quota(quota_bytes=None):
+    """작업 폴더 전체가 할당량을 넘으면 실행 중이 아닌 오래된 폴더부터 지우고 회수한 바이트를 반환"""
+    quota_bytes = SCRATCH_QUOTA_BYTES if quota_bytes is None else quota_bytes
+    if not quota_bytes:
+        return 0
+    folders = []
+    for base in (SCRATCH_DIR, SCRATCH_FAST_DIR):
+        try:
+            entries = list(os.scandir(base))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                folders.append((entry.stat().st_mtime, entry.path, path_size(entry.path)))
+    total = sum(size for _, _, size in folders)
+    reclaimed = 0
+    with _lock:
+        active = set(_active)
+    for _, path, size in sorted(folders):
+        if total <= quota_bytes:
+            break
+        if path in active:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        reclaimed += size
+    if reclaimed:
+        logger.info(f"🧹 작업 폴더 할당량 정리: {reclaimed} bytes 회수")
+    if total > quota_bytes:
+        logger.warning(f"⚠️ 작업 폴더 용량이 할당량을 넘습니다 ({total} > {quota_bytes} bytes): 실행 중인 작업만 남아 있습니다")
+    return reclaimed
+
+
+def estimate_video_bytes(frames, width, height):
+    """frames개 프레임, width x height로 인코딩된 비디오의 대략적인 크기"""
+    return int(frames * width * height * ENCODED_BYTES_PER_PIXEL)
+
+
+def moved_path(path, old_dir, new_dir):
+    """old_dir 안의 경로를 옮긴 폴더 new_dir 기준으로 바꿈 (다른 경로는 그대로)"""
+    if path and os.path.abspath(path).startswith(old_dir + os.sep):
+        return os.path.join(new_dir, os.path.relpath(os.path.abspath(path), old_dir))
+    return path
+
+
+def _fast_path_fits(expected_bytes):
+    # 쓸 파일이 없으면(입력/전처리가 모두 캐시에 있음) 빠른 경로를 잡아 둘 이유가 없음
+    if not SCRATCH_FAST_MAX_BYTES or not expected_bytes or expected_bytes > SCRATCH_FAST_MAX_BYTES:
+        return False
+    try:
+        os.makedirs(SCRATCH_FAST_DIR, exist_ok=True)
+        usage = shutil.disk_usage(SCRATCH_FAST_DIR)
+    except OSError:
+        return False
+    return usage.free - _fast_reserved - expected_bytes > SCRATCH_FAST_RESERVE_BYTES
+
+
+class JobScratch:
+    """작업 하나의 임시 폴더와 ComfyUI 출력 파일/프롬프트 목록
+
+    처음에는 디스크(SCRATCH_DIR)의 폴더를 쓰며, 입력을 쓰기 전에 stage()로 크기를 알려 주면
+    빠른 경로에 들어갈 때 그쪽으로 옮깁니다. 입력을 받은 뒤 추정치가 바뀌면 stage()를 다시 부릅니다.
+    """
+
+    def __init__(self, task_id):
+        enforce_quota()
+        self.task_id = task_id
+        self.fast = False
+        self.reserved = 0
+        self.dir = os.path.abspath(os.path.join(SCRATCH_DIR, task_id))
+        self.outputs = []
+        self.prompt_ids = []
+        self.checkpoints = []
+        self.cleaned = False
+        with _lock:
+            _active.add(self.dir)
+
+    def stage(self, expected_bytes):
+        """작업 폴더에 쓰일 크기 추정치(모르면 None)로 위치를 정하고 작업 폴더 경로를 반환
+
+        추정치만큼 할당량에 자리를 만들어 두며, 위치가 바뀌면 이미 쓴 파일을 새 폴더로 옮깁니다
+        (이 경우 옛 폴더 안의 경로는 moved_path()로 바꿔 써야 함).
+        """
+        global _fast_reserved
+        if SCRATCH_QUOTA_BYTES and expected_bytes:
+            enforce_quota(max(SCRATCH_QUOTA_BYTES - expected_bytes, 1))
+        with _lock:
+            _fast_reserved -= self.reserved
+            fast = _fast_path_fits(expected_bytes)
+            self.reserved = expected_bytes if fast else 0
+            _fast_reserved += self.reserved
+            if fast == self.fast:
+                return self.dir
+            old_dir = self.dir
+            self.fast = fast
+            self.dir = os.path.abspath(os.path.join(SCRATCH_FAST_DIR if fast else SCRATCH_DIR, self.task_id))
+            _active.add(self.dir)
+        if os.path.isdir(old_dir):
+            os.makedirs(os.path.dirname(self.dir), exist_ok=True)
+            shutil.move(old_dir, self.dir)
+        with _lock:
+            _active.discard(old_dir)
+        logger.info(f"{'⚡' if fast else '💾'} 작업 폴더를 {'빠른 경로' if fast else '디스크'}에 둡니다: "
+                    f"{self.dir} ({expected_bytes} bytes 예상)")
+        return self.dir
+
+    def checkpoint_dir(self, name):
+        """재시도한 작업이 이어서 쓸 수 있도록 cleanup() 뒤에도 남겨 두는 디스크 폴더
+
+        SCRATCH_DIR 바로 아래에 만들므로 할당량 정리 대상이며, 이 작업이 실행 중인 동안에는 지우지 않습니다.
+        """
+        path = os.path.abspath(os.path.join(SCRATCH_DIR, name))
+        os.makedirs(path, exist_ok=True)
+        # 재개한 체크포인트가 오래된 폴더로 먼저 지워지지 않게 함
+        os.utime(path)
+        with _lock:
+            _active.add(path)
+        self.checkpoints.append(path)
+        return path
+
+    def track_history(self, prompt_id, history):
+        """완료된 프롬프트의 history에서 ComfyUI가 남긴 출력 파일을 기록"""
+        self.prompt_ids.append(prompt_id)
+        for node_output in history.get('outputs', {}).values():
+            for items in node_output.values():
+                if not isinstance(items, list):
+                    continue
+                for item in items:
+                    if not isinstance(item, dict):
+                        continue
+                    if item.get('fullpath'):
+                        self.outputs.append(item['fullpath'])
+                        # VHS_VideoCombine은 save_metadata면 첫 프레임 PNG를 같은 이름으로 함께 저장
+                        self.outputs.append(os.path.splitext(item['fullpath'])[0] + ".png")
+                    elif item.get('filename') and item.get('type') in COMFY_OUTPUT_DIRS:
+                        self.outputs.append(os.path.join(
+                            COMFY_OUTPUT_DIRS[item['type']], item.get('subfolder', ''), item['filename']
+                        ))
+
+    def cleanup(self, delete_history=None):
+        """작업 폴더와 출력 파일을 지우고 history 항목을 정리한 뒤 회수한 바이트를 반환
+
+        delete_history(prompt_ids)는 ComfyUI history 항목을 지우는 함수이며, 실패해도 작업 결과에는 영향이 없습니다.
+        """
+        global _fast_reserved
+        if self.cleaned:
+            return 0
+        self.cleaned = True
+        reclaimed = 0
+        if not KEEP_JOB_FILES:
+            for path in self.outputs:
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                    reclaimed += size
+                except OSError:
+                    pass
+            if os.path.isdir(self.dir):
+                size = path_size(self.dir)
+                shutil.rmtree(self.dir, ignore_errors=True)
+                reclaimed += size
+            if delete_history is not None and self.prompt_ids:
+                try:
+                    delete_history(self.prompt_ids)
+                except Exception as e:
+                    logger.warning(f"ComfyUI history를 정리하지 못했습니다: {e}")
+        with _lock:
+            _active.discard(self.dir)
+            _active.difference_update(self.checkpoints)
+            _fast_reserved -= self.reserved
+        return reclaimed
+
+    def summary(self, reclaimed):
+        return {"staging": "fast" if self.fast else "disk", "bytes_reclaimed": reclaimed,
+                "prompts_purged": 0 if KEEP_JOB_FILES else len(self.prompt_ids)}
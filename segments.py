@@ -0,0 +1,340 @@
+"""긴 오디오를 구간별 프롬프트로 나눠 렌더링하고 이어붙이는 파이프라인
+
+1. 오디오의 무음 구간을 ffmpeg silencedetect로 찾고,
+2. WanVideoImageToVideoMultiTalk(192)의 frame_window_size/motion_frame에 맞춰
+   낭비되는 프레임이 가장 적은 무음 지점에서 자르고,
+3. 구간마다 별도 프롬프트로 렌더링(이전 구간의 마지막 프레임을 다음 구간의 시작 이미지로 사용)하고,
+   시작 이미지와 같은 시점인 첫 프레임은 잘라낸 뒤 (그 구간만 다시 인코딩)
+4. concat demuxer(-c copy)로 이어붙입니다.
+
+완료된 구간은 작업 폴더 할당량(scratch.py) 안의 체크포인트 폴더에 기록되어, 같은 작업을 재시도하면
+남은 구간부터 이어갑니다.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import subprocess
+
+from result_cache import content_digest
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SECONDS = float(os.getenv('SEGMENT_SECONDS', '20'))
+# 이 길이(초)를 넘는 오디오는 요청하지 않아도 구간 분할 (0이면 자동 분할 안 함)
+SEGMENT_AUTO_SECONDS = float(os.getenv('SEGMENT_AUTO_SECONDS', '0'))
+SILENCE_NOISE_DB = os.getenv('SEGMENT_SILENCE_DB', '-35')
+SILENCE_MIN_SECONDS = float(os.getenv('SEGMENT_SILENCE_MIN', '0.25'))
+
+_SILENCE_START = re.compile(r"silence_start: (-?[\d.]+)")
+_SILENCE_END = re.compile(r"silence_end: (-?[\d.]+)")
+# find_input_source가 읽는 입력 필드 (체크포인트 키에는 값 대신 내용 해시가 들어감)
+_SOURCE_FIELD = re.compile(r"^(image|video|wav)_(path|url|base64)(_2)?$")
+
+
+def _run(cmd, what):
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"{what} 실패: {result.stderr.strip()[-500:]}")
+    return result
+
+
+# ---------------------------------------------------------------------- #
+# 분석 / 계획
+# ---------------------------------------------------------------------- #
+def detect_silences(audio_path, noise_db=SILENCE_NOISE_DB, min_seconds=SILENCE_MIN_SECONDS):
+    """무음 구간 [(시작, 끝), ...]을 반환"""
+    result = _run([
+        'ffmpeg', '-hide_banner', '-nostats', '-i', audio_path,
+        '-af', f'silencedetect=noise={noise_db}dB:d={min_seconds}', '-f', 'null', '-',
+    ], "무음 구간 분석")
+    silences = []
+    start = None
+    for line in result.stderr.splitlines():
+        match = _SILENCE_START.search(line)
+        if match:
+            start = max(float(match.group(1)), 0.0)
+            continue
+        match = _SILENCE_END.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    return silences
+
+
+def intersect_silences(a, b):
+    """두 트랙이 모두 조용한 구간만 남김 (다중 인물용)"""
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start < end:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def aligned_frames(frames, frame_window_size, motion_frame):
+    """frames를 담는 데 필요한 윈도우 수에 맞춘 실제 렌더링 프레임 수"""
+    stride = frame_window_size - motion_frame
+    windows = max(1, math.ceil(max(frames - motion_frame, 1) / stride))
+    return windows * stride + motion_frame
+
+
+def plan_segments(duration, silences, fps, frame_window_size, motion_frame, target_seconds=SEGMENT_SECONDS):
+    """오디오를 나눌 구간 목록을 계획
+
+    각 구간은 목표 길이의 0.5~1.5배 범위에서 무음 구간 중앙을 자르는 지점 후보로 삼고,
+    렌더링 윈도우(frame_window_size - motion_frame 단위)를 채우지 못해 버려지는
+    프레임이 가장 적은 후보를 고릅니다 (같으면 목표 길이에 가까운 쪽).
+    후보가 없으면 목표 길이에 가장 가까운 윈도우 경계에서 자릅니다.
+    lead_frames는 구간 앞에 더 렌더링했다가 이어붙이기 전에 버리는 프레임 수입니다.
+    """
+    stride = frame_window_size - motion_frame
+    total_frames = math.ceil(duration * fps)
+    target_frames = max(int(target_seconds * fps), frame_window_size)
+    cut_points = [int(round((s + e) / 2 * fps)) for s, e in silences]
+
+    segments = []
+    start = 0
+    while start < total_frames:
+        remaining = total_frames - start
+        if remaining <= target_frames * 1.5:
+            end = total_frames
+        else:
+            low, high = start + target_frames // 2, start + int(target_frames * 1.5)
+            candidates = [c for c in cut_points if low <= c <= high]
+            if candidates:
+                def cost(cut):
+                    frames = cut - start
+                    return (aligned_frames(frames, frame_window_size, motion_frame) - frames,
+                            abs(frames - target_frames))
+                end = min(candidates, key=cost)
+            else:
+                windows = max(1, round((target_frames - motion_frame) / stride))
+                end = start + windows * stride + motion_frame
+        frames = end - start
+        # 두 번째 구간부터는 이전 구간의 마지막 프레임(시작 이미지)부터 한 프레임 앞당겨 렌더링하고 그 프레임을 버림
+        lead_frames = 1 if start > 0 else 0
+        segments.append({
+            "index": len(segments),
+            "start": start / fps,
+            "duration": frames / fps,
+            "start_frame": start,
+            "frames": frames,
+            "lead_frames": lead_frames,
+            "max_frame": aligned_frames(frames + lead_frames, frame_window_size, motion_frame),
+        })
+        start = end
+    return segments
+
+
+def plan_job(media_path, is_video, wav_path, wav_path_2, duration, frame_window_size, motion_frame,
+             target_seconds=SEGMENT_SECONDS, max_frames=None):
+    """작업 하나의 구간 계획 {"fps", "source_frames", "segments"} (GPU 작업 전에 비용 추정에도 사용)
+
+    V2V는 원본 비디오의 프레임레이트로 자르며, 다중 인물은 두 트랙이 모두 조용한 지점에서만 자릅니다.
+    max_frames를 주면 구간 하나의 max_frame이 그 안에 들어가도록 목표 길이를 줄입니다.
+    """
+    fps, source_frames = probe_video(media_path) if is_video else (25, None)
+    if max_frames:
+        # plan_segments는 목표 길이의 1.5배까지 구간을 늘릴 수 있으므로 그만큼 줄여 잡음
+        target_seconds = min(target_seconds, (max_frames - motion_frame) / fps / 1.5)
+    silences = detect_silences(wav_path)
+    if wav_path_2 and wav_path_2 != wav_path:
+        silences = intersect_silences(silences, detect_silences(wav_path_2))
+    return {
+        "fps": fps,
+        "source_frames": source_frames,
+        "segments": plan_segments(duration, silences, fps, frame_window_size, motion_frame, target_seconds),
+    }
+
+
+# ---------------------------------------------------------------------- #
+# 미디어 처리
+# ---------------------------------------------------------------------- #
+def probe_video(video_path):
+    """비디오의 (프레임레이트, 프레임 수) (ffprobe, 디코딩 없이 패킷 수로 셈)"""
+    result = _run([
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0', '-count_packets',
+        '-show_entries', 'stream=avg_frame_rate,nb_read_packets', '-of', 'json', video_path,
+    ], "프레임레이트 확인")
+    stream = json.loads(result.stdout)["streams"][0]
+    num, _, den = stream["avg_frame_rate"].partition('/')
+    return float(num) / float(den or 1), int(stream["nb_read_packets"])
+
+
+def cut_audio(audio_path, start, duration, output_path):
+    """오디오 구간을 WAV로 잘라냄 (샘플 단위로 정확)"""
+    _run([
+        'ffmpeg', '-hide_banner', '-y', '-i', audio_path, '-ss', f'{start:.6f}', '-t', f'{duration:.6f}',
+        '-c:a', 'pcm_s16le', output_path,
+    ], "오디오 자르기")
+    return output_path
+
+
+def extract_last_frame(video_path, output_path):
+    """비디오의 마지막 프레임을 이미지로 저장"""
+    _run([
+        'ffmpeg', '-hide_banner', '-y', '-sseof', '-1', '-i', video_path,
+        '-update', '1', '-q:v', '1', output_path,
+    ], "마지막 프레임 추출")
+    return output_path
+
+
+# VHS_VideoCombine 출력 형식 -> ffmpeg 비디오 인코더
+_ENCODERS = {"video/h264-mp4": "libx264", "video/h265-mp4": "libx265"}
+
+
+def encoder_args(output_inputs):
+    """VHS_VideoCombine(131) 입력과 같은 설정으로 다시 인코딩하는 ffmpeg 인자"""
+    return [
+        '-c:v', _ENCODERS.get(output_inputs.get("format"), "libx264"),
+        '-crf', str(output_inputs.get("crf", 19)), '-pix_fmt', output_inputs.get("pix_fmt", "yuv420p"),
+    ]
+
+
+def drop_lead_frames(video_path, frames, fps, output_path, video_args):
+    """앞쪽 프레임과 같은 길이의 오디오를 잘라냄 (잘린 지점이 키프레임이 아니므로 다시 인코딩)"""
+    _run([
+        'ffmpeg', '-hide_banner', '-y', '-i', video_path, '-ss', f'{frames / fps:.6f}', '-map', '0',
+        *video_args, '-c:a', 'aac', '-b:a', '192k', '-movflags', '+faststart', output_path,
+    ], "구간 앞 프레임 잘라내기")
+    return output_path
+
+
+def concat_videos(video_paths, output_path):
+    """구간 MP4들을 재인코딩 없이 이어붙임"""
+    list_path = f"{output_path}.txt"
+    with open(list_path, 'w') as f:
+        for path in video_paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+    try:
+        _run([
+            'ffmpeg', '-hide_banner', '-y', '-f', 'concat', '-safe', '0', '-i', list_path,
+            '-c', 'copy', '-movflags', '+faststart', output_path,
+        ], "구간 비디오 이어붙이기")
+    finally:
+        os.remove(list_path)
+    return output_path
+
+
+# ---------------------------------------------------------------------- #
+# 체크포인트 / 실행
+# ---------------------------------------------------------------------- #
+def checkpoint_key(job_input, input_paths, input_cache=None):
+    """같은 작업의 재시도를 식별하는 키
+
+    입력 파일(path/url/base64 필드)은 받아 둔 파일의 내용 해시로, 나머지 설정은 값 그대로 넣습니다.
+    """
+    payload = {k: v for k, v in job_input.items() if not k.startswith("callback") and not _SOURCE_FIELD.match(k)}
+    payload["inputs"] = [content_digest(path, input_cache) if path else None for path in input_paths]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:32]
+
+
+def clamp_skip_frames(start_frame, frames, source_frames):
+    """원본 비디오가 오디오보다 짧을 때 구간이 원본 끝을 넘어 읽지 않도록 건너뛸 프레임 수를 줄임"""
+    if source_frames is None:
+        return start_frame
+    return max(0, min(start_frame, source_frames - frames))
+
+
+def should_segment(job_input, duration):
+    """요청 또는 오디오 길이에 따라 구간 분할 여부 결정"""
+    if "segmented" in job_input:
+        return bool(job_input["segmented"])
+    return SEGMENT_AUTO_SECONDS > 0 and duration is not None and duration > SEGMENT_AUTO_SECONDS
+
+
+def render_segmented(job_state, render_segment):
+    """오디오를 구간별로 렌더링하고 이어붙인 최종 MP4 경로를 반환
+
+    render_segment(params)는 템플릿 파라미터 딕셔너리(V2V는 시작 이미지 "start_image" 포함)를 받아
+    ComfyUI에서 렌더링한 MP4 경로를 반환하는 함수입니다. 구간은 준비 단계에서 세운 job_state["segment_plan"]
+    (plan_job의 결과)대로 나눕니다. 완료된 구간은 job_state["scratch"]의 체크포인트 폴더에 복사해 두므로
+    재시도 시에는 남은 구간만 렌더링합니다.
+    """
+    is_video = job_state["input_type"] == "video"
+    wav_path = job_state["wav_path"]
+    wav_path_2 = job_state.get("wav_path_2")
+    fps = job_state["segment_plan"]["fps"]
+    source_frames = job_state["segment_plan"]["source_frames"]
+    video_args = encoder_args(job_state["prompt"]["131"]["inputs"])
+
+    checkpoint_dir = job_state["scratch"].checkpoint_dir(f"segments-{job_state['checkpoint_key']}")
+    manifest_path = os.path.join(checkpoint_dir, "manifest.json")
+    segments = job_state["segment_plan"]["segments"]
+    manifest = {"segments": segments, "done": {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            saved = json.load(f)
+        # 비용 상한이 바뀌어 구간 계획이 달라졌으면 처음부터 렌더링
+        if saved["segments"] == segments:
+            manifest = saved
+            logger.info(f"♻️ 구간 체크포인트에서 재개합니다: {len(manifest['done'])}/{len(segments)} 완료")
+    lengths = ", ".join(f"{segment['duration']:.1f}s" for segment in segments)
+    logger.info(f"🎞️ 구간 분할 렌더링: {len(segments)}개 구간 ({lengths})")
+
+    # I2V는 입력 이미지, V2V는 원본 비디오의 첫 프레임(워크플로우 기본값)에서 시작
+    start_image = None if is_video else job_state["media_path"]
+    for segment in segments:
+        index = str(segment["index"])
+        segment_video = os.path.join(checkpoint_dir, f"segment_{segment['index']:04d}.mp4")
+        if index in manifest["done"] and os.path.exists(segment_video):
+            logger.info(f"⏭️ 구간 {index} 체크포인트 사용")
+        else:
+            segment_dir = os.path.join(checkpoint_dir, f"work_{segment['index']:04d}")
+            os.makedirs(segment_dir, exist_ok=True)
+            # 앞당겨 렌더링하는 프레임만큼 오디오도 앞에서부터 자름
+            lead = segment.get("lead_frames", 0)
+            audio_start = (segment["start_frame"] - lead) / fps
+            audio_duration = (segment["frames"] + lead) / fps
+            params = {
+                "audio": cut_audio(wav_path, audio_start, audio_duration, os.path.join(segment_dir, "audio.wav")),
+                "max_frame": segment["max_frame"],
+            }
+            if wav_path_2:
+                params["audio_2"] = (params["audio"] if wav_path_2 == wav_path else
+                                     cut_audio(wav_path_2, audio_start, audio_duration,
+                                               os.path.join(segment_dir, "audio_2.wav")))
+            if is_video:
+                # 원본 비디오는 그대로 두고 VHS_LoadVideo에서 해당 프레임 범위만 읽음
+                first_frame = segment["start_frame"] - lead
+                params["skip_frames"] = clamp_skip_frames(first_frame, segment["max_frame"], source_frames)
+                params["frame_cap"] = segment["max_frame"]
+                if params["skip_frames"] != first_frame:
+                    logger.warning(f"원본 비디오({source_frames}프레임)가 짧아 구간 {index}은 "
+                                   f"{params['skip_frames']}번째 프레임부터 읽습니다.")
+                if start_image is not None:
+                    params["start_image"] = start_image
+            else:
+                params["media"] = start_image
+
+            logger.info(f"▶️ 구간 {index} 렌더링: {segment['start']:.2f}s + {segment['duration']:.2f}s "
+                        f"(max_frame={segment['max_frame']})")
+            rendered = render_segment(params)
+            if lead:
+                # 첫 프레임은 이전 구간의 마지막 프레임과 같은 시점이므로 버려 이음매에서 프레임이 반복되지 않게 함
+                drop_lead_frames(rendered, lead, fps, segment_video, video_args)
+            else:
+                shutil.copyfile(rendered, segment_video)
+            shutil.rmtree(segment_dir, ignore_errors=True)
+            manifest["done"][index] = os.path.basename(segment_video)
+            with open(f"{manifest_path}.tmp", 'w') as f:
+                json.dump(manifest, f)
+            os.replace(f"{manifest_path}.tmp", manifest_path)
+
+        if segment is not segments[-1]:
+            # 다음 구간은 이 구간의 마지막 프레임에서 시작해 이어지도록 함
+            start_image = extract_last_frame(segment_video, os.path.join(checkpoint_dir, f"last_{index}.png"))
+
+    output_path = os.path.join(checkpoint_dir, "segmented_output.mp4")
+    concat_videos([os.path.join(checkpoint_dir, manifest["done"][str(s["index"])]) for s in segments], output_path)
+    return output_path, checkpoint_dir
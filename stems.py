@@ -0,0 +1,148 @@
+"""MelBandRoFormer로 분리한 보컬 스템 캐시
+
+모든 워크플로우는 오디오를 MelBandRoFormerSampler(302/306, V2V는 304/314)로 보컬만 분리한 뒤
+MultiTalkWav2VecEmbeds(194)에 넣습니다. 같은 오디오를 다시 쓰는 작업(재시도 포함)이 분리를
+반복하지 않도록, 처음 실행할 때 분리 결과를 SaveAudio로 함께 저장해 두었다가 다음 작업에서는
+LoadAudio로 캐시된 스템을 194에 바로 연결하고 분리 노드를 그래프에서 제거합니다.
+
+audio_is_clean=true인 작업은 이미 보컬만 있는 오디오로 보고 분리 없이 원본을 연결합니다.
+다중 인물 작업에서 두 화자의 오디오가 같으면 로드/분리를 한 번만 하고 194의 두 입력에 나눠 연결합니다.
+"""
+import logging
+import os
+
+from disk_cache import DiskCache
+from result_cache import content_digest
+from workflows import is_link, prune_unreachable
+
+logger = logging.getLogger(__name__)
+
+# STEM_CACHE_MAX_GB=0이면 사용 안 함
+stem_cache = DiskCache(
+    os.getenv('STEM_CACHE_DIR', '/tmp/stem_cache'),
+    int(float(os.getenv('STEM_CACHE_MAX_GB', '2')) * 1024 ** 3),
+)
+
+EMBEDS_NODE_ID = "194"
+SEPARATOR_CLASS = "MelBandRoFormerSampler"
+# 캐시된 스템을 읽는 LoadAudio / 분리 결과를 저장하는 SaveAudio 노드 ID (화자 순서대로)
+STEM_LOAD_NODE_IDS = {"audio_1": "901", "audio_2": "902"}
+STEM_SAVE_NODE_IDS = {"audio_1": "903", "audio_2": "904"}
+
+
+def separators(prompt):
+    """194의 화자 입력 -> 그 입력을 만드는 분리 노드 ID"""
+    found = {}
+    for input_name in STEM_LOAD_NODE_IDS:
+        value = prompt[EMBEDS_NODE_ID]["inputs"].get(input_name)
+        if is_link(value) and prompt[value[0]]["class_type"] == SEPARATOR_CLASS:
+            found[input_name] = value[0]
+    return found
+
+
+def same_audio(path_a, path_b, input_cache=None):
+    """두 오디오 파일의 내용이 같은지 (크기가 다르면 해시를 계산하지 않음)"""
+    if path_a == path_b:
+        return True
+    try:
+        if os.path.getsize(path_a) != os.path.getsize(path_b):
+            return False
+        return content_digest(path_a, input_cache) == content_digest(path_b, input_cache)
+    except OSError:
+        return False
+
+
+def share_speaker_audio(prompt):
+    """194의 audio_2가 audio_1과 같은 출력을 쓰게 하고, 두 번째 화자용 로드/분리 노드를 제거"""
+    embeds_inputs = prompt[EMBEDS_NODE_ID]["inputs"]
+    if "audio_2" not in embeds_inputs:
+        return prompt
+    embeds_inputs["audio_2"] = embeds_inputs["audio_1"]
+    return prune_unreachable(prompt)
+
+
+def stem_key(prompt, separator_id, audio_path, input_cache=None):
+    """오디오 내용과 분리 모델 이름으로 정해지는 스템 캐시 키"""
+    loader_id = prompt[separator_id]["inputs"]["model"][0]
+    model_name = prompt[loader_id]["inputs"].get("model_name")
+    return f"stem:{model_name}:{content_digest(audio_path, input_cache)}"
+
+
+def apply_stems(prompt, audio_paths, audio_is_clean=False, input_cache=None):
+    """캐시된 스템 / 깨끗한 오디오로 분리 노드를 건너뛰도록 프롬프트를 고침
+
+    audio_paths는 194의 화자 입력 이름 -> 그 화자의 오디오 파일 경로입니다.
+    두 화자의 경로가 같으면 먼저 share_speaker_audio()로 하나의 분리 결과를 함께 쓰게 합니다.
+    (바뀐 프롬프트, {SaveAudio 노드 ID: 스템 키})를 반환하며, 두 번째 값은 실행 후
+    store_stems()로 캐시에 넣을 분리 결과입니다.
+    """
+    if audio_paths.get("audio_2") and audio_paths.get("audio_2") == audio_paths.get("audio_1"):
+        prompt = share_speaker_audio(prompt)
+    found = separators(prompt)
+    if not found:
+        return prompt, {}
+    embeds_inputs = prompt[EMBEDS_NODE_ID]["inputs"]
+    pending = {}  # SaveAudio 노드 ID -> (스템 키, 분리 노드 ID)
+    rewired = {}  # 분리 노드 ID -> 대신 연결한 출력 (여러 입력이 같은 분리 노드를 쓰는 경우)
+    for input_name, separator_id in found.items():
+        audio_path = audio_paths.get(input_name)
+        if separator_id in rewired:
+            embeds_inputs[input_name] = rewired[separator_id]
+            continue
+        if audio_is_clean:
+            # 분리 노드가 받던 LoadAudio 출력을 194에 그대로 연결
+            embeds_inputs[input_name] = rewired[separator_id] = prompt[separator_id]["inputs"]["audio"]
+            continue
+        if not stem_cache.enabled or not audio_path:
+            continue
+        key = stem_key(prompt, separator_id, audio_path, input_cache)
+        entry = stem_cache.get(key)
+        if entry is not None:
+            logger.info(f"♻️ 보컬 스템 캐시 적중 ({input_name}): {entry['path']}")
+            load_id = STEM_LOAD_NODE_IDS[input_name]
+            prompt[load_id] = {
+                "inputs": {"audio": entry["path"], "audioUI": ""},
+                "class_type": "LoadAudio",
+                "_meta": {"title": f"Cached vocal stem ({input_name})"},
+            }
+            embeds_inputs[input_name] = rewired[separator_id] = [load_id, 0]
+        else:
+            pending[STEM_SAVE_NODE_IDS[input_name]] = (key, separator_id)
+            rewired[separator_id] = embeds_inputs[input_name]
+
+    # 더 이상 쓰이지 않는 분리 노드/모델 로더 제거 (SaveAudio는 그 뒤에 추가)
+    prompt = prune_unreachable(prompt)
+    saves = {}
+    for save_id, (key, separator_id) in pending.items():
+        if separator_id not in prompt:
+            continue
+        prompt[save_id] = {
+            "inputs": {"audio": [separator_id, 0], "filename_prefix": f"stem_{save_id}"},
+            "class_type": "SaveAudio",
+            "_meta": {"title": "Save vocal stem"},
+        }
+        saves[save_id] = key
+    return prompt, saves
+
+
+def store_stems(history, saves, fetch_output):
+    """실행이 끝난 프롬프트의 SaveAudio 출력을 스템 캐시에 넣음
+
+    fetch_output(filename, subfolder, folder_type)은 ComfyUI /view로 파일 내용을 받는 함수입니다.
+    스템 저장 실패는 작업 결과에 영향을 주지 않도록 경고만 남깁니다.
+    """
+    for save_id, key in (saves or {}).items():
+        temp_path = None
+        try:
+            audio = history["outputs"][save_id]["audio"][0]
+            ext = os.path.splitext(audio["filename"])[1]
+            temp_path = stem_cache.make_temp_path(ext)
+            with open(temp_path, 'wb') as f:
+                f.write(fetch_output(audio["filename"], audio.get("subfolder", ""), audio.get("type", "output")))
+            with stem_cache.lock(key):
+                path = stem_cache.put_file(key, temp_path, ext)
+            logger.info(f"💾 보컬 스템 캐시 저장: {path}")
+        except Exception as e:
+            logger.warning(f"보컬 스템을 캐시에 저장하지 못했습니다 ({save_id}): {e}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
@@ -0,0 +1,65 @@
+"""테스트 공용 설정: GPU 없이 핸들러를 돌리기 위한 ComfyUI 대역 서버와 handler 모듈
+
+모듈들은 import 시점에 환경 변수를 읽으므로, 테스트 모듈이 import 되기 전에 워크플로우 폴더는
+저장소 루트로, 캐시/작업 폴더는 임시 경로로 돌려 둡니다. handler는 대역 서버를 띄운 뒤에 한 번만
+import 합니다.
+"""
+import importlib
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLES_DIR = os.path.join(ROOT, "examples")
+WORK_DIR = tempfile.mkdtemp(prefix="infinitetalk_tests_")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+os.environ.update({
+    "WORKFLOW_DIR": ROOT,
+    "WARMUP_TEMPLATES": "none",
+    "WARMUP_EXAMPLES_DIR": EXAMPLES_DIR,
+    "INPUT_CACHE_DIR": os.path.join(WORK_DIR, "input_cache"),
+    "RESULT_CACHE_MAX_GB": "0",
+    "IMAGE_PREP_CACHE_DIR": os.path.join(WORK_DIR, "image_prep_cache"),
+    "VIDEO_PREP_CACHE_DIR": os.path.join(WORK_DIR, "video_prep_cache"),
+    "STEM_CACHE_DIR": os.path.join(WORK_DIR, "stem_cache"),
+    "COST_CALIBRATION_PATH": os.path.join(WORK_DIR, "cost_calibration.json"),
+    "SCRATCH_DIR": os.path.join(WORK_DIR, "jobs"),
+    "SCRATCH_FAST_DIR": os.path.join(WORK_DIR, "jobs_fast"),
+    "COMFY_OUTPUT_DIR": os.path.join(WORK_DIR, "output"),
+})
+
+from fake_comfyui import FakeComfyUI  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def fake_comfy():
+    fake = FakeComfyUI(os.environ["COMFY_OUTPUT_DIR"], node_delay=0.01, output_size=4096)
+    _, port = fake.start(port=0)
+    fake.port = port
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture(scope="session")
+def handler(fake_comfy):
+    """대역 서버에 연결된 handler 모듈 (결과 캐시와 웜업은 끔)"""
+    os.environ.update({"SERVER_ADDRESS": "127.0.0.1", "COMFY_PORT": str(fake_comfy.port)})
+    module = importlib.import_module("handler")
+    module.comfy.wait_until_ready()
+    return module
+
+
+def image_job(job_id, prompt="A person talking naturally", person_count="single"):
+    """예제 에셋을 쓰는 작은 I2V 작업"""
+    return {"id": job_id, "input": {
+        "image_path": os.path.join(EXAMPLES_DIR, "image.jpg"),
+        "wav_path": os.path.join(EXAMPLES_DIR, "audio.mp3"),
+        "prompt": prompt,
+        "person_count": person_count,
+        "width": 256,
+        "height": 256,
+    }}
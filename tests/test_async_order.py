@@ -0,0 +1,32 @@
+"""HANDLER_MODE=async: 동시에 들어온 작업의 제출 순서와 겹쳐 실행되는지 확인"""
+import asyncio
+import time
+
+from conftest import image_job
+
+JOBS = 4
+
+
+def test_concurrent_jobs_keep_submission_order_and_overlap(handler, fake_comfy, monkeypatch):
+    prepare_job = handler.prepare_job
+
+    def slow_prepare(job_input, task_id, metrics):
+        # 먼저 도착한 작업일수록 입력 준비가 늦게 끝나게 해 도착 순서를 지키는지 확인
+        time.sleep(0.1 * (JOBS - int(job_input["prompt"].split()[-1])))
+        return prepare_job(job_input, task_id, metrics)
+
+    monkeypatch.setattr(handler, "prepare_job", slow_prepare)
+    jobs = [image_job(f"async_{index}", prompt=f"job {index}") for index in range(JOBS)]
+    submitted_before = len(fake_comfy.submitted)
+
+    async def run_all():
+        return await asyncio.gather(*(handler.handler_async(job) for job in jobs))
+
+    results = asyncio.run(run_all())
+
+    assert all("video" in result for result in results), results
+    submitted = fake_comfy.submitted[submitted_before:]
+    prompts = [prompt["241"]["inputs"]["positive_prompt"] for _, prompt, _ in submitted]
+    assert prompts == [f"job {index}" for index in range(JOBS)]
+    # 첫 작업 뒤의 작업은 앞 작업이 ComfyUI에서 실행 중이거나 대기 중일 때 제출됨
+    assert all(busy for _, _, busy in submitted[1:])
@@ -0,0 +1,143 @@
+"""헤더만 읽어 구한 오디오 길이를 직접 만든 작은 파일의 실제 길이와 비교"""
+import struct
+import subprocess
+import sys
+import wave
+
+import pytest
+
+import audio_probe
+from conftest import ROOT
+
+
+def write_wav(path, seconds, rate=16000):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(b"\0\0" * int(seconds * rate))
+    return path
+
+
+def chunk(chunk_id, body, size=None):
+    return chunk_id + struct.pack("<I", len(body) if size is None else size) + body + b"\0" * (len(body) & 1)
+
+
+def write_rf64(path, seconds, rate=16000):
+    """data 크기를 ds64 청크에만 기록한 RF64"""
+    samples = b"\0\0" * int(seconds * rate)
+    fmt = struct.pack("<HHIIHH", 1, 1, rate, rate * 2, 2, 16)
+    ds64 = struct.pack("<QQQI", 0, len(samples), len(samples) // 2, 0)
+    body = b"WAVE" + chunk(b"ds64", ds64) + chunk(b"fmt ", fmt) + chunk(b"data", samples, size=0xFFFFFFFF)
+    path.write_bytes(b"RF64" + struct.pack("<I", 0xFFFFFFFF) + body)
+    return path
+
+
+def id3v2(size=20):
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x03\x00\x00" + syncsafe + b"\0" * size
+
+
+# MPEG-1 Layer III, 128kbps, 44.1kHz, 스테레오: 1152샘플, 417바이트 프레임
+MPEG1_HEADER = b"\xff\xfb\x90\x00"
+MPEG1_FRAME = 417
+# MPEG-2 Layer III, 64kbps, 22.05kHz, 모노: 576샘플, 208바이트 프레임
+MPEG2_HEADER = b"\xff\xf3\x80\xc0"
+MPEG2_FRAME = 208
+
+
+def mp3_frames(header, frame_length, count, first=b""):
+    frame = header + b"\0" * (frame_length - len(header))
+    first_frame = (header + first + frame[len(header) + len(first):]) if first else frame
+    return first_frame + frame * (count - 1)
+
+
+def test_wav(tmp_path):
+    assert audio_probe.probe_duration(str(write_wav(tmp_path / "a.wav", 1.5))) == pytest.approx(1.5)
+
+
+def test_streamed_wav_without_data_size(tmp_path):
+    path = write_wav(tmp_path / "stream.wav", 2.0)
+    data = bytearray(path.read_bytes())
+    data[40:44] = struct.pack("<I", 0)  # 스트리밍 녹음처럼 data 크기를 비워 둠
+    path.write_bytes(bytes(data))
+    assert audio_probe.probe_duration(str(path)) == pytest.approx(2.0)
+
+
+def test_rf64(tmp_path):
+    assert audio_probe.probe_duration(str(write_rf64(tmp_path / "a.wav", 1.25))) == pytest.approx(1.25)
+
+
+def test_mp3_frame_scan(tmp_path):
+    path = tmp_path / "scan.mp3"
+    path.write_bytes(id3v2() + mp3_frames(MPEG1_HEADER, MPEG1_FRAME, 100) + b"TAG" + b"\0" * 125)
+    assert audio_probe.probe_duration(str(path)) == pytest.approx(100 * 1152 / 44100)
+
+
+def test_mpeg2_mono_frame_scan(tmp_path):
+    path = tmp_path / "mpeg2.mp3"
+    path.write_bytes(mp3_frames(MPEG2_HEADER, MPEG2_FRAME, 50))
+    assert audio_probe.probe_duration(str(path)) == pytest.approx(50 * 576 / 22050)
+
+
+def test_mp3_xing_frame_count(tmp_path):
+    # Xing 태그는 사이드 정보(스테레오 MPEG-1은 32바이트) 뒤에 있고, 실제 프레임을 훑지 않고 기록된 수를 씀
+    xing = b"\0" * 32 + b"Xing" + struct.pack(">II", 1, 2000)
+    path = tmp_path / "xing.mp3"
+    path.write_bytes(mp3_frames(MPEG1_HEADER, MPEG1_FRAME, 5, first=xing))
+    assert audio_probe.probe_duration(str(path)) == pytest.approx(2000 * 1152 / 44100)
+
+
+def test_mp3_vbri_frame_count(tmp_path):
+    vbri = b"\0" * 32 + b"VBRI" + struct.pack(">HHHII", 1, 0, 75, 0, 1500)
+    path = tmp_path / "vbri.mp3"
+    path.write_bytes(mp3_frames(MPEG1_HEADER, MPEG1_FRAME, 5, first=vbri))
+    assert audio_probe.probe_duration(str(path)) == pytest.approx(1500 * 1152 / 44100)
+
+
+def flac_streaminfo(rate, total_samples, channels=2, bits=16):
+    packed = (rate << 44) | ((channels - 1) << 41) | ((bits - 1) << 36) | total_samples
+    return struct.pack(">HH", 4096, 4096) + b"\0" * 6 + packed.to_bytes(8, "big") + b"\0" * 16
+
+
+def test_flac(tmp_path):
+    path = tmp_path / "a.flac"
+    path.write_bytes(b"fLaC" + b"\x80\x00\x00\x22" + flac_streaminfo(48000, 48000 * 3 + 24000) + b"\0" * 64)
+    assert audio_probe.probe_duration(str(path)) == pytest.approx(3.5)
+
+
+def ogg_page(packet, granule, header_type=0, sequence=0):
+    return (b"OggS" + struct.pack("<BBqIIIB", 0, header_type, granule, 1, sequence, 0, 1)
+            + bytes([len(packet)]) + packet)
+
+
+def test_ogg_vorbis(tmp_path):
+    ident = b"\x01vorbis" + struct.pack("<IBIiii", 0, 2, 44100, 0, 128000, 0) + b"\xb8\x01"
+    path = tmp_path / "a.ogg"
+    path.write_bytes(ogg_page(ident, 0, header_type=2) + ogg_page(b"\0" * 100, 44100 * 2, sequence=1)
+                     + ogg_page(b"\0" * 50, 44100 * 4 + 22050, header_type=4, sequence=2))
+    assert audio_probe.probe_duration(str(path)) == pytest.approx(4.5)
+
+
+def test_ogg_opus_uses_48k_granules_minus_pre_skip(tmp_path):
+    head = b"OpusHead" + struct.pack("<BBHIhB", 1, 1, 312, 16000, 0, 0)
+    path = tmp_path / "a.opus"
+    path.write_bytes(ogg_page(head, 0, header_type=2) + ogg_page(b"\0" * 60, 48000 * 2 + 312, header_type=4, sequence=1))
+    assert audio_probe.probe_duration(str(path)) == pytest.approx(2.0)
+
+
+def test_unknown_format_falls_back_to_decoder(tmp_path, monkeypatch):
+    path = tmp_path / "a.m4a"
+    path.write_bytes(b"\0\0\0\x20ftypM4A " + b"\0" * 100)
+    monkeypatch.setattr(audio_probe, "decode_duration", lambda audio_path: 7.0)
+    with pytest.raises(audio_probe.UnsupportedFormat):
+        audio_probe.probe_duration(str(path))
+    assert audio_probe.get_duration(str(path)) == 7.0
+
+
+def test_librosa_is_not_imported_until_needed(tmp_path):
+    wav = write_wav(tmp_path / "a.wav", 0.5)
+    code = ("import sys, audio_probe; audio_probe.get_duration(sys.argv[1]); "
+            "print('librosa' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", code, str(wav)], cwd=ROOT, capture_output=True, text=True)
+    assert result.stdout.strip() == "False", result.stderr
@@ -0,0 +1,52 @@
+"""Base64 입력: 청크 단위 디코딩, 크기 제한, 로그 요약"""
+import base64
+import hashlib
+import os
+
+import pytest
+
+DATA = os.urandom(1000)
+ENCODED = base64.b64encode(DATA).decode()
+
+
+@pytest.mark.parametrize("encoded", [
+    ENCODED,
+    "data:image/png;base64," + ENCODED,
+    "\n".join(ENCODED[i:i + 76] for i in range(0, len(ENCODED), 76)),
+    ENCODED.rstrip("="),
+])
+@pytest.mark.parametrize("chunk_chars", [7, 64, 1 << 20])
+def test_chunked_decode_matches_one_shot_decode(handler, tmp_path, encoded, chunk_chars):
+    path = tmp_path / "out.bin"
+    assert handler.decode_base64_to_file(encoded, str(path), chunk_chars=chunk_chars) == len(DATA)
+    assert path.read_bytes() == DATA
+
+
+def test_invalid_characters_are_rejected_and_leave_no_file(handler, tmp_path):
+    with pytest.raises(Exception, match="Base64"):
+        handler.save_base64_to_file(ENCODED[:100] + "*" + ENCODED[100:], str(tmp_path), "bad.png")
+    assert not (tmp_path / "bad.png").exists()
+
+
+def test_oversized_payload_is_rejected_before_decoding(handler, monkeypatch, tmp_path):
+    monkeypatch.setattr(handler, "MAX_BASE64_BYTES", 500)
+    with pytest.raises(Exception, match="MAX_BASE64_MB"):
+        handler.save_base64_to_file(ENCODED, str(tmp_path), "big.png")
+    assert not (tmp_path / "big.png").exists()
+    # data URI 접두어는 크기 추정에서 빠짐
+    monkeypatch.setattr(handler, "MAX_BASE64_BYTES", len(DATA))
+    handler.check_base64_size("data:audio/wav;base64," + ENCODED)
+
+
+def test_chunked_hash_matches_whole_hash(handler):
+    assert handler.base64_sha256(ENCODED, chunk_chars=5) == hashlib.sha256(ENCODED.encode()).hexdigest()
+
+
+def test_log_summary_replaces_long_strings(handler):
+    job_input = {"image_base64": ENCODED, "prompt": "hello", "batch": [{"wav_base64": ENCODED}], "width": 512}
+    summary = handler.summarize_for_log(job_input)
+
+    assert summary["prompt"] == "hello" and summary["width"] == 512
+    assert summary["image_base64"].startswith(f"<{len(ENCODED)} chars sha256=")
+    assert len(summary["batch"][0]["wav_base64"]) < 100
+    assert job_input["image_base64"] == ENCODED
@@ -0,0 +1,76 @@
+"""handler_callback의 디스크 큐: gzip 선택과 전송 스레드가 기록 오류에도 살아남는지 확인"""
+import gzip
+import importlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class _Receiver(BaseHTTPRequestHandler):
+    statuses = []
+    received = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        status = self.statuses.pop(0) if self.statuses else 200
+        self.received.append((status, self.headers.get("Content-Encoding"), json.loads(body)))
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+@pytest.fixture
+def receiver():
+    _Receiver.statuses, _Receiver.received = [], []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Receiver)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/cb", _Receiver
+    server.shutdown()
+
+
+@pytest.fixture
+def outbox(handler, tmp_path, monkeypatch):
+    module = importlib.import_module("handler_callback")
+    monkeypatch.setattr(module, "CALLBACK_BACKOFF_BASE", 0.05)
+    return module, module.CallbackOutbox(str(tmp_path / "outbox"))
+
+
+def test_gzip_is_opt_in(outbox, receiver):
+    module, box = outbox
+    url, server = receiver
+    assert module.CALLBACK_GZIP is False
+
+    box.put(url, {"n": 1})
+    box.put(url, {"n": 2}, compress=True)
+
+    assert box.wait_idle(10)
+    assert [(encoding, body["n"]) for _, encoding, body in server.received] == [(None, 1), ("gzip", 2)]
+
+
+def test_sender_survives_meta_write_errors(outbox, receiver, monkeypatch):
+    module, box = outbox
+    url, server = receiver
+    server.statuses = [503]
+    write_meta = box._write_meta
+    failures = []
+
+    def flaky_write_meta(entry_id, meta):
+        if meta["attempts"] == 1 and not failures:
+            failures.append(entry_id)
+            raise OSError("No space left on device")
+        write_meta(entry_id, meta)
+
+    monkeypatch.setattr(box, "_write_meta", flaky_write_meta)
+    box.put(url, {"n": 1})
+
+    assert box.wait_idle(10)
+    assert failures
+    assert [status for status, _, _ in server.received] == [503, 200]
+    assert box._thread.is_alive()
@@ -0,0 +1,110 @@
+"""공유 ComfyUI 클라이언트: keep-alive 연결 재사용과 prompt_id별 메시지 분배"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from comfy_client import ComfyUIClient
+
+
+class _ComfyHTTP(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    peers = []
+    reject_prompts = False
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.peers.append(self.client_address)
+        if self.path.startswith("/history/"):
+            prompt_id = self.path.rsplit("/", 1)[1]
+            self._reply(200, {prompt_id: {"outputs": {}, "status": {"status_str": "success"}}})
+        else:
+            self._reply(200, {})
+
+    def do_POST(self):
+        self.peers.append(self.client_address)
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.reject_prompts:
+            self._reply(400, {"error": "invalid prompt"})
+        else:
+            self._reply(200, {"prompt_id": payload["prompt_id"], "number": 0})
+
+
+@pytest.fixture
+def client():
+    _ComfyHTTP.peers, _ComfyHTTP.reject_prompts = [], False
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ComfyHTTP)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield ComfyUIClient("127.0.0.1", "test-client", port=server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def send_later(client, *messages, delay=0.05):
+    """웹소켓 수신 스레드 대신 메시지를 차례로 분배"""
+    def run():
+        for message in messages:
+            time.sleep(delay)
+            client._dispatch(message)
+    threading.Thread(target=run, daemon=True).start()
+
+
+def test_requests_reuse_one_keep_alive_connection(client):
+    for _ in range(5):
+        assert client.request("GET", "/")[0] == 200
+    assert len(set(_ComfyHTTP.peers)) == 1
+
+
+def test_wait_for_prompt_returns_history_and_releases_subscription(client):
+    prompt_id = client.submit({"1": {"class_type": "Test", "inputs": {}}})
+    seen = []
+    send_later(
+        client,
+        {"type": "executing", "data": {"node": "1", "prompt_id": prompt_id}},
+        {"type": "executing", "data": {"node": "1", "prompt_id": "someone-else"}},
+        {"type": "executing", "data": {"node": None, "prompt_id": prompt_id}},
+    )
+
+    history = client.wait_for_prompt(prompt_id, on_message=seen.append)
+
+    assert history["status"]["status_str"] == "success"
+    assert [message["data"]["node"] for message in seen] == ["1", None]
+    assert all("received_at" in message for message in seen)
+    assert client._subscribers == {}
+
+
+def test_execution_error_raises_and_releases_subscription(client):
+    prompt_id = client.submit({})
+    send_later(client, {"type": "execution_error", "data": {
+        "prompt_id": prompt_id, "node_id": "130", "node_type": "WanVideoDecode", "exception_message": "OOM",
+    }})
+
+    with pytest.raises(Exception, match="OOM"):
+        client.wait_for_prompt(prompt_id)
+    assert client._subscribers == {}
+
+
+def test_rejected_prompt_is_not_left_subscribed(client):
+    _ComfyHTTP.reject_prompts = True
+    with pytest.raises(Exception, match="400"):
+        client.submit({})
+    assert client._subscribers == {}
+
+
+def test_missed_completion_is_found_in_history(client):
+    # 재연결 중 완료 메시지를 놓쳐도 poll_interval 뒤 /history로 완료를 확인
+    prompt_id = client.submit({})
+    assert client.wait_for_prompt(prompt_id, poll_interval=0.05)["outputs"] == {}
+    assert client._subscribers == {}
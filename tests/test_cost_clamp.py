@@ -0,0 +1,105 @@
+"""비용 상한(MAX_GPU_SECONDS)에 따른 수락 판단과 실행 시간 보정"""
+import wave
+
+from conftest import image_job
+
+
+def write_silence(path, seconds, rate=16000):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(b"\0\0" * int(seconds * rate))
+    return str(path)
+
+
+def test_clamp_reports_derived_frames_and_replans(handler, monkeypatch, tmp_path):
+    monkeypatch.setattr(handler, "VRAM_BUDGET_GB", 24)
+    job_input = {**image_job("clamp")["input"], "wav_path": write_silence(tmp_path / "long.wav", 12),
+                 "over_budget": "clamp"}
+    derived = handler.calculate_max_frames_from_audio(job_input["wav_path"])
+
+    # 윈도우 하나는 들어가고 오디오 전체는 넘는 상한
+    plan = handler.planner.plan_memory(256, 256, derived, 24, handler.PLANNER_CALIBRATION)
+    cost_args = {"workflow": "I2V_single", "width": 256, "height": 256, "motion_frame": 9,
+                 "frame_window_size": plan["frame_window_size"], "blocks_to_swap": plan["blocks_to_swap"]}
+    low = handler.cost_model.estimate_cost(max_frame=plan["frame_window_size"], **cost_args)["gpu_seconds"]
+    high = handler.cost_model.estimate_cost(max_frame=derived, **cost_args)["gpu_seconds"]
+    monkeypatch.setattr(handler.cost_model, "MAX_GPU_SECONDS", (low + high) / 2)
+
+    metrics = handler.JobMetrics()
+    job_state = handler.prepare_job(job_input, "task_clamp", metrics)
+    assert "error" not in job_state, job_state
+    try:
+        estimate = metrics.annotations["cost_estimate"]
+        clamped = job_state["params"]["max_frame"]
+        assert estimate["action"] == "clamp"
+        assert estimate["clamped_from"] == derived
+        assert clamped < derived
+        assert metrics.annotations["memory_plan"] == handler.planner.plan_memory(
+            256, 256, clamped, 24, handler.PLANNER_CALIBRATION
+        )
+    finally:
+        handler.release_job(job_state["scratch"], metrics)
+
+
+def cost_args(handler, width=256, height=256, max_frame=81):
+    plan = handler.planner.plan_memory(width, height, max_frame, 24, handler.PLANNER_CALIBRATION)
+    return {"workflow": "I2V_single", "width": width, "height": height, "motion_frame": 9,
+            "frame_window_size": plan["frame_window_size"], "blocks_to_swap": plan["blocks_to_swap"]}
+
+
+def test_segmented_job_is_admitted_on_the_sum_of_its_segments(handler, monkeypatch, tmp_path):
+    monkeypatch.setattr(handler, "VRAM_BUDGET_GB", 24)
+    monkeypatch.setattr(handler.segments, "detect_silences", lambda path: [])
+    job_input = {**image_job("segmented_total")["input"], "wav_path": write_silence(tmp_path / "long.wav", 12),
+                 "segmented": True, "segment_seconds": 4}
+    derived = handler.calculate_max_frames_from_audio(job_input["wav_path"])
+
+    # 한 프롬프트로는 들어가지만 구간마다 고정 비용이 붙으면 넘는 상한
+    args = cost_args(handler, max_frame=derived)
+    whole = handler.cost_model.estimate_cost(max_frame=derived, **args)["gpu_seconds"]
+    monkeypatch.setattr(handler.cost_model, "MAX_GPU_SECONDS", whole + 1)
+
+    metrics = handler.JobMetrics()
+    result = handler.prepare_job(job_input, "task_segmented_total", metrics)
+
+    estimate = metrics.annotations["cost_estimate"]
+    assert "error" in result and estimate["action"] == "reject"
+    assert estimate["segments"] > 1 and estimate["gpu_seconds"] > whole + 1
+
+
+def test_segment_policy_returns_plan_without_rendering(handler, fake_comfy, monkeypatch, tmp_path):
+    monkeypatch.setattr(handler, "VRAM_BUDGET_GB", 24)
+    monkeypatch.setattr(handler.segments, "detect_silences", lambda path: [])
+    job_input = {**image_job("segment_plan")["input"], "wav_path": write_silence(tmp_path / "long.wav", 12),
+                 "over_budget": "segment"}
+    derived = handler.calculate_max_frames_from_audio(job_input["wav_path"])
+    args = cost_args(handler, max_frame=derived)
+    cap = (handler.cost_model.estimate_cost(max_frame=args["frame_window_size"] * 2, **args)["gpu_seconds"]
+           + handler.cost_model.estimate_cost(max_frame=derived, **args)["gpu_seconds"]) / 2
+    monkeypatch.setattr(handler.cost_model, "MAX_GPU_SECONDS", cap)
+    submitted = len(fake_comfy.submitted)
+
+    result = handler.handler({"id": "segment_plan", "input": job_input})
+
+    assert len(fake_comfy.submitted) == submitted
+    assert result["segmentation_required"] is True and "error" in result
+    assert result["cost_estimate"]["action"] == "segment"
+    assert len(result["segments"]) > 1
+    assert all(segment["gpu_seconds"] <= cap for segment in result["segments"])
+    assert abs(sum(segment["duration"] for segment in result["segments"]) - 12) < 0.1
+
+
+def test_calibration_skips_runs_that_load_weights(handler, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(handler.cost_model, "record_timing", lambda workflow, *args: recorded.append(workflow))
+
+    handler.handler(image_job("calibration_single"))
+    # 모델이 바뀐 실행은 로딩 시간이 섞이므로 보정하지 않고, 같은 모델로 다시 실행하면 보정
+    result = handler.handler(image_job("calibration_switch", person_count="multi"))
+    loaders = [node for node in result["metrics"]["nodes"].values() if node["class_type"] == "MultiTalkModelLoader"]
+    assert loaders and not loaders[0].get("cached")
+    assert recorded.count("I2V_multi") == 0
+    handler.handler(image_job("calibration_resident", person_count="multi"))
+    assert recorded.count("I2V_multi") == 1
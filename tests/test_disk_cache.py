@@ -0,0 +1,100 @@
+"""내용 주소 디스크 캐시: 중복 저장, LRU 제거, 색인 정리, 동시 채우기"""
+import os
+import threading
+import time
+
+import pytest
+
+from disk_cache import DiskCache, sha256_file
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def age(path, seconds):
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskCache(str(tmp_path / "cache"), max_bytes=100, min_age=0)
+
+
+def test_same_content_is_stored_once(cache, tmp_path):
+    first = cache.put_file("url:a", write(tmp_path / "a.bin", b"x" * 10), ".bin", {"etag": "1"})
+    second = cache.put_file("url:b", write(tmp_path / "b.bin", b"x" * 10), ".bin")
+
+    assert first == second == cache.blob_path(sha256_file(first), ".bin")
+    assert cache.get("url:a")["etag"] == "1"
+    assert cache.get("url:b")["path"] == first
+    assert len(os.listdir(cache.blob_dir)) == 1
+    assert not os.path.exists(tmp_path / "a.bin")
+
+
+def test_evicts_least_recently_used_blob_and_its_index(cache, tmp_path):
+    old = cache.put_file("old", write(tmp_path / "old", b"o" * 60))
+    age(old, 100)
+    recent = cache.put_file("recent", write(tmp_path / "recent", b"r" * 30))
+    age(recent, 50)
+    cache.get("old")  # 조회하면 최근 사용으로 바뀜
+
+    cache.put_file("new", write(tmp_path / "new", b"n" * 30))
+
+    assert cache.get("recent") is None and not os.path.exists(recent)
+    assert cache.get("old")["path"] == old
+    assert len(os.listdir(cache.index_dir)) == 2
+
+
+def test_recently_used_blobs_are_kept_over_the_cap(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), max_bytes=10, min_age=3600)
+    path = cache.put_file("busy", write(tmp_path / "busy", b"b" * 20))
+    assert os.path.exists(path) and cache.get("busy") is not None
+
+
+def test_lookup_drops_index_of_missing_blob(cache, tmp_path):
+    path = cache.put_file("gone", write(tmp_path / "gone", b"g" * 10))
+    os.remove(path)
+
+    assert cache.get("gone") is None
+    assert os.listdir(cache.index_dir) == []
+
+
+def test_prune_index_removes_dangling_and_broken_entries(cache, tmp_path):
+    cache.put_file("kept", write(tmp_path / "kept", b"k" * 10))
+    cache.put_meta("dangling", "0" * 64)
+    with open(os.path.join(cache.index_dir, "broken.json"), "w") as f:
+        f.write("{")
+
+    assert cache.prune_index() == 2
+    assert cache.get("kept") is not None
+    assert len(os.listdir(cache.index_dir)) == 1
+
+
+def test_disabled_cache_passes_files_through(tmp_path):
+    cache = DiskCache(str(tmp_path / "off"), max_bytes=0)
+    src = write(tmp_path / "src", b"s")
+    assert cache.put_file("k", src) == src
+    assert cache.get("k") is None
+
+
+def test_concurrent_fills_of_one_key_are_serialized(cache, tmp_path):
+    fills = []
+
+    def fill(index):
+        with cache.lock("shared"):
+            if cache.get("shared") is None:
+                fills.append(index)
+                time.sleep(0.05)
+                cache.put_file("shared", write(tmp_path / f"fill_{index}", b"s" * 10))
+
+    threads = [threading.Thread(target=fill, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(fills) == 1
+    assert cache.get("shared") is not None
@@ -0,0 +1,130 @@
+"""프로세스 내 다운로더: 이어받기, 재시도 판단, 병렬 받기의 빠른 실패"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import downloader
+
+BODY = bytes(range(256)) * 64
+
+
+class _Files(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = []
+    cut_first = False
+    ranges = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("Range")))
+        if self.path == "/missing":
+            self.send_error(404)
+            return
+        if self.path == "/cached" and self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.ranges:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(BODY) - 1}/{len(BODY)}")
+        else:
+            self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(BODY) - start))
+        self.end_headers()
+        if self.cut_first and len(self.requests) == 1:
+            # 절반만 보내고 연결을 끊음
+            self.wfile.write(BODY[:len(BODY) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(BODY[start:])
+
+
+@pytest.fixture
+def server(monkeypatch):
+    _Files.requests, _Files.cut_first, _Files.ranges = [], False, True
+    monkeypatch.setattr(downloader.time, "sleep", lambda seconds: None)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Files)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", _Files
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_returns_headers_and_leaves_no_part_file(server, tmp_path):
+    url, _ = server
+    output = tmp_path / "a.bin"
+    headers = downloader.download_file(f"{url}/a", str(output))
+    assert output.read_bytes() == BODY
+    assert headers["ETag"] == '"v1"'
+    assert not (tmp_path / "a.bin.part").exists()
+
+
+def test_interrupted_download_resumes_with_range(server, tmp_path):
+    url, files = server
+    files.cut_first = True
+    output = tmp_path / "resumed.bin"
+    downloader.download_file(f"{url}/a", str(output), max_retries=2)
+    assert output.read_bytes() == BODY
+    assert files.requests == [("/a", None), ("/a", f"bytes={len(BODY) // 2}-")]
+
+
+def test_server_without_range_support_restarts_from_scratch(server, tmp_path):
+    url, files = server
+    files.cut_first, files.ranges = True, False
+    output = tmp_path / "restarted.bin"
+    downloader.download_file(f"{url}/a", str(output), max_retries=2)
+    assert output.read_bytes() == BODY
+
+
+def test_client_errors_are_not_retried(server, tmp_path):
+    url, files = server
+    with pytest.raises(Exception, match="HTTP 404"):
+        downloader.download_file(f"{url}/missing", str(tmp_path / "missing"), max_retries=3)
+    assert len(files.requests) == 1
+
+
+def test_conditional_request_reports_not_modified(server, tmp_path):
+    url, _ = server
+    with pytest.raises(downloader.NotModified):
+        downloader.download_file(f"{url}/cached", str(tmp_path / "cached"), headers={"If-None-Match": '"v1"'})
+
+
+def test_fetch_all_returns_results_by_name(server, tmp_path):
+    url, _ = server
+    tasks = {
+        name: (lambda cancel_event, name=name: downloader.download_file(
+            f"{url}/{name}", str(tmp_path / name), cancel_event=cancel_event) and str(tmp_path / name))
+        for name in ("image", "wav", "wav_2")
+    }
+    assert downloader.fetch_all(tasks) == {name: str(tmp_path / name) for name in tasks}
+    assert downloader.fetch_all({}) == {}
+
+
+def test_fetch_all_fails_fast_and_cancels_the_rest(tmp_path):
+    started_waiting, cancelled = threading.Event(), threading.Event()
+
+    def failing(cancel_event):
+        started_waiting.wait(2)
+        raise ValueError("bad input")
+
+    def waiting(cancel_event):
+        started_waiting.set()
+        if cancel_event.wait(5):
+            cancelled.set()
+            raise downloader.DownloadCancelled("cancelled")
+        return "finished"
+
+    started = time.monotonic()
+    with pytest.raises(ValueError, match="bad input"):
+        downloader.fetch_all({"wav": failing, "image": waiting})
+    assert time.monotonic() - started < 2
+    assert cancelled.wait(2)
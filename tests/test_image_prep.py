@@ -0,0 +1,88 @@
+"""I2V 입력 이미지 전처리: 281과 같은 크기/crop, EXIF 방향, 캐시"""
+import pytest
+from PIL import Image
+
+import image_prep
+from disk_cache import DiskCache
+
+
+@pytest.fixture(autouse=True)
+def prep_cache(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path / "prep"), max_bytes=1 << 30)
+    monkeypatch.setattr(image_prep, "image_prep_cache", cache)
+    return cache
+
+
+def striped(width, height):
+    """가운데 1/3만 초록색이고 양옆은 빨간색인 이미지 (가운데 crop 확인용)"""
+    image = Image.new("RGB", (width, height), (255, 0, 0))
+    image.paste((0, 255, 0), (width // 3, 0, 2 * width // 3, height))
+    return image
+
+
+def test_target_size_and_crop_box_match_node_281():
+    assert image_prep.target_size(500, 850) == (496, 848)
+    assert image_prep.target_size(8, 8) == (16, 16)
+    assert image_prep.crop_box(1920, 1080, 512, 512) == (420, 0, 1500, 1080)
+    assert image_prep.crop_box(1000, 2000, 500, 500) == (0, 500, 1000, 1500)
+
+
+def test_large_jpeg_is_center_cropped_and_resized(tmp_path):
+    path = tmp_path / "wide.jpg"
+    striped(3000, 1000).save(path, quality=95)
+
+    output, info = image_prep.normalize_image(str(path), 300, 300, str(tmp_path))
+
+    assert info == {"width": 3000, "height": 1000, "normalized_width": 288, "normalized_height": 288, "mode": "resized"}
+    with Image.open(output) as result:
+        assert result.size == (288, 288)
+        # 가운데 정사각형은 전부 초록 띠 안에 있음
+        for x in (5, 144, 282):
+            red, green, _ = result.getpixel((x, 144))
+            assert green > 200 and red < 60
+
+
+def test_exif_orientation_is_applied_before_cropping(tmp_path):
+    path = tmp_path / "rotated.jpg"
+    exif = Image.Exif()
+    exif[0x0112] = 6  # 시계 방향 90도 회전해서 보여야 하는 사진
+    striped(1200, 400).save(path, exif=exif)
+
+    output, info = image_prep.normalize_image(str(path), 128, 320, str(tmp_path))
+
+    assert (info["width"], info["height"]) == (400, 1200)
+    with Image.open(output) as result:
+        assert result.size == (128, 320)
+        # 회전 후 초록 띠는 가로로 놓이므로 위/아래 끝은 빨간색
+        assert result.getpixel((64, 2))[0] > 200
+        assert result.getpixel((64, 160))[1] > 200
+
+
+def test_image_already_at_target_size_is_used_as_is(tmp_path, prep_cache):
+    path = tmp_path / "exact.png"
+    striped(512, 512).save(path)
+    assert image_prep.normalize_image(str(path), 512, 512, str(tmp_path)) == (str(path), {
+        "width": 512, "height": 512, "normalized_width": 512, "normalized_height": 512, "mode": "none"})
+
+
+def test_second_request_hits_cache(tmp_path):
+    path = tmp_path / "face.png"
+    striped(1000, 1000).save(path)
+    first, info = image_prep.normalize_image(str(path), 256, 256, str(tmp_path))
+    again, info_again = image_prep.normalize_image(str(path), 256, 256, str(tmp_path))
+    assert (again, info_again["mode"]) == (first, "cached")
+    assert info["mode"] == "resized"
+
+
+def test_disabled_cache_writes_into_work_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_prep, "image_prep_cache", DiskCache(str(tmp_path / "off"), max_bytes=0))
+    path = tmp_path / "face.png"
+    striped(1000, 1000).save(path)
+    output, _ = image_prep.normalize_image(str(path), 256, 256, str(tmp_path / "job"))
+    assert output == str(tmp_path / "job" / "input_image_normalized.jpg")
+
+
+def test_unreadable_image_is_passed_through(tmp_path):
+    path = tmp_path / "broken.jpg"
+    path.write_bytes(b"not an image")
+    assert image_prep.normalize_image(str(path), 256, 256, str(tmp_path)) == (str(path), {"mode": "none"})
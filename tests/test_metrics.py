@@ -0,0 +1,86 @@
+"""작업 측정값: 메시지 수신 시각 기준 노드/단계 시간과 OpenMetrics 내보내기"""
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import metrics
+
+PROMPT = {"1": {"class_type": "LoadImage"}, "2": {"class_type": "WanVideoSampler"}, "3": {"class_type": "VHS_VideoCombine"}}
+
+
+def message(message_type, received_at, **data):
+    return {"type": message_type, "data": data, "received_at": received_at}
+
+
+def run_prompt(job, start=100.0):
+    job._queued_at = start
+    for item in [
+        message("execution_start", start + 2.0),
+        message("execution_cached", start + 2.0, nodes=["1"]),
+        message("executing", start + 2.5, node="2"),
+        message("executing", start + 12.5, node="3"),
+        message("executing", start + 13.0, node=None),
+    ]:
+        job.observe_message(item, PROMPT)
+
+
+def test_times_come_from_arrival_not_processing():
+    job = metrics.JobMetrics("I2V_single")
+    # 메시지를 한꺼번에 늦게 처리해도 received_at 기준으로 계산
+    run_prompt(job)
+
+    assert job.stages["queue_wait"] == pytest.approx(2.0)
+    assert job.stages["execution"] == pytest.approx(11.0)
+    assert job.nodes["1"] == {"class_type": "LoadImage", "seconds": 0.0, "cached": True}
+    assert job.nodes["2"]["seconds"] == pytest.approx(10.0)
+    assert job.nodes["3"]["seconds"] == pytest.approx(0.5)
+    assert list(job.as_dict()["nodes"]) == ["2", "3", "1"]
+
+
+def test_repeated_stages_add_up():
+    job = metrics.JobMetrics()
+    job.record("input_decode", 0.25)
+    job.record("input_decode", 0.5)
+    assert job.stages["input_decode"] == 0.75
+    with metrics.span(None, "ignored"):
+        pass
+
+
+def test_openmetrics_exposition():
+    job = metrics.JobMetrics("metrics_test_workflow")
+    run_prompt(job)
+    metrics.observe(job, "success")
+    metrics.observe_model_switch("metrics_test_model")
+
+    text = metrics.render_openmetrics()
+    lines = text.splitlines()
+
+    assert lines[-1] == "# EOF"
+    assert 'infinitetalk_jobs_total{workflow="metrics_test_workflow",status="success"} 1' in lines
+    assert 'infinitetalk_model_switches_total{model="metrics_test_model"} 1' in lines
+    labels = 'workflow="metrics_test_workflow",class_type="WanVideoSampler"'
+    assert f'infinitetalk_node_seconds_bucket{{{labels},le="5.0"}} 0' in lines
+    assert f'infinitetalk_node_seconds_bucket{{{labels},le="10.0"}} 1' in lines
+    assert f'infinitetalk_node_seconds_count{{{labels}}} 1' in lines
+    # 캐시된 노드는 노드 히스토그램에 넣지 않음
+    assert 'workflow="metrics_test_workflow",class_type="LoadImage"' not in text
+    assert "# UNIT infinitetalk_stage_seconds seconds" in lines
+
+
+def test_metrics_endpoint():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), metrics._MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{base}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("application/openmetrics-text")
+            assert response.read().decode().endswith("# EOF\n")
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{base}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert metrics.start_http_server(0) is None
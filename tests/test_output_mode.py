@@ -0,0 +1,80 @@
+"""결과 전달 방식: base64로 싣거나 S3 호환 버킷에 멀티파트로 올리고 URL만 반환"""
+import base64
+import hashlib
+
+import pytest
+
+from conftest import image_job
+
+
+class StandInBucket:
+    """upload_file/generate_presigned_url만 흉내 내는 boto 클라이언트 대역"""
+
+    def __init__(self):
+        self.uploads = []
+
+    def upload_file(self, path, bucket, key, Config=None, ExtraArgs=None):
+        with open(path, "rb") as f:
+            self.uploads.append({"bucket": bucket, "key": key, "data": f.read(), "config": Config, "extra": ExtraArgs})
+
+    def generate_presigned_url(self, operation, Params=None, ExpiresIn=None):
+        return f"https://bucket.example/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+
+@pytest.fixture
+def bucket(handler, monkeypatch):
+    stand_in = StandInBucket()
+    monkeypatch.setattr(handler.rp_upload, "get_boto_client", lambda: (stand_in, None))
+    monkeypatch.setenv("BUCKET_NAME", "renders")
+    monkeypatch.setenv("BUCKET_PREFIX", "/avatars/")
+    return stand_in
+
+
+def test_upload_uses_large_parts_and_reports_checksum(handler, bucket, tmp_path):
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"v" * 1000)
+
+    result = handler.upload_video_to_bucket(str(video), "job-1")
+
+    upload = bucket.uploads[0]
+    assert (upload["bucket"], upload["key"]) == ("renders", "avatars/job-1/clip.mp4")
+    assert upload["config"].multipart_chunksize == handler.UPLOAD_CHUNK_SIZE
+    sha256 = hashlib.sha256(b"v" * 1000).hexdigest()
+    assert upload["extra"] == {"ContentType": "video/mp4", "Metadata": {"sha256": sha256}}
+    assert result == {"video_url": "https://bucket.example/renders/avatars/job-1/clip.mp4?expires=604800",
+                      "video_size": 1000, "video_sha256": sha256}
+
+
+def test_upload_without_bucket_settings_fails_clearly(handler, monkeypatch, tmp_path):
+    monkeypatch.setattr(handler.rp_upload, "get_boto_client", lambda: (None, None))
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"v")
+    with pytest.raises(Exception, match="BUCKET_ENDPOINT_URL"):
+        handler.upload_video_to_bucket(str(video), "job-1")
+
+
+def test_s3_job_returns_url_instead_of_video(handler, bucket):
+    job = image_job("s3_mode")
+    job["input"]["output_mode"] = "s3"
+
+    result = handler.handler(job)
+
+    assert "error" not in result, result
+    assert "video" not in result
+    assert result["video_url"].startswith("https://bucket.example/renders/avatars/s3_mode/")
+    assert result["video_sha256"] == hashlib.sha256(bucket.uploads[0]["data"]).hexdigest()
+
+
+def test_base64_job_inlines_video(handler):
+    result = handler.handler(image_job("base64_mode"))
+    assert "error" not in result, result
+    assert len(base64.b64decode(result["video"])) == result["video_size"]
+    assert "video_url" not in result
+
+
+def test_unknown_output_mode_is_rejected_before_rendering(handler, fake_comfy):
+    submitted = len(fake_comfy.submitted)
+    job = image_job("bad_mode")
+    job["input"]["output_mode"] = "ftp"
+    assert "output_mode" in handler.handler(job)["error"]
+    assert len(fake_comfy.submitted) == submitted
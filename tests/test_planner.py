@@ -0,0 +1,127 @@
+"""해상도/프레임 수/VRAM 예산에 따른 메모리 계획 (GPU 없이 예산을 고정해 계산)"""
+import json
+import subprocess
+
+import pytest
+
+import planner
+from conftest import image_job
+
+
+def plan(width, height, max_frame, budget):
+    return planner.plan_memory(width, height, max_frame, budget)
+
+
+def test_large_budget_keeps_every_block_resident():
+    result = plan(480, 832, 81, 80)
+    assert result["frame_window_size"] == 81
+    assert result["blocks_to_swap"] == 0 and result["prefetch_blocks"] == 0
+    assert result["vae_tiling"] is None
+    assert result["fits"]
+
+
+def test_smaller_budget_swaps_more_blocks():
+    swaps = [plan(480, 832, 81, budget)["blocks_to_swap"] for budget in (80, 32, 24, 16, 12, 10)]
+    assert swaps == sorted(swaps) and swaps[0] == 0 and swaps[-1] == planner.CALIBRATION["total_blocks"]
+    for budget in (32, 24, 16, 12, 10):
+        result = plan(480, 832, 81, budget)
+        assert result["fits"] and result["estimated_peak_gb"] <= budget
+
+
+def test_prefetch_depth_follows_spare_block_slots():
+    # 블록 자리가 넉넉하면 두 블록씩, 빠듯하면 한 블록씩 미리 가져오며 그 자리도 최대 사용량에 포함
+    roomy = plan(480, 832, 81, 24)
+    assert roomy["prefetch_blocks"] == 2 and 0 < roomy["blocks_to_swap"] < 40
+    tight = plan(1280, 720, 81, 24)
+    assert tight["prefetch_blocks"] == 1 and tight["blocks_to_swap"] == 40
+    assert tight["estimated_peak_gb"] <= 24
+
+
+def test_higher_resolution_needs_more_swap():
+    assert plan(1280, 720, 81, 24)["blocks_to_swap"] > plan(480, 832, 81, 24)["blocks_to_swap"]
+
+
+def test_frame_window_shrinks_when_activations_do_not_fit():
+    assert plan(480, 832, 401, 24)["frame_window_size"] == 81
+    assert plan(480, 832, 401, 10)["frame_window_size"] == 49
+    assert plan(1920, 1080, 801, 24)["frame_window_size"] == 33
+
+
+def test_long_clips_tile_the_vae_decode():
+    assert plan(480, 832, 81, 24)["vae_tiling"] is None
+    tiled = plan(1280, 720, 401, 12)
+    assert tiled["vae_tiling"] == {"tile_x": 512, "tile_y": 512, "tile_stride_x": 272, "tile_stride_y": 256}
+    # 예산이 더 작으면 들어가는 가장 큰 타일로 내려감
+    assert plan(1920, 1080, 801, 10)["vae_tiling"]["tile_x"] == 384
+
+
+def test_budget_too_small_is_reported_not_raised():
+    result = plan(480, 832, 81, 6)
+    assert result["frame_window_size"] == min(planner.CALIBRATION["frame_windows"])
+    assert result["blocks_to_swap"] == planner.CALIBRATION["total_blocks"]
+    assert not result["fits"] and result["estimated_peak_gb"] > 6
+    # 가장 작은 타일도 넘치면 그 타일을 쓰고 fits=false
+    huge = plan(1920, 1080, 20001, 10)
+    assert huge["vae_tiling"]["tile_x"] == planner.CALIBRATION["vae_tiles"][-1][0]
+    assert not huge["fits"]
+
+
+def test_plan_params_match_template_parameters():
+    assert planner.plan_params(plan(480, 832, 81, 80)) == {
+        "frame_window_size": 81, "blocks_to_swap": 0, "prefetch_blocks": 0, "vae_tiling": False,
+    }
+    params = planner.plan_params(plan(1280, 720, 401, 12))
+    assert params["vae_tiling"] is True and params["tile_x"] == 512 and params["tile_stride_y"] == 256
+
+
+def test_calibration_file_overrides_defaults(tmp_path, monkeypatch):
+    path = tmp_path / "calibration.json"
+    path.write_text(json.dumps({"block_gb": 0.5}))
+    monkeypatch.setenv("PLANNER_CALIBRATION", str(path))
+    calibration = planner.load_calibration()
+    assert calibration["block_gb"] == 0.5 and calibration["total_blocks"] == 40
+    assert planner.CALIBRATION["block_gb"] == 0.37
+
+
+def test_detect_vram_gb(monkeypatch):
+    monkeypatch.setenv("VRAM_BUDGET_GB", "20")
+    assert planner.detect_vram_gb() == 20
+
+    monkeypatch.delenv("VRAM_BUDGET_GB")
+    monkeypatch.setattr(subprocess, "run", lambda *args, **kwargs: subprocess.CompletedProcess(args, 0, "81920\n81920\n"))
+    assert planner.detect_vram_gb() == pytest.approx(72)
+
+    def missing(*args, **kwargs):
+        raise FileNotFoundError("nvidia-smi")
+    monkeypatch.setattr(subprocess, "run", missing)
+    assert planner.detect_vram_gb() is None
+
+
+def test_handler_patches_planned_nodes(handler, monkeypatch):
+    monkeypatch.setattr(handler, "VRAM_BUDGET_GB", 16)
+    metrics = handler.JobMetrics()
+    job_state = handler.prepare_job(image_job("planned")["input"], "task_planned", metrics)
+    assert "error" not in job_state, job_state
+    try:
+        memory_plan = metrics.annotations["memory_plan"]
+        prompt = job_state["prompt"]
+        assert memory_plan["vram_budget_gb"] == 16
+        assert prompt["134"]["inputs"]["blocks_to_swap"] == memory_plan["blocks_to_swap"]
+        assert prompt["134"]["inputs"]["prefetch_blocks"] == memory_plan["prefetch_blocks"]
+        assert prompt["192"]["inputs"]["frame_window_size"] == memory_plan["frame_window_size"]
+        assert prompt["130"]["inputs"]["enable_vae_tiling"] is (memory_plan["vae_tiling"] is not None)
+    finally:
+        handler.release_job(job_state["scratch"], metrics)
+
+
+def test_memory_plan_false_keeps_workflow_defaults(handler, monkeypatch):
+    monkeypatch.setattr(handler, "VRAM_BUDGET_GB", 16)
+    metrics = handler.JobMetrics()
+    job_input = {**image_job("unplanned")["input"], "memory_plan": False}
+    job_state = handler.prepare_job(job_input, "task_unplanned", metrics)
+    assert "error" not in job_state, job_state
+    try:
+        assert "memory_plan" not in metrics.annotations
+        assert job_state["prompt"]["134"]["inputs"] == job_state["template"].graph["134"]["inputs"]
+    finally:
+        handler.release_job(job_state["scratch"], metrics)
@@ -0,0 +1,44 @@
+"""재생 드라이버: 대역 서버로 합성 작업을 돌려 보고서를 내는지 확인"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import replay
+from conftest import ROOT
+
+
+def run_replay(*args):
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "replay.py"), "--json", *args],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout)
+
+
+@pytest.mark.parametrize("target", ["handler", "callback"])
+def test_synthetic_replay_reports_every_job(target):
+    report = run_replay("--synthetic", "4", "--target", target, "--input-kind", "base64")
+
+    assert (report["jobs"], report["failures"]) == (4, 0)
+    assert report["latency_s"]["p50"] <= report["latency_s"]["max"]
+    if target == "callback":
+        assert report["bytes"]["callbacks"] > 0
+    else:
+        assert report["bytes"]["responses"] > 0
+
+
+def test_job_file_skips_lines_without_input(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    path.write_text('{"input": {"prompt": "a"}}\n\n{"id": "no input"}\n{"id": "b", "input": {"prompt": "b"}}\n')
+    assert [job["input"]["prompt"] for job in replay.load_jobs(str(path))] == ["a", "b"]
+
+
+def test_percentile():
+    samples = [float(n) for n in range(1, 101)]
+    assert replay.percentile(samples, 50) == 51.0
+    assert replay.percentile(samples, 99) == 99.0
+    assert replay.percentile([], 90) == 0.0
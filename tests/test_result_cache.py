@@ -0,0 +1,88 @@
+"""결과 캐시: 입력 내용과 최종 프롬프트로 만든 키, 적중 시 ComfyUI 생략"""
+import base64
+import time
+
+import pytest
+
+import result_cache
+from conftest import image_job
+from disk_cache import DiskCache
+
+PROMPT = {"284": {"class_type": "LoadImage", "inputs": {"image": None}},
+          "128": {"class_type": "WanVideoSampler", "inputs": {"seed": 2, "steps": 4}}}
+
+
+def prompt_for(path, **sampler):
+    return {**PROMPT, "284": {**PROMPT["284"], "inputs": {"image": str(path)}},
+            "128": {**PROMPT["128"], "inputs": {**PROMPT["128"]["inputs"], **sampler}}}
+
+
+def test_key_depends_on_content_not_path(tmp_path):
+    first, second, other = tmp_path / "a.png", tmp_path / "b.png", tmp_path / "c.png"
+    first.write_bytes(b"face")
+    second.write_bytes(b"face")
+    other.write_bytes(b"other face")
+
+    key = result_cache.cache_key(prompt_for(first), [str(first)])
+    assert result_cache.cache_key(prompt_for(second), [str(second)]) == key
+    assert result_cache.cache_key(prompt_for(other), [str(other)]) != key
+    assert result_cache.cache_key(prompt_for(first, seed=3), [str(first)]) != key
+    assert result_cache.cache_key(prompt_for(first), [str(first)], {"segments": [[0, 81]]}) != key
+
+
+def test_input_cache_blobs_are_not_rehashed(tmp_path, monkeypatch):
+    input_cache = DiskCache(str(tmp_path / "inputs"), max_bytes=1 << 20)
+    source = tmp_path / "face.png"
+    source.write_bytes(b"face")
+    blob = input_cache.put_file("b64:x", str(source), ".png")
+    monkeypatch.setattr(result_cache, "sha256_file", lambda path: pytest.fail("blob was read again"))
+    assert result_cache.content_digest(blob, input_cache) == blob.rsplit("/", 1)[1][:-4]
+
+
+@pytest.fixture
+def enabled_cache(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path / "results"), max_bytes=1 << 30)
+    monkeypatch.setattr(result_cache, "result_cache", cache)
+    return cache
+
+
+def test_uploads_are_reused_until_they_get_old(enabled_cache, tmp_path, monkeypatch):
+    video = tmp_path / "out.mp4"
+    video.write_bytes(b"video")
+    upload = {"video_url": "https://bucket.example/a.mp4", "video_size": 5}
+    result_cache.store("result:k", str(video), upload)
+
+    entry = result_cache.lookup("result:k")
+    assert result_cache.reusable_upload(entry) == upload
+    later = time.time() + result_cache.UPLOAD_REUSE_SECONDS + 1
+    monkeypatch.setattr(result_cache.time, "time", lambda: later)
+    assert result_cache.reusable_upload(entry) is None
+
+
+def test_repeated_job_is_served_from_cache(handler, fake_comfy, enabled_cache):
+    submitted = len(fake_comfy.submitted)
+    first = handler.handler(image_job("result_cache_first"))
+    assert first["result_cache"] == "miss"
+    assert len(fake_comfy.submitted) == submitted + 1
+
+    # 같은 이미지를 base64로 보내도 내용이 같으므로 적중
+    job = image_job("result_cache_second")
+    with open(job["input"].pop("image_path"), "rb") as f:
+        job["input"]["image_base64"] = base64.b64encode(f.read()).decode()
+    second = handler.handler(job)
+
+    assert second["result_cache"] == "hit"
+    assert second["video"] == first["video"]
+    assert len(fake_comfy.submitted) == submitted + 1
+
+
+def test_bypass_cache_renders_again(handler, fake_comfy, enabled_cache):
+    handler.handler(image_job("bypass_first"))
+    submitted = len(fake_comfy.submitted)
+    job = image_job("bypass_second")
+    job["input"]["bypass_cache"] = True
+
+    result = handler.handler(job)
+
+    assert result["result_cache"] == "bypass"
+    assert len(fake_comfy.submitted) == submitted + 1
@@ -0,0 +1,43 @@
+"""작업 폴더 위치(빠른 경로/디스크) 결정과 예약"""
+import os
+
+import pytest
+
+import scratch
+
+
+@pytest.fixture
+def fast_path(monkeypatch):
+    monkeypatch.setattr(scratch, "SCRATCH_FAST_RESERVE_BYTES", 0)
+    monkeypatch.setattr(scratch, "SCRATCH_FAST_MAX_BYTES", 1024 ** 2)
+
+
+def test_nothing_to_write_stays_on_disk(fast_path):
+    job = scratch.JobScratch("scratch_empty")
+    try:
+        assert job.stage(0) == os.path.join(scratch.SCRATCH_DIR, "scratch_empty")
+        assert not job.fast and job.reserved == 0
+    finally:
+        job.cleanup()
+
+
+def test_restage_moves_written_files_and_reservation(fast_path):
+    job = scratch.JobScratch("scratch_move")
+    try:
+        fast_dir = job.stage(1000)
+        assert job.fast and scratch._fast_reserved >= 1000
+        os.makedirs(fast_dir)
+        written = os.path.join(fast_dir, "input.wav")
+        with open(written, "wb") as f:
+            f.write(b"\0" * 10)
+
+        # 프레임 수를 안 뒤 전처리 결과까지 더하면 빠른 경로에 들어가지 않음
+        disk_dir = job.stage(scratch.estimate_video_bytes(1000, 512, 512))
+        assert not job.fast and job.reserved == 0
+        moved = scratch.moved_path(written, fast_dir, disk_dir)
+        assert moved == os.path.join(disk_dir, "input.wav") and os.path.isfile(moved)
+        assert not os.path.exists(fast_dir)
+        assert scratch.moved_path("/examples/audio.mp3", fast_dir, disk_dir) == "/examples/audio.mp3"
+    finally:
+        assert job.cleanup() == 10
+    assert scratch._fast_reserved == 0
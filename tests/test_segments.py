@@ -0,0 +1,145 @@
+"""구간 분할 계획과 구간 렌더링 순서 (ffmpeg 호출은 파일 복사로 대신함)"""
+import os
+import shutil
+
+import pytest
+
+import scratch
+import segments
+import workflows
+from conftest import ROOT
+
+
+def test_plan_covers_audio_and_leads_later_segments():
+    planned = segments.plan_segments(70, [(19.5, 20.5), (39.0, 40.0)], 25, 81, 9, target_seconds=20)
+
+    # 무음 구간 중앙에서 자르고, 후보가 없으면 윈도우 경계(9 + 72 x 7)에서 자름
+    assert [segment["start_frame"] for segment in planned] == [0, 500, 988, 1501]
+    assert sum(segment["frames"] for segment in planned) == 70 * 25
+    assert [segment["lead_frames"] for segment in planned] == [0, 1, 1, 1]
+    for segment in planned:
+        assert segment["max_frame"] >= segment["frames"] + segment["lead_frames"]
+        assert (segment["max_frame"] - 9) % (81 - 9) == 0
+
+
+def test_intersect_silences_keeps_common_quiet_parts():
+    assert segments.intersect_silences([(0, 2), (5, 8)], [(1, 6)]) == [(1, 2), (5, 6)]
+
+
+def test_skip_frames_stay_inside_short_source():
+    assert segments.clamp_skip_frames(500, 153, None) == 500
+    assert segments.clamp_skip_frames(500, 153, 600) == 447
+    assert segments.clamp_skip_frames(500, 153, 100) == 0
+
+
+def test_checkpoint_key_hashes_input_files_not_their_source(tmp_path):
+    audio = tmp_path / "audio.wav"
+    audio.write_bytes(b"RIFF")
+    key = segments.checkpoint_key({"wav_base64": "UklGRg==", "prompt": "hi"}, (str(audio), None))
+
+    assert segments.checkpoint_key({"wav_path": "/elsewhere.wav", "prompt": "hi", "callback_url": "x"},
+                                   (str(audio), None)) == key
+    assert segments.checkpoint_key({"wav_path": "/elsewhere.wav", "prompt": "bye"}, (str(audio), None)) != key
+    audio.write_bytes(b"RIFF2")
+    assert segments.checkpoint_key({"wav_base64": "UklGRg==", "prompt": "hi"}, (str(audio), None)) != key
+
+
+@pytest.fixture
+def ffmpeg_calls(monkeypatch):
+    """ffmpeg를 쓰는 단계를 기록만 하고 파일 복사로 대신함"""
+    calls = []
+
+    def cut_audio(audio_path, start, duration, output_path):
+        calls.append(("cut", os.path.basename(output_path), round(start, 3), round(duration, 3)))
+        shutil.copyfile(audio_path, output_path)
+        return output_path
+
+    def drop_lead_frames(video_path, frames, fps, output_path, video_args):
+        calls.append(("drop", frames, video_args))
+        shutil.copyfile(video_path, output_path)
+        return output_path
+
+    def extract_last_frame(video_path, output_path):
+        shutil.copyfile(video_path, output_path)
+        return output_path
+
+    def concat_videos(video_paths, output_path):
+        calls.append(("concat", len(video_paths)))
+        with open(output_path, "wb") as f:
+            f.write(b"".join(open(path, "rb").read() for path in video_paths))
+        return output_path
+
+    for name, fake in [("cut_audio", cut_audio), ("drop_lead_frames", drop_lead_frames),
+                       ("extract_last_frame", extract_last_frame), ("concat_videos", concat_videos)]:
+        monkeypatch.setattr(segments, name, fake)
+    return calls
+
+
+def segmented_state(tmp_path, name, input_type="image"):
+    audio = tmp_path / "audio.wav"
+    audio.write_bytes(b"RIFF")
+    media = tmp_path / "media.png"
+    media.write_bytes(b"start")
+    template = workflows.load_templates(ROOT)[(input_type, "single")]
+    prompt = workflows.apply_output_profile(template.instantiate(), "archive")
+    planned = segments.plan_segments(9, [], 25, 81, 9, target_seconds=3)
+    return {
+        "template": template,
+        "prompt": prompt,
+        "input_type": input_type,
+        "media_path": str(media),
+        "wav_path": str(audio),
+        "segment_plan": {"fps": 25, "source_frames": None, "segments": planned},
+        "scratch": scratch.JobScratch(name),
+        "checkpoint_key": name,
+    }
+
+
+def test_render_chains_segments_and_drops_repeated_frame(tmp_path, ffmpeg_calls):
+    job_state = segmented_state(tmp_path, "segments_chain")
+    rendered = []
+
+    def render_segment(params):
+        rendered.append(params)
+        path = tmp_path / f"out_{len(rendered)}.mp4"
+        path.write_bytes(f"segment{len(rendered)}".encode())
+        return str(path)
+
+    try:
+        output, checkpoint_dir = segments.render_segmented(job_state, render_segment)
+        planned = job_state["segment_plan"]["segments"]
+
+        assert len(rendered) == len(planned) > 1
+        # 첫 구간은 입력 이미지, 다음 구간은 이전 구간의 마지막 프레임에서 시작
+        assert rendered[0]["media"] == job_state["media_path"]
+        assert rendered[1]["media"].endswith("last_0.png")
+        # 두 번째 구간부터는 오디오를 한 프레임(0.04초) 앞에서 잘라 렌더링한 뒤 그 프레임을 버림
+        cuts = [call for call in ffmpeg_calls if call[0] == "cut"]
+        assert cuts[0][2:] == (0.0, planned[0]["frames"] / 25)
+        assert cuts[1][2:] == (round(planned[1]["start"] - 0.04, 3), round(planned[1]["duration"] + 0.04, 3))
+        drops = [call for call in ffmpeg_calls if call[0] == "drop"]
+        assert len(drops) == len(planned) - 1
+        assert drops[0][1] == 1 and drops[0][2][:2] == ["-c:v", "libx265"]
+        assert open(output, "rb").read().startswith(b"segment1segment2")
+
+        # 같은 작업을 다시 실행하면 체크포인트에서 렌더링 없이 이어붙이기만 함
+        rendered.clear()
+        segments.render_segmented(job_state, render_segment)
+        assert rendered == []
+        assert os.path.isdir(checkpoint_dir)
+    finally:
+        job_state["scratch"].cleanup()
+
+
+def test_segments_keep_full_resolution_with_preview_profile():
+    template = workflows.load_templates(ROOT)[("video", "single")]
+
+    full = workflows.apply_output_profile(template.instantiate(), "preview", scale=False)
+    assert workflows.OUTPUT_SCALE_NODE_ID not in full
+    assert full["131"]["inputs"]["crf"] == workflows.OUTPUT_PROFILES["preview"]["crf"]
+
+    chained = workflows.apply_start_image(full, "/tmp/last.png")
+    assert chained["231"]["inputs"]["images"] == [workflows.START_IMAGE_RESIZE_NODE_ID, 0]
+    assert chained[workflows.START_IMAGE_RESIZE_NODE_ID]["inputs"]["image"] == [workflows.START_IMAGE_LOAD_NODE_ID, 0]
+    with pytest.raises(Exception, match="V2V"):
+        workflows.apply_start_image(workflows.load_templates(ROOT)[("image", "single")].instantiate(), "/tmp/last.png")
@@ -0,0 +1,114 @@
+"""보컬 스템 캐시와 두 화자의 오디오가 같을 때 로드/분리/임베딩을 한 번만 하는지 확인"""
+import os
+import shutil
+
+import pytest
+
+import stems
+import workflows
+from conftest import EXAMPLES_DIR, ROOT, image_job
+from disk_cache import DiskCache
+
+
+@pytest.fixture(scope="module")
+def templates():
+    return workflows.load_templates(ROOT)
+
+
+@pytest.mark.parametrize("key, nodes, shared_nodes, second_speaker", [
+    (("image", "multi"), 25, 23, {"306", "307"}),
+    (("video", "multi"), 30, 28, {"313", "314"}),
+])
+def test_shared_speaker_audio_prunes_second_branch(templates, key, nodes, shared_nodes, second_speaker):
+    prompt = templates[key].instantiate(audio="a.wav", audio_2="a.wav")
+    assert len(prompt) == nodes
+
+    shared = stems.share_speaker_audio(prompt)
+
+    assert len(shared) == shared_nodes
+    assert not second_speaker & set(shared)
+    embeds = shared[stems.EMBEDS_NODE_ID]["inputs"]
+    assert embeds["audio_2"] == embeds["audio_1"]
+
+
+def test_apply_stems_fans_out_identical_paths(templates):
+    prompt = templates[("image", "multi")].instantiate(audio="a.wav", audio_2="a.wav")
+
+    patched, saves = stems.apply_stems(prompt, {"audio_1": "a.wav", "audio_2": "a.wav"}, audio_is_clean=True)
+
+    embeds = patched[stems.EMBEDS_NODE_ID]["inputs"]
+    assert embeds["audio_1"] == embeds["audio_2"] == ["125", 0]
+    assert saves == {}
+    assert [node_id for node_id, node in patched.items() if node["class_type"] == "LoadAudio"] == ["125"]
+
+
+def test_same_audio_detects_byte_equal_copies(tmp_path):
+    original = f"{EXAMPLES_DIR}/audio.mp3"
+    copy = shutil.copyfile(original, tmp_path / "copy.mp3")
+    other = tmp_path / "other.mp3"
+    other.write_bytes(b"\0" * 10)
+
+    assert stems.same_audio(original, str(copy))
+    assert not stems.same_audio(original, str(other))
+
+
+@pytest.fixture
+def stem_cache(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path / "stems"), max_bytes=1 << 30)
+    monkeypatch.setattr(stems, "stem_cache", cache)
+    return cache
+
+
+def separator_ids(prompt):
+    return {node_id for node_id, node in prompt.items() if node["class_type"] == stems.SEPARATOR_CLASS}
+
+
+def test_miss_saves_stem_and_hit_skips_separation(templates, stem_cache, tmp_path):
+    audio = f"{EXAMPLES_DIR}/audio.mp3"
+    template = templates[("image", "single")]
+
+    first, saves = stems.apply_stems(template.instantiate(audio=audio), {"audio_1": audio})
+    save_id = stems.STEM_SAVE_NODE_IDS["audio_1"]
+    assert list(saves) == [save_id]
+    assert first[save_id]["inputs"]["audio"][0] in separator_ids(first)
+
+    stem = tmp_path / "stem.flac"
+    stem.write_bytes(b"vocals")
+    history = {"outputs": {save_id: {"audio": [{"filename": "stem.flac", "subfolder": "", "type": "output"}]}}}
+    stems.store_stems(history, saves, lambda filename, subfolder, folder_type: stem.read_bytes())
+
+    second, saves = stems.apply_stems(template.instantiate(audio=audio), {"audio_1": audio})
+    load_id = stems.STEM_LOAD_NODE_IDS["audio_1"]
+    assert saves == {}
+    assert second[stems.EMBEDS_NODE_ID]["inputs"]["audio_1"] == [load_id, 0]
+    assert open(second[load_id]["inputs"]["audio"], "rb").read() == b"vocals"
+    assert not separator_ids(second)
+
+
+def test_clean_audio_is_wired_without_separation(templates, stem_cache):
+    prompt = templates[("image", "single")].instantiate(audio="a.wav")
+    patched, saves = stems.apply_stems(prompt, {"audio_1": "a.wav"}, audio_is_clean=True)
+    assert saves == {}
+    assert patched[stems.EMBEDS_NODE_ID]["inputs"]["audio_1"] == ["125", 0]
+    assert not separator_ids(patched)
+
+
+def test_failed_stem_fetch_does_not_fail_the_job(stem_cache):
+    def unavailable(filename, subfolder, folder_type):
+        raise OSError("view failed")
+
+    history = {"outputs": {"903": {"audio": [{"filename": "stem.flac"}]}}}
+    stems.store_stems(history, {"903": "stem:model:abc"}, unavailable)
+    assert stem_cache.get("stem:model:abc") is None
+    assert os.listdir(stem_cache.tmp_dir) == []
+
+
+def test_second_job_reuses_stem_through_comfyui(handler, fake_comfy, stem_cache):
+    handler.handler(image_job("stem_first"))
+    first = fake_comfy.submitted[-1][1]
+    assert stems.STEM_SAVE_NODE_IDS["audio_1"] in first
+
+    handler.handler(image_job("stem_second"))
+    second = fake_comfy.submitted[-1][1]
+    assert second[stems.EMBEDS_NODE_ID]["inputs"]["audio_1"] == [stems.STEM_LOAD_NODE_IDS["audio_1"], 0]
+    assert not separator_ids(second)
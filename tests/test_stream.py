@@ -0,0 +1,73 @@
+"""stream 모드: 진행 이벤트 변환, 미리보기 프레임 분배, 스트림이 끊겨도 구독을 남기지 않는지"""
+import struct
+
+from comfy_client import ComfyUIClient
+from conftest import image_job
+
+PROMPT = {"128": {"class_type": "WanVideoSampler"}}
+
+
+def test_progress_events(handler):
+    assert handler.progress_event({"type": "executing", "data": {"node": "128"}}, PROMPT) == {
+        "event": "executing", "node": "128", "class_type": "WanVideoSampler"}
+    assert handler.progress_event({"type": "progress", "data": {"node": "128", "value": 2, "max": 4}}, PROMPT) == {
+        "event": "progress", "node": "128", "value": 2, "max": 4}
+    assert handler.progress_event({"type": "execution_cached", "data": {"nodes": ["1"]}}, PROMPT) == {
+        "event": "cached", "nodes": ["1"]}
+    assert handler.progress_event({"type": "preview", "data": {"format": "jpeg", "image": b"\xff\xd8"}}, PROMPT) == {
+        "event": "preview", "format": "jpeg", "image": "/9g="}
+    assert handler.progress_event({"type": "executing", "data": {"node": None}}, PROMPT) is None
+    assert handler.progress_event({"type": "executed", "data": {}}, PROMPT) is None
+
+
+def test_binary_previews_reach_only_subscribers_that_asked():
+    client = ComfyUIClient("127.0.0.1", "preview-test", port=1)
+    wants = client.subscribe("wants", previews=True)
+    skips = client.subscribe("skips")
+    frame = struct.pack(">II", 1, 2) + b"\x89PNG"
+
+    client._dispatch({"type": "executing", "data": {"node": "128", "prompt_id": "skips"}})
+    client._dispatch_binary(frame)
+    client._dispatch({"type": "executing", "data": {"node": "128", "prompt_id": "wants"}})
+    client._dispatch_binary(frame)
+    client._dispatch_binary(struct.pack(">II", 3, 0) + b"text")
+
+    skips.get_nowait()
+    assert skips.empty()
+    wants.get_nowait()
+    preview = wants.get_nowait()
+    assert preview["type"] == "preview" and preview["data"] == {"prompt_id": "wants", "format": "png", "image": b"\x89PNG"}
+    assert wants.empty()
+
+    # 대기열 상태는 모든 구독자에게 전달
+    client._dispatch({"type": "status", "data": {"status": {"exec_info": {"queue_remaining": 1}}}})
+    assert wants.get_nowait()["type"] == skips.get_nowait()["type"] == "status"
+
+
+def test_stream_yields_queue_progress_and_result(handler, fake_comfy, monkeypatch):
+    monkeypatch.setattr(fake_comfy, "send_previews", True)
+    monkeypatch.setattr(handler, "PREVIEW_METHOD", "auto")
+    job = image_job("stream_events")
+    job["input"]["stream_previews"] = True
+
+    events = list(handler.handler_stream(job))
+
+    kinds = [event.get("event") for event in events]
+    assert kinds[0] == "queued" and kinds[-1] == "result"
+    assert {"executing", "progress", "preview"} <= set(kinds)
+    assert "video" in events[-1] and "error" not in events[-1]
+    # 노드별로 마지막 진행 이벤트(value == max)는 빠뜨리지 않음
+    progress = [event for event in events if event.get("event") == "progress"]
+    assert all(any(p["node"] == node and p["value"] == p["max"] for p in progress) for node in {p["node"] for p in progress})
+    assert handler.comfy._subscribers == {}
+
+
+def test_closing_the_stream_early_releases_the_subscription(handler):
+    stream = handler.handler_stream(image_job("stream_closed"))
+    queued = next(stream)
+    assert queued["event"] == "queued"
+    assert queued["prompt_id"] in handler.comfy._subscribers
+
+    stream.close()
+
+    assert queued["prompt_id"] not in handler.comfy._subscribers
@@ -0,0 +1,115 @@
+"""V2V 원본 전처리: 크기 계산, ffprobe 해석, 모드 선택 (ffmpeg 호출은 기록만 함)"""
+import json
+import os
+import subprocess
+
+import pytest
+
+import video_prep
+from disk_cache import DiskCache
+
+
+def test_cover_size_keeps_aspect_and_even_dimensions():
+    assert video_prep.cover_size(1920, 1080, 512, 512) == (912, 512)
+    assert video_prep.cover_size(1080, 1920, 480, 832) == (480, 854)
+    # 원본이 목표보다 작으면 확대하지 않음
+    assert video_prep.cover_size(640, 360, 512, 512) is None
+
+
+def ffprobe_output(stream, duration="4.0"):
+    return json.dumps({"streams": [stream], "format": {"duration": duration}})
+
+
+@pytest.mark.parametrize("stream, expected", [
+    ({"width": 1920, "height": 1080, "avg_frame_rate": "25/1", "nb_frames": "250"}, (1920, 1080, 25.0, 250)),
+    # 프레임 수가 없으면 길이 x fps, 90도 회전이면 가로세로를 바꿈
+    ({"width": 1920, "height": 1080, "avg_frame_rate": "30000/1001", "nb_frames": "N/A",
+      "side_data_list": [{"rotation": -90}]}, (1080, 1920, 30000 / 1001, 119)),
+    ({"width": 1280, "height": 720, "avg_frame_rate": "24/1", "tags": {"rotate": "90"}}, (720, 1280, 24.0, 96)),
+])
+def test_probe_video_reads_ffprobe_json(monkeypatch, stream, expected):
+    monkeypatch.setattr(video_prep.subprocess, "run",
+                        lambda *args, **kwargs: subprocess.CompletedProcess(args, 0, ffprobe_output(stream)))
+    assert video_prep.probe_video("in.mp4") == pytest.approx(expected)
+
+
+def test_probe_video_without_ffprobe(monkeypatch):
+    def missing(*args, **kwargs):
+        raise FileNotFoundError("ffprobe")
+    monkeypatch.setattr(video_prep.subprocess, "run", missing)
+    assert video_prep.probe_video("in.mp4") is None
+
+
+@pytest.fixture
+def ffmpeg(monkeypatch, tmp_path):
+    """ffmpeg 명령을 기록하고 출력 파일만 만듦 (copy_fails면 스트림 복사를 실패시킴)"""
+    calls = []
+    monkeypatch.setattr(video_prep, "video_prep_cache", DiskCache(str(tmp_path / "prep"), max_bytes=1 << 30))
+
+    def run(cmd):
+        calls.append(cmd)
+        if "copy" in cmd and run.copy_fails:
+            raise Exception("codec not supported in container")
+        with open(cmd[-1], "wb") as f:
+            f.write(b"prepared")
+    run.copy_fails = False
+    monkeypatch.setattr(video_prep, "_ffmpeg", run)
+    return run, calls
+
+
+def source(tmp_path, monkeypatch, probed, name="in.mov"):
+    path = tmp_path / name
+    path.write_bytes(b"original " + name.encode())
+    monkeypatch.setattr(video_prep, "probe_video", lambda video_path: probed)
+    return str(path)
+
+
+def test_small_short_source_is_used_as_is(ffmpeg, tmp_path, monkeypatch):
+    path = source(tmp_path, monkeypatch, (480, 832, 25.0, 60))
+    assert video_prep.prepare_source(path, 81, 480, 832, str(tmp_path)) == (path, {
+        "source_width": 480, "source_height": 832, "source_frames": 60, "fps": 25.0, "mode": "none"})
+    assert ffmpeg[1] == []
+
+
+def test_long_source_is_trimmed_by_stream_copy_then_cached(ffmpeg, tmp_path, monkeypatch):
+    run, calls = ffmpeg
+    path = source(tmp_path, monkeypatch, (480, 832, 25.0, 500))
+
+    output, info = video_prep.prepare_source(path, 81, 480, 832, str(tmp_path))
+    assert info["mode"] == "copy" and info["frames"] == 81
+    assert output.endswith(".mov") and calls[0][calls[0].index("-frames:v") + 1] == "81"
+
+    again, info = video_prep.prepare_source(path, 81, 480, 832, str(tmp_path))
+    assert (again, info["mode"]) == (output, "cached")
+    assert len(calls) == 1
+
+
+def test_copy_failure_falls_back_to_transcode(ffmpeg, tmp_path, monkeypatch):
+    run, calls = ffmpeg
+    run.copy_fails = True
+    path = source(tmp_path, monkeypatch, (480, 832, 25.0, 500))
+
+    output, info = video_prep.prepare_source(path, 81, 480, 832, str(tmp_path))
+    assert info["mode"] == "transcode" and output.endswith(".mp4")
+    assert "libx264" in calls[1]
+
+
+def test_large_source_is_downscaled(ffmpeg, tmp_path, monkeypatch):
+    run, calls = ffmpeg
+    path = source(tmp_path, monkeypatch, (1920, 1080, 25.0, 50))
+
+    output, info = video_prep.prepare_source(path, 81, 512, 512, str(tmp_path))
+    assert info["mode"] == "transcode" and (info["width"], info["height"], info["frames"]) == (912, 512, 50)
+    assert "scale=912:512:flags=lanczos" in calls[0]
+
+
+def test_ffmpeg_failure_keeps_the_original(ffmpeg, tmp_path, monkeypatch):
+    def broken(cmd):
+        raise Exception("ffmpeg not found")
+    monkeypatch.setattr(video_prep, "_ffmpeg", broken)
+    path = source(tmp_path, monkeypatch, (1920, 1080, 25.0, 50))
+
+    output, info = video_prep.prepare_source(path, 81, 512, 512, str(tmp_path))
+    assert (output, info["mode"]) == (path, "none")
+    assert os.listdir(video_prep.video_prep_cache.blob_dir) == []
+    assert os.listdir(video_prep.video_prep_cache.tmp_dir) == []
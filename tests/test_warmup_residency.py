@@ -0,0 +1,32 @@
+"""워커 시작 시 웜업이 모델 전환으로 집계되지 않고 기본 모델을 남기는지 확인"""
+import residency
+import warmup
+from conftest import image_job
+
+
+def test_warmup_order_loads_resident_model_last(handler):
+    order = [template.name for _, template in warmup.warmup_order(handler.templates, "I2V_single")]
+    single = [name for name in order if name.endswith("_single")]
+    assert order[-len(single):] == single
+
+    order = [template.name for _, template in warmup.warmup_order(handler.templates, "V2V_multi")]
+    assert order[-1].endswith("_multi")
+
+
+def test_warmup_is_not_counted_as_model_switches(handler, fake_comfy, monkeypatch):
+    monkeypatch.setattr(warmup, "WARMUP_TEMPLATES", "I2V_single,I2V_multi")
+    monkeypatch.setattr(handler, "model_residency", residency.ModelResidency())
+    free_calls = fake_comfy.free_calls
+
+    timings = handler.run_warmup()
+
+    assert set(timings) == {"I2V_single", "I2V_multi"}
+    assert handler.model_residency.switches == 0
+    assert fake_comfy.free_calls == free_calls
+    single_key = residency.model_key(handler.templates[("image", "single")].graph)
+    assert handler.model_residency.resident == single_key
+
+    # 웜업이 남긴 모델을 쓰는 첫 작업은 바로 실행됨
+    result = handler.handler(image_job("after_warmup"))
+    assert result["model_residency"]["load"] == "resident"
+    assert handler.model_residency.switches == 0
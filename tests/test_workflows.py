@@ -0,0 +1,100 @@
+"""워크플로우 템플릿: 시작 시 검증/정리와 작업별 패치"""
+import json
+
+import pytest
+
+import workflows
+from conftest import ROOT, image_job
+
+
+@pytest.fixture(scope="module")
+def templates():
+    return workflows.load_templates(ROOT)
+
+
+def test_every_template_loads_with_its_patch_points(templates):
+    assert set(templates) == set(workflows.TEMPLATE_SPECS)
+    for template in templates.values():
+        for node_id, input_name in template.patch_points.values():
+            assert input_name in template.graph[node_id]["inputs"]
+
+
+def test_nodes_not_feeding_the_output_are_pruned(templates):
+    graph = templates[("image", "single")].graph
+    # PreviewAny(293) 디버그 출력과 연결되지 않은 로더는 제출하지 않음
+    assert not {"177", "293", "300"} & set(graph)
+    for node in graph.values():
+        assert node["class_type"] != "PreviewAny"
+
+
+def test_instantiate_patches_a_copy(templates):
+    template = templates[("image", "multi")]
+    prompt = template.instantiate(media="face.png", audio="a.wav", audio_2="b.wav", width=480, max_frame=None)
+
+    assert prompt["284"]["inputs"]["image"] == "face.png"
+    assert prompt["307"]["inputs"]["audio"] == "b.wav"
+    assert prompt["245"]["inputs"]["value"] == 480
+    # None은 템플릿 값을 그대로 두고, 템플릿 자체는 바뀌지 않음
+    assert prompt["270"]["inputs"]["value"] == template.graph["270"]["inputs"]["value"]
+    assert template.graph["284"]["inputs"]["image"] != "face.png"
+    assert template.instantiate()["245"]["inputs"]["value"] == template.graph["245"]["inputs"]["value"]
+
+
+def test_unknown_parameter_is_rejected(templates):
+    with pytest.raises(Exception, match="audio_2"):
+        templates[("image", "single")].instantiate(audio_2="b.wav")
+
+
+def test_get_template_normalizes_input_type_and_person_count(templates):
+    assert workflows.get_template("image", "single") is templates[("image", "single")]
+    assert workflows.get_template("url_video", "two") is templates[("video", "multi")]
+
+
+def load_graph(name="I2V_single.json"):
+    with open(f"{ROOT}/{name}") as f:
+        return json.load(f)
+
+
+def test_broken_link_fails_at_load():
+    graph = load_graph()
+    graph["131"]["inputs"]["images"] = ["9999", 0]
+    with pytest.raises(Exception, match="9999"):
+        workflows.WorkflowTemplate("broken", graph, {})
+
+
+def test_missing_patch_point_fails_at_load():
+    graph = load_graph()
+    with pytest.raises(Exception, match="media"):
+        workflows.WorkflowTemplate("missing", graph, {"media": ("284", "no_such_input")})
+
+
+def test_output_profiles_set_encoder_and_scale(templates):
+    template = templates[("image", "single")]
+    original_images = template.graph["131"]["inputs"]["images"]
+
+    standard = workflows.apply_output_profile(template.instantiate(), "standard")
+    assert standard["131"]["inputs"]["crf"] == 19
+    assert workflows.OUTPUT_SCALE_NODE_ID not in standard
+
+    archive = workflows.apply_output_profile(template.instantiate(), "archive")
+    assert (archive["131"]["inputs"]["format"], archive["131"]["inputs"]["pix_fmt"]) == ("video/h265-mp4", "yuv420p10le")
+
+    # preview는 131 앞에 축소 노드를 끼워 넣음
+    preview = workflows.apply_output_profile(template.instantiate(), "preview")
+    scale = preview[workflows.OUTPUT_SCALE_NODE_ID]
+    assert preview["131"]["inputs"]["images"] == [workflows.OUTPUT_SCALE_NODE_ID, 0]
+    assert scale["inputs"]["image"] == original_images and scale["inputs"]["scale_by"] == 0.5
+    assert template.graph["131"]["inputs"]["images"] == original_images
+
+
+def test_unknown_output_profile_is_rejected(templates):
+    with pytest.raises(Exception, match="output_profile"):
+        workflows.apply_output_profile(templates[("image", "single")].instantiate(), "lossless")
+
+
+def test_handler_rejects_unknown_profile_before_rendering(handler, fake_comfy):
+    submitted = len(fake_comfy.submitted)
+    job = image_job("bad_profile")
+    job["input"]["output_profile"] = "lossless"
+    assert "output_profile" in handler.handler(job)["error"]
+    assert len(fake_comfy.submitted) == submitted
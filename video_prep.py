@@ -0,0 +1,138 @@
+"""V2V 원본 비디오를 렌더링에 쓰이는 프레임/크기로 미리 줄이는 CPU 전처리
+
+VHS_LoadVideo(228)는 원본의 모든 프레임을 원본 해상도로 디코딩한 뒤 ImageResizeKJv2(230)와
+GetImageRangeFromBatch가 대부분을 버립니다. 여기서는 ffmpeg로 앞에서부터 max_frame개
+프레임만 남기고, 원본이 목표 크기보다 크면 목표 크기를 덮는 최소 크기(비율 유지)로 줄여
+228에 넘깁니다. 최종 crop/resize는 그대로 워크플로우가 하므로 결과 구도는 바뀌지 않습니다.
+
+- 줄일 필요가 없고 자르기만 하면 스트림 복사(-c copy), 크기를 줄이면 빠른 재인코딩 한 번
+- 결과는 원본 내용 해시 + 프레임 수 + 크기를 키로 DiskCache에 저장
+- ffmpeg/ffprobe가 없거나 실패하면 원본을 그대로 사용
+"""
+import json
+import logging
+import math
+import os
+import subprocess
+
+from disk_cache import DiskCache
+from result_cache import content_digest
+
+logger = logging.getLogger(__name__)
+
+VIDEO_PREP = os.getenv('VIDEO_PREP', 'true').lower() == 'true'
+# VIDEO_PREP_CACHE_MAX_GB=0이면 캐시하지 않음 (매번 작업 폴더에 새로 만듦)
+video_prep_cache = DiskCache(
+    os.getenv('VIDEO_PREP_CACHE_DIR', '/tmp/video_prep_cache'),
+    int(float(os.getenv('VIDEO_PREP_CACHE_MAX_GB', '5')) * 1024 ** 3),
+)
+
+
+def probe_video(video_path):
+    """(너비, 높이, fps, 프레임 수)를 ffprobe로 확인 (회전 메타데이터 반영, 실패하면 None)"""
+    try:
+        result = subprocess.run([
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'stream=width,height,avg_frame_rate,nb_frames:stream_tags=rotate'
+                             ':stream_side_data=rotation:format=duration',
+            '-of', 'json', video_path,
+        ], capture_output=True, text=True, timeout=30)
+        info = json.loads(result.stdout)
+        stream = info["streams"][0]
+        width, height = int(stream["width"]), int(stream["height"])
+        num, _, den = stream["avg_frame_rate"].partition('/')
+        fps = float(num) / float(den or 1)
+        if stream.get("nb_frames", "N/A") not in ("N/A", "0"):
+            frames = int(stream["nb_frames"])
+        else:
+            frames = int(float(info["format"]["duration"]) * fps)
+        rotation = int(stream.get("tags", {}).get("rotate", 0))
+        for side_data in stream.get("side_data_list", []):
+            rotation = int(side_data.get("rotation", rotation))
+        if abs(rotation) % 180 == 90:
+            width, height = height, width
+        return width, height, fps, frames
+    except (OSError, ValueError, KeyError, IndexError, ZeroDivisionError, subprocess.SubprocessError):
+        return None
+
+
+def cover_size(src_width, src_height, width, height):
+    """목표 크기를 덮는(crop 가능한) 최소 크기. 확대가 필요하면 None (원본 크기 유지)"""
+    scale = max(width / src_width, height / src_height)
+    if scale >= 1:
+        return None
+    # 짝수로 올림 (yuv420p)
+    return 2 * math.ceil(src_width * scale / 2), 2 * math.ceil(src_height * scale / 2)
+
+
+def _ffmpeg(cmd):
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(result.stderr.strip()[-500:])
+
+
+def prepare_source(video_path, max_frame, width, height, work_dir, input_cache=None):
+    """렌더링에 필요한 앞 max_frame개 프레임을 목표 크기에 맞춰 줄인 비디오 경로와 정보를 반환
+
+    (경로, 정보)를 반환하며, 줄일 것이 없거나 실패하면 원본 경로를 그대로 돌려줍니다.
+    정보의 mode는 "none"(원본 사용), "copy"(스트림 복사), "transcode"(재인코딩), "cached" 중 하나입니다.
+    """
+    probed = probe_video(video_path)
+    if probed is None:
+        logger.warning(f"원본 비디오 정보를 확인할 수 없어 전처리 없이 사용합니다: {video_path}")
+        return video_path, {"mode": "none"}
+    src_width, src_height, fps, frames = probed
+    info = {"source_width": src_width, "source_height": src_height, "source_frames": frames, "fps": round(fps, 3)}
+    size = cover_size(src_width, src_height, width, height)
+    trim = frames > max_frame
+    if size is None and not trim:
+        return video_path, {**info, "mode": "none"}
+
+    frame_count = min(frames, max_frame)
+    out_width, out_height = size or (src_width, src_height)
+    info.update({"frames": frame_count, "width": out_width, "height": out_height})
+    # 스트림 복사는 원본 컨테이너 형식을 유지
+    ext = ".mp4" if size else (os.path.splitext(video_path)[1] or ".mp4")
+    key = f"v2v:{content_digest(video_path, input_cache)}:{frame_count}:{out_width}x{out_height}"
+    with video_prep_cache.lock(key):
+        entry = video_prep_cache.get(key)
+        if entry is not None:
+            logger.info(f"♻️ 원본 비디오 전처리 캐시 적중: {entry['path']}")
+            return entry["path"], {**info, "mode": "cached"}
+
+        if video_prep_cache.enabled:
+            output_path = video_prep_cache.make_temp_path(ext)
+        else:
+            os.makedirs(work_dir, exist_ok=True)
+            output_path = os.path.abspath(os.path.join(work_dir, f"source_prepared{ext}"))
+        base = ['ffmpeg', '-hide_banner', '-y', '-i', video_path, '-map', '0:v:0', '-an', '-frames:v', str(frame_count)]
+        transcode = base + [
+            '-vf', f'scale={out_width}:{out_height}:flags=lanczos', '-c:v', 'libx264', '-preset', 'ultrafast',
+            '-crf', '12', '-pix_fmt', 'yuv420p', output_path,
+        ]
+        mode = "transcode" if size else "copy"
+        try:
+            if size:
+                _ffmpeg(transcode)
+            else:
+                try:
+                    _ffmpeg(base + ['-c', 'copy', output_path])
+                except Exception as e:
+                    # 컨테이너에 복사할 수 없는 코덱이면 재인코딩 한 번으로 대신함
+                    logger.info(f"스트림 복사 실패, 재인코딩합니다: {e}")
+                    if os.path.exists(output_path):
+                        os.remove(output_path)
+                    output_path = os.path.splitext(output_path)[0] + ".mp4"
+                    ext, mode = ".mp4", "transcode"
+                    _ffmpeg(transcode[:-1] + [output_path])
+        except Exception as e:
+            logger.warning(f"원본 비디오 전처리 실패, 원본을 사용합니다: {e}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return video_path, {**info, "mode": "none"}
+
+        if video_prep_cache.enabled:
+            output_path = video_prep_cache.put_file(key, output_path, ext)
+    logger.info(f"✂️ 원본 비디오 전처리 ({mode}): {src_width}x{src_height} {frames}프레임 -> "
+                f"{out_width}x{out_height} {frame_count}프레임")
+    return output_path, {**info, "mode": mode}
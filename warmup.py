@@ -0,0 +1,125 @@
+"""워커 시작 시 모델 로드 비용을 미리 치르는 웜업
+
+/examples 에셋으로 활성화된 워크플로우 템플릿마다 작은 해상도, 샘플러 윈도우 하나 분량의
+프롬프트를 실행합니다. GGUF 모델, VAE, 텍스트 인코더, CLIP vision, wav2vec, MelBandRoFormer가
+이때 로드되므로 첫 실제 작업은 로드 시간 없이 바로 샘플링을 시작합니다.
+
+single/multi 템플릿은 서로 다른 InfiniteTalk 모델을 쓰므로 같은 모델끼리 묶어 실행하고,
+WARMUP_RESIDENT 템플릿의 모델을 마지막에 올려 웜업이 끝난 뒤 그 모델이 상주하게 합니다.
+"""
+import logging
+import os
+import subprocess
+import time
+
+from residency import model_key
+
+logger = logging.getLogger(__name__)
+
+# 쉼표로 구분한 템플릿 이름 (예: "I2V_single,V2V_single"), "all" 또는 "none"
+WARMUP_TEMPLATES = os.getenv('WARMUP_TEMPLATES', 'all')
+WARMUP_SIZE = int(os.getenv('WARMUP_SIZE', '256'))
+WARMUP_EXAMPLES_DIR = os.getenv('WARMUP_EXAMPLES_DIR', '/examples')
+WARMUP_VIDEO_PATH = os.getenv('WARMUP_VIDEO_PATH', '/tmp/warmup_video.mp4')
+# 웜업이 끝났을 때 올라가 있을 모델의 템플릿 (기본 입력인 I2V single)
+WARMUP_RESIDENT = os.getenv('WARMUP_RESIDENT', 'I2V_single')
+
+
+def enabled_templates(templates, setting=None):
+    """설정에 따라 웜업할 템플릿 목록을 반환"""
+    setting = (setting if setting is not None else WARMUP_TEMPLATES).strip()
+    if setting.lower() in ("", "none", "off", "0", "false"):
+        return []
+    if setting.lower() == "all":
+        return list(templates.values())
+    names = {name.strip() for name in setting.split(",") if name.strip()}
+    selected = [template for template in templates.values() if template.name in names]
+    unknown = names - {template.name for template in selected}
+    if unknown:
+        logger.warning(f"웜업 설정에 알 수 없는 템플릿이 있습니다: {sorted(unknown)}")
+    return selected
+
+
+def warmup_order(templates, resident=None):
+    """(키, 템플릿) 목록을 모델별로 묶고 resident 템플릿의 모델을 마지막에 두어 정렬"""
+    resident = resident if resident is not None else WARMUP_RESIDENT
+    keys = {name: model_key(template.graph) for name, template in templates.items()}
+    resident_key = next((keys[name] for name, template in templates.items() if template.name == resident), None)
+    if resident_key is None:
+        logger.warning(f"WARMUP_RESIDENT에 알 수 없는 템플릿이 있습니다: {resident}")
+    return sorted(templates.items(), key=lambda item: (keys[item[0]] == resident_key, str(keys[item[0]])))
+
+
+def make_warmup_video(image_path, output_path, frames, fps=25):
+    """예제 이미지로 V2V 웜업용 짧은 비디오를 만듦 (실패하면 None)"""
+    if os.path.exists(output_path):
+        return output_path
+    try:
+        result = subprocess.run([
+            'ffmpeg', '-hide_banner', '-y', '-loop', '1', '-i', image_path, '-frames:v', str(frames), '-r', str(fps),
+            '-vf', f'scale={WARMUP_SIZE}:{WARMUP_SIZE}', '-c:v', 'libx264', '-pix_fmt', 'yuv420p', output_path,
+        ], capture_output=True, text=True)
+    except OSError as e:
+        logger.warning(f"V2V 웜업용 비디오를 만들지 못했습니다: {e}")
+        return None
+    if result.returncode != 0:
+        logger.warning(f"V2V 웜업용 비디오를 만들지 못했습니다: {result.stderr.strip()[-300:]}")
+        return None
+    return output_path
+
+
+def warmup_params(template, input_type, person_count):
+    """템플릿에 넣을 웜업 파라미터 (예제 에셋, 작은 해상도, 샘플러 윈도우 하나)"""
+    image_path = os.path.join(WARMUP_EXAMPLES_DIR, "image.jpg")
+    audio_path = os.path.join(WARMUP_EXAMPLES_DIR, "audio.mp3")
+    # 실제 작업과 같은 윈도우 크기로 실행해야 윈도우 단위로 만들어지는 버퍼/커널을 재사용할 수 있음
+    frames = template.graph["192"]["inputs"]["frame_window_size"]
+    if input_type == "video":
+        media = make_warmup_video(image_path, WARMUP_VIDEO_PATH, frames)
+        if media is None:
+            return None
+    else:
+        media = image_path
+    return {
+        "media": media,
+        "audio": audio_path,
+        "prompt": "A person talking naturally",
+        "width": WARMUP_SIZE,
+        "height": WARMUP_SIZE,
+        "max_frame": frames,
+        "audio_2": audio_path if person_count == "multi" else None,
+    }
+
+
+def run_warmup(templates, run_prompt, setting=None):
+    """활성화된 템플릿을 차례로 실행하고 템플릿별 소요 시간(초)을 반환
+
+    templates는 {(input_type, person_count): WorkflowTemplate},
+    run_prompt(prompt, input_type, person_count)는 프롬프트를 실행하고 끝날 때까지 기다리는 함수입니다.
+    웜업 실패는 기록만 하고 워커 시작을 막지 않습니다.
+    """
+    selected = enabled_templates(templates, setting)
+    if not selected:
+        logger.info("웜업이 비활성화되어 있습니다 (WARMUP_TEMPLATES).")
+        return {}
+
+    timings = {}
+    started = time.perf_counter()
+    for (input_type, person_count), template in warmup_order(templates):
+        if template not in selected:
+            continue
+        params = warmup_params(template, input_type, person_count)
+        if params is None:
+            logger.warning(f"🔥 웜업 건너뜀: {template.name}")
+            continue
+        t = time.perf_counter()
+        try:
+            run_prompt(template.instantiate(**params), input_type, person_count)
+        except Exception as e:
+            logger.error(f"🔥 웜업 실패: {template.name}: {e}")
+            continue
+        timings[template.name] = time.perf_counter() - t
+        logger.info(f"🔥 웜업 완료: {template.name} {timings[template.name]:.1f}초")
+    logger.info(f"🔥 웜업 전체 {time.perf_counter() - started:.1f}초: "
+                + ", ".join(f"{name}={seconds:.1f}s" for name, seconds in timings.items()))
+    return timings
@@ -0,0 +1,210 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+WORKFLOW_DIR = os.getenv('WORKFLOW_DIR', '/')
+
+# 실제 결과를 만드는 출력 노드. 여기에 이어지지 않는 노드는 그래프에서 제거합니다.
+# (PreviewAny 같은 디버그용 출력 노드는 포함하지 않으므로 함께 제거됨)
+OUTPUT_NODE_CLASSES = {"VHS_VideoCombine"}
+
+# 작업 파라미터 -> (노드 ID, 입력 이름)
+COMMON_PATCH_POINTS = {
+    "audio": ("125", "audio"),
+    "prompt": ("241", "positive_prompt"),
+    "width": ("245", "value"),
+    "height": ("246", "value"),
+    "max_frame": ("270", "value"),
+    # 메모리 계획 (planner.py)
+    "frame_window_size": ("192", "frame_window_size"),
+    "blocks_to_swap": ("134", "blocks_to_swap"),
+    "prefetch_blocks": ("134", "prefetch_blocks"),
+    "vae_tiling": ("130", "enable_vae_tiling"),
+    "tile_x": ("130", "tile_x"),
+    "tile_y": ("130", "tile_y"),
+    "tile_stride_x": ("130", "tile_stride_x"),
+    "tile_stride_y": ("130", "tile_stride_y"),
+}
+
+# V2V에서 원본 비디오의 일부 프레임만 읽을 때 사용 (구간 분할 렌더링)
+VIDEO_RANGE_PATCH_POINTS = {
+    "skip_frames": ("228", "skip_first_frames"),
+    "frame_cap": ("228", "frame_load_cap"),
+}
+
+# (input_type, person_count) -> 템플릿 정의
+TEMPLATE_SPECS = {
+    ("image", "single"): {
+        "file": "I2V_single.json",
+        "patch_points": {"media": ("284", "image")},
+    },
+    ("image", "multi"): {
+        "file": "I2V_multi.json",
+        "patch_points": {"media": ("284", "image"), "audio_2": ("307", "audio")},
+    },
+    ("video", "single"): {
+        "file": "V2V_single.json",
+        "patch_points": {"media": ("228", "video"), **VIDEO_RANGE_PATCH_POINTS},
+    },
+    ("video", "multi"): {
+        "file": "V2V_multi.json",
+        "patch_points": {"media": ("228", "video"), "audio_2": ("313", "audio"), **VIDEO_RANGE_PATCH_POINTS},
+    },
+}
+
+
+# 출력 인코딩 프로필: VHS_VideoCombine(131) 입력값과 선택적 축소 비율
+OUTPUT_NODE_ID = "131"
+OUTPUT_SCALE_NODE_ID = "900"
+OUTPUT_PROFILES = {
+    "preview": {"format": "video/h264-mp4", "crf": 30, "pix_fmt": "yuv420p", "scale": 0.5},
+    "standard": {"format": "video/h264-mp4", "crf": 19, "pix_fmt": "yuv420p", "scale": None},
+    "archive": {"format": "video/h265-mp4", "crf": 16, "pix_fmt": "yuv420p10le", "scale": None},
+}
+
+
+def is_link(value):
+    """["노드 ID", 출력 인덱스] 형태의 노드 연결인지 확인"""
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[0], str) and isinstance(value[1], int)
+
+
+def prune_unreachable(graph):
+    """출력 노드에서 거꾸로 따라가 닿지 않는 노드를 제거한 그래프를 반환"""
+    keep = set()
+    stack = [node_id for node_id, node in graph.items() if node["class_type"] in OUTPUT_NODE_CLASSES]
+    while stack:
+        node_id = stack.pop()
+        if node_id in keep:
+            continue
+        keep.add(node_id)
+        for value in graph[node_id]["inputs"].values():
+            if is_link(value) and value[0] not in keep:
+                stack.append(value[0])
+    return {node_id: node for node_id, node in graph.items() if node_id in keep}
+
+
+def validate_graph(name, graph):
+    """연결 대상 노드가 모두 존재하고 출력 노드가 있는지 확인"""
+    if not any(node.get("class_type") in OUTPUT_NODE_CLASSES for node in graph.values()):
+        raise Exception(f"워크플로우 {name}에 출력 노드가 없습니다.")
+    for node_id, node in graph.items():
+        if "class_type" not in node or not isinstance(node.get("inputs"), dict):
+            raise Exception(f"워크플로우 {name}의 노드 {node_id} 형식이 잘못되었습니다.")
+        for input_name, value in node["inputs"].items():
+            if is_link(value) and value[0] not in graph:
+                raise Exception(f"워크플로우 {name}의 노드 {node_id}.{input_name}가 없는 노드 {value[0]}를 참조합니다.")
+
+
+class WorkflowTemplate:
+    """시작 시 한 번 읽어 검증/정리한 워크플로우와 파라미터 -> 노드 입력 매핑"""
+
+    def __init__(self, name, graph, patch_points):
+        validate_graph(name, graph)
+        pruned = prune_unreachable(graph)
+        removed = sorted(set(graph) - set(pruned), key=int)
+        if removed:
+            logger.info(f"워크플로우 {name}: 출력에 쓰이지 않는 노드 제거 {removed}")
+        for param, (node_id, input_name) in patch_points.items():
+            if node_id not in pruned or input_name not in pruned[node_id]["inputs"]:
+                raise Exception(f"워크플로우 {name}에 '{param}' 패치 지점({node_id}.{input_name})이 없습니다.")
+        self.name = name
+        self.graph = pruned
+        self.patch_points = patch_points
+
+    def instantiate(self, **params):
+        """템플릿을 구조적으로 복사하고 파라미터를 패치한 프롬프트를 반환
+
+        노드와 inputs 딕셔너리만 새로 만들고 값(연결 리스트 등)은 공유하므로,
+        값을 제자리에서 수정하지 말고 새 값으로 교체해야 합니다.
+        None인 파라미터는 템플릿 값을 그대로 둡니다.
+        """
+        prompt = {node_id: {**node, "inputs": dict(node["inputs"])} for node_id, node in self.graph.items()}
+        for param, value in params.items():
+            if value is None:
+                continue
+            if param not in self.patch_points:
+                raise Exception(f"워크플로우 {self.name}에서 지원하지 않는 파라미터: {param}")
+            node_id, input_name = self.patch_points[param]
+            prompt[node_id]["inputs"][input_name] = value
+        return prompt
+
+
+def apply_output_profile(prompt, profile_name, scale=True):
+    """instantiate()로 만든 프롬프트에 출력 인코딩 프로필을 적용
+
+    축소가 필요하면 131의 images 입력 앞에 ImageScaleBy 노드를 끼워 넣습니다.
+    scale=False면 인코딩 설정만 적용합니다 (구간 분할 렌더링은 출력의 마지막 프레임이 다음 구간의
+    시작 이미지가 되므로 축소하지 않음).
+    """
+    if profile_name not in OUTPUT_PROFILES:
+        raise Exception(f"지원하지 않는 output_profile: {profile_name} (가능: {', '.join(OUTPUT_PROFILES)})")
+    profile = OUTPUT_PROFILES[profile_name]
+    inputs = prompt[OUTPUT_NODE_ID]["inputs"]
+    inputs["format"] = profile["format"]
+    inputs["crf"] = profile["crf"]
+    inputs["pix_fmt"] = profile["pix_fmt"]
+    if scale and profile["scale"]:
+        prompt[OUTPUT_SCALE_NODE_ID] = {
+            "inputs": {"upscale_method": "area", "scale_by": profile["scale"], "image": inputs["images"]},
+            "class_type": "ImageScaleBy",
+            "_meta": {"title": f"Output scale ({profile_name})"},
+        }
+        inputs["images"] = [OUTPUT_SCALE_NODE_ID, 0]
+    return prompt
+
+
+# V2V 시작 이미지: GetImageRangeFromBatch(231)가 원본 프레임(230)에서 첫 프레임을 골라 192/237에 넘김
+START_FRAME_NODE_ID = "231"
+SOURCE_RESIZE_NODE_ID = "230"
+START_IMAGE_LOAD_NODE_ID = "905"
+START_IMAGE_RESIZE_NODE_ID = "906"
+
+
+def apply_start_image(prompt, image_path):
+    """V2V 프롬프트의 시작 이미지를 원본 비디오의 첫 프레임 대신 image_path로 바꿈
+
+    이미지를 원본 프레임과 같은 설정의 ImageResizeKJv2로 맞춘 뒤 231에 연결합니다.
+    """
+    if START_FRAME_NODE_ID not in prompt or SOURCE_RESIZE_NODE_ID not in prompt:
+        raise Exception("시작 이미지를 바꿀 수 없는 워크플로우입니다 (V2V 전용).")
+    prompt[START_IMAGE_LOAD_NODE_ID] = {
+        "inputs": {"image": image_path},
+        "class_type": "LoadImage",
+        "_meta": {"title": "Segment start image"},
+    }
+    prompt[START_IMAGE_RESIZE_NODE_ID] = {
+        **prompt[SOURCE_RESIZE_NODE_ID],
+        "inputs": {**prompt[SOURCE_RESIZE_NODE_ID]["inputs"], "image": [START_IMAGE_LOAD_NODE_ID, 0]},
+        "_meta": {"title": "Segment start image resize"},
+    }
+    prompt[START_FRAME_NODE_ID]["inputs"]["images"] = [START_IMAGE_RESIZE_NODE_ID, 0]
+    return prompt
+
+
+_templates = {}
+
+
+def load_templates(workflow_dir=None):
+    """모든 워크플로우 템플릿을 읽어 검증하고 캐시 (워커 시작 시 한 번 호출)"""
+    workflow_dir = workflow_dir or WORKFLOW_DIR
+    templates = {}
+    for key, spec in TEMPLATE_SPECS.items():
+        path = os.path.join(workflow_dir, spec["file"])
+        with open(path, 'r') as file:
+            graph = json.load(file)
+        name = os.path.splitext(spec["file"])[0]
+        templates[key] = WorkflowTemplate(name, graph, {**COMMON_PATCH_POINTS, **spec["patch_points"]})
+    _templates.clear()
+    _templates.update(templates)
+    logger.info(f"워크플로우 템플릿 {len(templates)}개를 불러왔습니다: {workflow_dir}")
+    return templates
+
+
+def get_template(input_type, person_count):
+    """input_type과 person_count에 맞는 템플릿을 반환"""
+    if not _templates:
+        load_templates()
+    key = ("image" if input_type == "image" else "video", "single" if person_count == "single" else "multi")
+    return _templates[key]